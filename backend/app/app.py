@@ -51,6 +51,28 @@ origins = [
     "http://localhost:3000",
 ]
 
+@app.on_event("startup")
+def configure_route_threads():
+    #sync routes run on the anyio thread pool, its size can be set with DMBON_FAST_API_ROUTE_THREADS
+    route_threads = os.environ.get("DMBON_FAST_API_ROUTE_THREADS")
+    if route_threads:
+        import anyio.to_thread
+        anyio.to_thread.current_default_thread_limiter().total_tokens = int(route_threads)
+        log.info(f"route thread pool set to {route_threads} threads")
+
+@app.on_event("startup")
+def start_repo_sync():
+    #profile and seed crate repos are refreshed in the background, never while serving a request
+    from app.services.sync import RepoSyncs
+    RepoSyncs().start()
+
+@app.on_event("shutdown")
+def stop_execution_pools():
+    from app.services.execution import Execution
+    from app.services.sync import RepoSyncs
+    RepoSyncs().stop()
+    Execution().shutdown(wait=False)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -167,32 +189,6 @@ def on_rm_error(func, path, exc_info):
     os.chmod(path, stat.S_IWRITE)
     os.unlink(path)
 
-async def check_path_availability(tocheckpath,space_id):
-    if os.path.isdir(os.path.join(tocheckpath)) == False:
-        raise HTTPException(status_code=400, detail="Given storage path does not exist on local storage")
-    #check if given path is already used by another project
-    toposturl = 'http://localhost:6656/spaces' #TODO : figure out how to not hardcode this <---
-    async with ClientSession() as session:
-        response = await session.request(method='GET', url=toposturl)
-        text = await response.content.read()
-        all_spaces = json.loads(text.decode('utf8').replace("'", '"'))
-        for space,info_space in all_spaces.items():
-            print(info_space["storage_path"], file=sys.stderr)
-            print(str("/".join((tocheckpath,str(space_id)))), file=sys.stderr)
-            if info_space['storage_path'] == str("/".join((tocheckpath,str(space_id)))) or info_space['storage_path'] == str(tocheckpath):
-                raise HTTPException(status_code=400, detail="Given storage path is already in use by another project")
-    if len(os.listdir(os.path.join(tocheckpath)) ) != 0:
-        try:
-            os.mkdir(os.path.join(tocheckpath,str(space_id)))
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-        except:
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in existing folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-        
-
 @app.get('/', tags=["test"], status_code=418)
 def home():
     return {'Message':'Waddup OpSci, docs can be found in the /docs route'}      
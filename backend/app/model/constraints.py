@@ -0,0 +1,253 @@
+#compiled shacl constraints model here
+import os, json, threading, tempfile
+from typing import NamedTuple, Tuple, Union
+import logging
+from .location import singleton
+import app.shacl_helper as shclh
+from app.services.execution import Execution
+from app.services.constraintbundle import load_bundle_graph
+
+log=logging.getLogger(__name__)
+
+#bump when the layout of the compiled sidecar changes
+COMPILED_FORMAT_VERSION = 1
+
+#the compiled model is kept next to the ttl file as <name>.ttl.compiled.json
+SIDECAR_SUFFIX = '.compiled.json'
+
+def source_stamp(path):
+    """(mtime_ns, size) of a file, compiled models are only valid for the stamp they were made from"""
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+def local_name(uri):
+    """last part of an uri, the name the annotation endpoints use for types and predicates"""
+    return str(uri).split('/')[-1]
+
+def _jsonable(value):
+    """rdflib terms (or sets of them) to the str (or sorted tuple of str) they are sent out as"""
+    if value is None:
+        return None
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return tuple(sorted(str(item) for item in value))
+    return str(value)
+
+class PropertySpec(NamedTuple):
+    """ constraints on one sh:property of a node shape
+    """
+    path: str
+    datatype: Union[None, str, Tuple[str, ...]]
+    min: Union[None, str, Tuple[str, ...]]
+    max: Union[None, str, Tuple[str, ...]]
+    values: Tuple[str, ...]
+    node: Union[None, str, Tuple[str, ...]]
+
+    @property
+    def label(self):
+        return local_name(self.path)
+
+    @property
+    def required(self):
+        """1 when a sh:minCount is given, 0 otherwise"""
+        return 1 if self.min is not None else 0
+
+    @property
+    def typeprop(self):
+        return self.datatype if self.datatype is not None else 'String'
+
+    def requirement(self):
+        """the {'min','value','typeprop'} dict the annotation endpoints report per property"""
+        return {'min':self.required, 'value':list(self.values), 'typeprop':self.typeprop}
+
+class ShapeSpec(NamedTuple):
+    """ a node shape with its target class and property constraints
+    """
+    node: str
+    target: Union[None, str, Tuple[str, ...]]
+    properties: Tuple[PropertySpec, ...]
+
+    @property
+    def target_names(self):
+        if self.target is None:
+            return ()
+        targets = self.target if isinstance(self.target, tuple) else (self.target,)
+        return tuple(local_name(target) for target in targets)
+
+class ConstraintModel():
+    """ Immutable, compiled form of an all_constraints.ttl file.
+        Holds the node shapes with their property constraints and an index
+        from the (local name of the) target class to its shape.
+    """
+    def __init__(self, shapes):
+        """
+        :param shapes: the compiled node shapes
+        :type shapes: iterable of ShapeSpec
+        """
+        self._shapes = tuple(shapes)
+        by_target = {}
+        for shape in self._shapes:
+            for target_name in shape.target_names:
+                #like before, the last shape for a target class wins
+                by_target[target_name] = shape
+        self._by_target = by_target
+
+    def __repr__(self) -> str:
+        return f"ConstraintModel(shapes={len(self._shapes)}, targets={sorted(self._by_target)})"
+
+    @property
+    def shapes(self):
+        return self._shapes
+
+    def targets(self):
+        """local names of all target classes that have constraints"""
+        return list(self._by_target)
+
+    def shape_for(self, target_name):
+        """ the node shape for a target class or None
+        :param target_name: local name of the target class, i.e. the @type in the crate
+        :type  target_name: str
+        :rtype: ShapeSpec
+        """
+        return self._by_target.get(target_name) if isinstance(target_name, str) else None
+
+    def properties_for(self, target_name):
+        """ the property constraints for a target class, empty when there are none
+        :param target_name: local name of the target class, i.e. the @type in the crate
+        :type  target_name: str
+        :rtype: tuple of PropertySpec
+        """
+        shape = self.shape_for(target_name)
+        return shape.properties if shape is not None else ()
+
+    @staticmethod
+    def compile(path_shacl):
+        """ parse a shacl turtle file and compile it into a ConstraintModel
+        :param path_shacl: path of the ttl file
+        :type  path_shacl: Path
+        """
+        shacldata = shclh.ShapesInfoGraph(path_shacl, graph=load_bundle_graph(path_shacl)).full_shacl_graph_dict()
+        shapes = []
+        for node_to_check in shacldata:
+            properties = []
+            for propname, semantic_properties in node_to_check["properties"].items():
+                properties.append(PropertySpec(
+                    path=str(propname),
+                    datatype=_jsonable(semantic_properties["type"]),
+                    min=_jsonable(semantic_properties["min"]),
+                    max=_jsonable(semantic_properties["max"]),
+                    values=tuple(str(value) for value in semantic_properties["values"]),
+                    node=_jsonable(semantic_properties["node"])))
+            shapes.append(ShapeSpec(node=str(node_to_check["node"]),
+                                    target=_jsonable(node_to_check["target"]),
+                                    properties=tuple(properties)))
+        return ConstraintModel(shapes)
+
+    def as_shacl_dict(self):
+        """the shapes in the layout of ShapesInfoGraph.full_shacl_graph_dict, as sent out by the terms endpoint"""
+        def out(value):
+            return list(value) if isinstance(value, tuple) else value
+        return [{"node":shape.node,
+                 "target":out(shape.target),
+                 "properties":{prop.path:{"type":out(prop.datatype),
+                                          "min":out(prop.min),
+                                          "max":out(prop.max),
+                                          "values":list(prop.values),
+                                          "node":out(prop.node)} for prop in shape.properties}}
+                for shape in self._shapes]
+
+    def to_json(self):
+        return [[shape.node, shape.target, [list(prop) for prop in shape.properties]] for shape in self._shapes]
+
+    @staticmethod
+    def from_json(data):
+        def frozen(value):
+            return tuple(value) if isinstance(value, list) else value
+        shapes = []
+        for node, target, properties in data:
+            shapes.append(ShapeSpec(node=node, target=frozen(target),
+                                    properties=tuple(PropertySpec(*(frozen(field) for field in prop)) for prop in properties)))
+        return ConstraintModel(shapes)
+
+def compile_constraints(path_shacl):
+    """ConstraintModel.compile in its json form, run in the cpu process pool"""
+    return ConstraintModel.compile(path_shacl).to_json()
+
+@singleton
+class ConstraintModels():
+    """ Cache of compiled constraint models, keyed by the path of the ttl file.
+        A model is kept in memory and in a json sidecar next to the ttl file,
+        both are only used while the (mtime_ns, size) of the ttl still match.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path_locks = {}
+        self._models = {}
+
+    def __repr__(self) -> str:
+        return f"ConstraintModels(cached={len(self._models)})"
+
+    def _path_lock(self, path_shacl):
+        with self._lock:
+            return self._path_locks.setdefault(path_shacl, threading.Lock())
+
+    def _cached(self, path_shacl, stamp):
+        with self._lock:
+            cached = self._models.get(path_shacl)
+            return cached[1] if cached is not None and cached[0] == stamp else None
+
+    def get(self, path_shacl):
+        """ the compiled ConstraintModel of a shacl file
+        :param path_shacl: path of the ttl file
+        :type  path_shacl: Path
+        :rtype: ConstraintModel
+        """
+        stamp = source_stamp(path_shacl)
+        model = self._cached(path_shacl, stamp)
+        if model is not None:
+            return model
+        #only requests for this file wait on its compilation, and it is compiled once for all of them
+        with self._path_lock(path_shacl):
+            model = self._cached(path_shacl, stamp)
+            if model is not None:
+                return model
+            model = self._read_sidecar(path_shacl, stamp)
+            if model is None:
+                log.info(f"compiling shacl constraints of {path_shacl}")
+                #rdflib parsing is cpu bound, keep it off the GIL of the server process
+                model = ConstraintModel.from_json(Execution().cpu(compile_constraints, path_shacl))
+                self._write_sidecar(path_shacl, stamp, model)
+            with self._lock:
+                self._models[path_shacl] = (stamp, model)
+            return model
+
+    def invalidate(self, path_shacl):
+        with self._lock:
+            self._models.pop(path_shacl, None)
+
+    def _read_sidecar(self, path_shacl, stamp):
+        sidecar = path_shacl + SIDECAR_SUFFIX
+        try:
+            with open(sidecar) as sidecar_file:
+                compiled = json.load(sidecar_file)
+            if compiled.get("version") != COMPILED_FORMAT_VERSION or compiled.get("source") != stamp:
+                return None
+            return ConstraintModel.from_json(compiled["shapes"])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning(f"ignoring unreadable compiled constraints {sidecar}: {e}")
+            return None
+
+    def _write_sidecar(self, path_shacl, stamp, model):
+        sidecar = path_shacl + SIDECAR_SUFFIX
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix='.constraints.', suffix='.tmp', dir=os.path.dirname(sidecar))
+            with os.fdopen(fd, 'w') as sidecar_file:
+                json.dump({"version":COMPILED_FORMAT_VERSION, "source":stamp, "shapes":model.to_json()}, sidecar_file)
+            os.replace(tmp_path, sidecar)
+        except OSError as e:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            #the sidecar only saves time on a restart, the in memory model is enough to go on
+            log.warning(f"could not write compiled constraints {sidecar}: {e}")
@@ -0,0 +1,180 @@
+#crate metadata cache here
+import os, json, threading, tempfile, shutil
+from collections import OrderedDict
+import logging
+from .location import singleton
+
+log=logging.getLogger(__name__)
+
+DEFAULT_CACHE_MB = 256
+
+def copy_metadata(data):
+    """a deep copy of parsed metadata, through the C json encoder and decoder as it is plain json"""
+    return json.loads(json.dumps(data))
+
+class MetadataCache():
+    """ LRU cache of parsed ro-crate-metadata.json files.
+        Entries are keyed by path and only reused while the (mtime_ns, size)
+        of the file on disk still match the ones it was parsed from.
+        The cache is capped on the summed file size of the cached entries,
+        set with the env var DMBON_FAST_API_CRATE_CACHE_MB.
+
+        The parsed data is shared between callers and never changed in place,
+        so readers always hold a complete version of the file. An edit takes the
+        lock() of the file, changes the copy of read_copy() and stores it with write(),
+        which swaps it in for the next readers.
+        Objects built from the data (indexes and such) can be kept next to
+        it with derived(), they live and die with the cached entry.
+    """
+    def __init__(self, max_bytes=None):
+        """
+        :param max_bytes: Optional - memory cap of the cache in bytes of cached metadata files
+        :type max_bytes: int
+        """
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("DMBON_FAST_API_CRATE_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._path_locks = {}
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(entries={len(self._entries)}, bytes={self._bytes}, max_bytes={self.max_bytes})"
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def read(self, path):
+        """get the parsed json of a metadata file
+        :param path: path of the ro-crate-metadata.json
+        :type  path: Path
+        :return: the parsed metadata
+        :rtype: dict
+        """
+        stamp = MetadataCache._stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        with open(path) as metadata_file:
+            data = json.load(metadata_file)
+        self._store(path, stamp, data)
+        return data
+
+    def read_copy(self, path):
+        """get a private copy of the parsed json of a metadata file, to edit and store with write()
+        :param path: path of the ro-crate-metadata.json
+        :type  path: Path
+        :rtype: dict
+        """
+        return copy_metadata(self.read(path))
+
+    def lock(self, path):
+        """ the edit lock of a metadata file, held for the whole read_copy(), change and write()
+            so two edits of the same crate do not overwrite each other
+        :param path: path of the ro-crate-metadata.json
+        :type  path: Path
+        :rtype: threading.Lock
+        """
+        with self._lock:
+            return self._path_locks.setdefault(path, threading.Lock())
+
+    def write(self, path, data, derived=None):
+        """write metadata to disk (temp file + rename) and keep it as the cached entry
+        :param path: path of the ro-crate-metadata.json
+        :type  path: Path
+        :param data: metadata to write, it is shared with the readers afterwards and must not be changed anymore
+        :type  data: dict
+        :param derived: Optional - objects built from data to keep with the entry, by name as with derived()
+        :type  derived: dict
+        """
+        folder, filename = os.path.split(path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.'+filename+'.', suffix='.tmp', dir=folder)
+        try:
+            with os.fdopen(fd, 'w') as metadata_file:
+                #json.dumps uses the C encoder, json.dump streams through the python one
+                metadata_file.write(json.dumps(data))
+            if os.path.exists(path):
+                shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._store(path, MetadataCache._stamp(path), data, derived)
+
+    def derived(self, path, name, factory):
+        """get an object built from the parsed metadata of a file, built once per cached version of it
+        :param path: path of the ro-crate-metadata.json
+        :type  path: Path
+        :param name: name under which the object is kept with the entry
+        :type  name: str
+        :param factory: called with the parsed metadata to build the object
+        :type  factory: callable
+        """
+        data = self.read(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[1] is not data:
+                #not cached (over the cap) or replaced in the meantime
+                return factory(data)
+            built = entry[2].get(name)
+        if built is None:
+            built = factory(data)
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is not None and entry[1] is data:
+                    built = entry[2].setdefault(name, built)
+        return built
+
+    def invalidate(self, path):
+        """forget the cached entry of a file, e.g. after it was written by another library"""
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= entry[0][1]
+
+    def _store(self, path, stamp, data, derived=None):
+        size = stamp[1]
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old[0][1]
+            if size > self.max_bytes:
+                log.debug(f"not caching {path}, {size} bytes is over the cache limit")
+                return
+            if derived is None:
+                #objects derived from the same data stay valid, e.g. after a write of the data read
+                derived = old[2] if old is not None and old[1] is data else {}
+            self._entries[path] = (stamp, data, derived)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted_path, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[0][1]
+                self.evictions += 1
+                log.debug(f"evicted {evicted_path} from the crate metadata cache")
+
+    def metrics(self):
+        """counters of the cache usage"""
+        with self._lock:
+            return dict(entries=len(self._entries),
+                        bytes=self._bytes,
+                        max_bytes=self.max_bytes,
+                        hits=self.hits,
+                        misses=self.misses,
+                        evictions=self.evictions)
+
+@singleton
+class CrateMetadataCache(MetadataCache):
+    """ the metadata cache shared by all spaces, profiles and seed crates
+    """
+    pass
@@ -0,0 +1,134 @@
+#crate graph model here
+import logging
+
+log=logging.getLogger(__name__)
+
+def entity_types(entity):
+    """the @type of an entity as a list, ro-crate allows both a single type and a list"""
+    types = entity.get("@type", [])
+    return types if isinstance(types, list) else [types]
+
+class CrateGraph():
+    """ Indexed view on the @graph of a parsed ro-crate-metadata.json.
+        Keeps an @id -> entities and an @type -> ids index next to the
+        metadata so that lookups do not need to scan the whole graph.
+        The metadata itself is not copied, changes made through set/pop/add/remove
+        end up in self.data and keep the indexes in line with it.
+        Entities should not be changed behind its back while it is in use.
+    """
+    #ids of the root dataset, metadata descriptor and preview, these are no data entities
+    NON_DATA_ENTITY_IDS = ("./", "ro-crate-metadata.json", "ro-crate-preview.html")
+
+    def __init__(self, data):
+        """
+        :param data: parsed ro-crate-metadata.json
+        :type data: dict
+        """
+        self.data = data
+        self._by_id = {}
+        self._by_type = {}
+        for entity in data["@graph"]:
+            self._index(entity)
+
+    def __repr__(self) -> str:
+        return f"CrateGraph(entities={len(self.data['@graph'])}, ids={len(self._by_id)})"
+
+    def __contains__(self, entity_id):
+        return entity_id in self._by_id
+
+    def _index(self, entity):
+        entity_id = entity.get("@id")
+        self._by_id.setdefault(entity_id, []).append(entity)
+        for entity_type in entity_types(entity):
+            ids = self._by_type.setdefault(entity_type, {})
+            ids[entity_id] = ids.get(entity_id, 0) + 1
+
+    def _unindex(self, entity):
+        entity_id = entity.get("@id")
+        same_id = self._by_id.get(entity_id, [])
+        for i, other in enumerate(same_id):
+            if other is entity:
+                del same_id[i]
+                break
+        if not same_id:
+            self._by_id.pop(entity_id, None)
+        for entity_type in entity_types(entity):
+            ids = self._by_type.get(entity_type, {})
+            ids[entity_id] = ids.get(entity_id, 1) - 1
+            if ids[entity_id] <= 0:
+                del ids[entity_id]
+
+    def ids(self):
+        """all @ids in the graph, in graph order and without duplicates"""
+        return list(self._by_id)
+
+    def entities(self, entity_id):
+        """all entities using this @id, usually one but a crate can repeat ids"""
+        return list(self._by_id.get(entity_id, []))
+
+    def get(self, entity_id):
+        """the first entity with this @id or None"""
+        same_id = self._by_id.get(entity_id)
+        return same_id[0] if same_id else None
+
+    def ids_by_type(self, entity_type):
+        """@ids of the entities that have entity_type as (one of their) @type"""
+        return list(self._by_type.get(entity_type, {}))
+
+    @staticmethod
+    def is_data_entity(entity):
+        """ true for the File and Dataset entities, without the root dataset and metadata descriptor,
+            the same set ro-crate-py calls data entities
+        """
+        if entity.get("@id") in CrateGraph.NON_DATA_ENTITY_IDS:
+            return False
+        types = entity_types(entity)
+        return "File" in types or "Dataset" in types
+
+    def data_entities(self, entity_id=None):
+        """ the data entities of the crate, or only those with a given @id
+        :param entity_id: Optional - only return the data entities with this @id
+        :type  entity_id: str
+        """
+        if entity_id is not None:
+            return [entity for entity in self._by_id.get(entity_id, []) if CrateGraph.is_data_entity(entity)]
+        return [entity for entity in self.data["@graph"] if CrateGraph.is_data_entity(entity)]
+
+    def set(self, entity, predicate, value):
+        """set a predicate on an entity of this graph"""
+        if predicate in ("@id", "@type"):
+            self._unindex(entity)
+            entity[predicate] = value
+            self._index(entity)
+        else:
+            entity[predicate] = value
+
+    def pop(self, entity, predicate, *default):
+        """remove a predicate from an entity of this graph, returns its value like dict.pop"""
+        if predicate in ("@id", "@type") and predicate in entity:
+            self._unindex(entity)
+            value = entity.pop(predicate)
+            self._index(entity)
+            return value
+        return entity.pop(predicate, *default)
+
+    def add(self, entity):
+        """append an entity to the graph"""
+        self.data["@graph"].append(entity)
+        self._index(entity)
+
+    def remove(self, *entity_ids):
+        """remove all entities with these @ids from the graph, in a single pass over it
+        :return: the removed entities
+        :rtype: list
+        """
+        removed = []
+        for entity_id in dict.fromkeys(entity_ids):
+            removed.extend(self._by_id.get(entity_id, []))
+        if not removed:
+            return []
+        removed_ids = set(id(entity) for entity in removed)
+        for entity in removed:
+            self._unindex(entity)
+        self.data["@graph"] = [entity for entity in self.data["@graph"] if id(entity) not in removed_ids]
+        return removed
@@ -1,7 +1,7 @@
 #location model here
 #imports
 #from ..utilities.singleton import singleton -> TODO figure out what is wrong with this notation
-import os
+import os, re, hashlib
 import logging
 
 log=logging.getLogger(__name__)
@@ -20,6 +20,25 @@ def repo_url_to_localfolder(repo_url):
     repo_name   = repo_url.split("/")[-1].split(".git")[0]
     return(repo_owner+"_"+repo_name)
 
+def normalise_repo_url(repo_url):
+    """ key of a repo that is the same for its https and ssh urls:
+        host/owner/name in lower case, without scheme, user, trailing / or .git
+    """
+    url = repo_url.strip()
+    url = re.sub(r'^[a-zA-Z][a-zA-Z0-9+.-]*://', '', url)
+    #scp like ssh urls: git@github.com:owner/name.git
+    url = re.sub(r'^[^/@]+@([^/:]+):', r'\1/', url)
+    url = re.sub(r'^[^/@]+@', '', url)
+    url = url.rstrip('/')
+    if url.endswith('.git'):
+        url = url[:-len('.git')]
+    return url.lower()
+
+def repo_url_to_mirrorfolder(repo_url):
+    key = normalise_repo_url(repo_url)
+    readable = re.sub(r'[^a-z0-9._-]+', '_', key).strip('_')
+    return f"{readable}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}.git"
+
 @singleton
 class Locations():
     
@@ -42,4 +61,8 @@ class Locations():
         # is repo url is git ssh or full html url and then convert
         return self.join_abs_path(repo_url_to_localfolder(repo_url))
 
+    def get_mirror_location_by_url(self, repo_url):
+        # bare mirror of a repo, shared by all the checkouts of it
+        return self.join_abs_path("mirrors", repo_url_to_mirrorfolder(repo_url))
+
     
\ No newline at end of file
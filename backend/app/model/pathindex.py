@@ -0,0 +1,87 @@
+#storage path index here
+import os, bisect, threading
+import logging
+
+log=logging.getLogger(__name__)
+
+def normalise_path(path):
+    """realpath + normcase of a path, so equal locations give equal keys"""
+    return os.path.normcase(os.path.realpath(str(path)))
+
+def storage_path_key(storage_path):
+    """normalised path with a trailing separator, used as key in the path indexes"""
+    key = normalise_path(storage_path)
+    return key if key.endswith(os.sep) else key + os.sep
+
+def ancestor_keys(key):
+    """keys of all parent folders of a key, from the closest one up to the root"""
+    parent = os.path.dirname(key.rstrip(os.sep))
+    while True:
+        yield parent if parent.endswith(os.sep) else parent + os.sep
+        next_parent = os.path.dirname(parent)
+        if next_parent == parent:
+            return
+        parent = next_parent
+
+class StoragePathIndex():
+    """ Sorted index of the (normalised) storage paths of all spaces.
+        Paths are kept sorted with a trailing separator so that all
+        descendants of a path sit in one contiguous range right after it,
+        which turns the ancestor/descendant checks into bisect lookups.
+    """
+    def __init__(self, items=()):
+        """
+        :param items: Optional - (uuid, storage_path) tuples to fill the index with
+        :type items: iterable
+        """
+        self._lock = threading.Lock()
+        self._keys = []
+        self._uuid_by_key = {}
+        self._key_by_uuid = {}
+        for uuid, storage_path in items:
+            self.add(uuid, storage_path)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, uuid, storage_path):
+        """add or move the storage path of a space"""
+        with self._lock:
+            self._remove(uuid)
+            key = storage_path_key(storage_path)
+            if key not in self._uuid_by_key:
+                bisect.insort(self._keys, key)
+            self._uuid_by_key[key] = uuid
+            self._key_by_uuid[uuid] = key
+
+    def remove(self, uuid):
+        """drop the storage path of a space from the index"""
+        with self._lock:
+            self._remove(uuid)
+
+    def _remove(self, uuid):
+        key = self._key_by_uuid.pop(uuid, None)
+        if key is not None and self._uuid_by_key.get(key) == uuid:
+            del self._uuid_by_key[key]
+            index = bisect.bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index] == key:
+                del self._keys[index]
+
+    def conflict(self, storage_path):
+        """find a space that uses this path, one of its parent folders or a folder inside it
+        :param storage_path: path to check
+        :type  storage_path: Path
+        :return: the uuid of the conflicting space or None
+        :rtype: str
+        """
+        key = storage_path_key(storage_path)
+        with self._lock:
+            #the path itself or a space nested inside it, both sort right at or after key
+            index = bisect.bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index].startswith(key):
+                return self._uuid_by_key[self._keys[index]]
+            #a space in one of the parent folders, one dict lookup per path level
+            for parent_key in ancestor_keys(key):
+                if parent_key in self._uuid_by_key:
+                    return self._uuid_by_key[parent_key]
+        return None
@@ -1,6 +1,7 @@
 #profile model here
 from .rocrategit import RoCrateGitBase
 from .location import Locations
+from .registry import Registries
 import os, json
 import uuid as uuidmake
 import logging
@@ -14,7 +15,11 @@ class Profile(RoCrateGitBase):
     """ Class to represent a selectable profile for data spaces.
         This class tracks and manages/caches incomming profile data 
         retrieved from github repos.
+        A loaded profile only keeps its registry entry, the seed crates are
+        resolved the first time seed_dependencies is used.
     """
+    __slots__ = ('uuid', 'name', 'repo_url', 'logo_url', 'description', '_seed_urls', '_seed_dependencies')
+    
     def __init__(self, repo_url, name, description, logo_url=None, uuid= None, seed_dependencies= None):
         """ 
         :param name: name of the profile
@@ -44,10 +49,20 @@ class Profile(RoCrateGitBase):
             
             #self.location_init_repo = self._download_repo(repo_url = self.repo_url)
             #self.get_rocrate_metadata_git_urls(rocrate_metadata_location= os.path.join(self.location_init_repo,"ro-crate-metadata.json"))
-        self.seed_dependencies = SeedCrate.load_all(seed_dependencies) 
+        self._seed_urls = list(seed_dependencies or [])
+        self._seed_dependencies = None
         if uuid is None:
+            #only a new profile fetches its seed crates, loading a known one never touches git
+            self._seed_dependencies = SeedCrate.load_all(self._seed_urls)
             self.write()
     
+    @property
+    def seed_dependencies(self):
+        """the seed crates of the profile by repo url, resolved on first use"""
+        if self._seed_dependencies is None:
+            self._seed_dependencies = SeedCrate.load_all(self._seed_urls, fetch=False)
+        return self._seed_dependencies
+    
     def __str__(self):
         return f"Profile(uuid = {self.uuid})"
     
@@ -68,13 +83,14 @@ class Profile(RoCrateGitBase):
                     logo_url=self.logo_url,
                     description=self.description,
                     uuid= self.uuid,
-                    seed_dependencies= list(self.seed_dependencies.keys()) #todo use set instead of list
+                    seed_dependencies= list(self._seed_urls) #todo use set instead of list
                 )
 
     def location(self):
         return Locations().get_repo_location_by_url(self.repo_url)
 
     def detect_dependencies(self):
+        #right after the clone the repo is fresh, this only pulls for a repeated registration
         self.sync()
         #  use self.location() to find information ?? 
         seed_crates = self.find_parts(SEED_DEPENDENCY_MARKER_URI)
@@ -93,39 +109,63 @@ class Profile(RoCrateGitBase):
         :rtype: Profile
         :raises KeyError: the supplied key was not found in the profiles.json file
         """
-        #get metadata profiles 
-        profiles_dict = Profile._read_profiles()
-        return Profile(**profiles_dict[uuid])
+        #get metadata profile from the in-memory registry
+        return Profile(**Profile.registry()[uuid])
     
     @staticmethod
     def load_all():
         """creates a dictionary by uuid of all known profiles"""
-        profiles_dict = Profile._read_profiles()
-        return {uuid:Profile(**profiles_dict[uuid]) for uuid in profiles_dict}
+        return {uuid:Profile(**info) for uuid, info in Profile.registry().items()}
+    
+    @staticmethod
+    def exists(uuid :str):
+        """check if a profile with the given uuid is known in the profiles.json"""
+        return uuid in Profile.registry()
+    
+    @staticmethod
+    def read_info(uuid :str):
+        """get the profiles.json entry of a profile without constructing the Profile object
+        :param uuid: uuid of the profile
+        :type  uuid: str
+        :return: the dict entry of the profile
+        :rtype: dict
+        :raises KeyError: the supplied key was not found in the profiles.json file
+        """
+        return Profile.registry()[uuid]
     
     def write(self):
-        profiles_dict = Profile._read_profiles()
-        profiles_dict[self.uuid] = self.as_dict()
-        Profile._write_profiles(profiles_dict)
+        Profile.registry().set(self.uuid, self.as_dict())
+    
+    @staticmethod
+    def registry():
+        return Registries().profiles()
     
     @staticmethod
     def _read_profiles():
-        with open(Locations().join_abs_path('profiles.json'), 'r') as json_cache_file:
-            return json.load(json_cache_file)
+        return Profile.registry().as_dict()
     
     @staticmethod
     def _write_profiles(profiles_dict: dict):
-        with open(Locations().join_abs_path('profiles.json'), 'w') as json_file:
-            log.debug(f"towritedict: {profiles_dict}")
-            json.dump(profiles_dict, json_file)
+        log.debug(f"towritedict: {profiles_dict}")
+        Profile.registry().replace(profiles_dict)
     
 class SeedCrate(RoCrateGitBase):
-    def __init__(self,repo_url):
+    __slots__ = ('repo_url', '_location')
+    
+    def __init__(self,repo_url, fetch=True):
+        """
+        :param repo_url: git url of the seed crate
+        :type repo_url: str
+        :param fetch: Optional - clone or pull the repo when it is missing or stale,
+                      when False a missing repo is left to the background sync
+        :type fetch: bool
+        """
         self.repo_url =repo_url
         self._location = Locations().get_repo_location_by_url(repo_url)
-        if os.path.exists(self._location) == False:
-            self.clone_repo(repo_url= self.repo_url)
-        # check if the location exists, if not call GitRepoCache.clone_content(location(), repo_url)
+        if fetch:
+            self.sync()
+        elif os.path.exists(self._location) == False:
+            log.info(f"seed crate {repo_url} is not cloned yet, left to the background sync")
         
     def __hash__(self) -> int:
         return self.repo_url.__hash__()
@@ -139,11 +179,11 @@ class SeedCrate(RoCrateGitBase):
       return self._location
   
     @staticmethod
-    def load_all(set_urls):
+    def load_all(set_urls, fetch=True):
         """creates a dictionary by repo url for all passed repo urls"""
         #TODO: have exception for NOneType input
         try:
-            seeds_dict = {url: SeedCrate(url) for url in set_urls}
+            seeds_dict = {url: SeedCrate(url, fetch=fetch) for url in set_urls}
             log.debug(f"All seedcrate urls : {set_urls}")
             return seeds_dict
         except:
@@ -0,0 +1,572 @@
+#registry model here
+import os, json, threading, tempfile, shutil, sqlite3, bisect
+from datetime import datetime
+from contextlib import contextmanager
+import logging
+from .location import Locations, singleton
+from .pathindex import StoragePathIndex, storage_path_key, ancestor_keys
+try:
+    import fcntl
+except ImportError:
+    #windows has no fcntl, use msvcrt region locking instead
+    fcntl = None
+    import msvcrt
+
+log=logging.getLogger(__name__)
+
+class FileLock():
+    """ Cross-process exclusive lock held on a sidecar .lock file.
+        Used as a context manager around every registry commit so that
+        several gunicorn workers never interleave their writes.
+    """
+    def __init__(self, path):
+        """
+        :param path: path of the lock file, created when missing
+        :type path: Path
+        """
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    #LK_LOCK gives up after 10 seconds, keep on waiting
+                    continue
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+def _matches(entry, where=None, prefix=None):
+    for field, value in (where or {}).items():
+        if entry.get(field) != value:
+            return False
+    for field, value in (prefix or {}).items():
+        if not str(entry.get(field) or "").startswith(value):
+            return False
+    return True
+
+class _PendingWrite():
+    """a mutation waiting to be committed by the next flush of a registry"""
+    def __init__(self, mutation):
+        self.mutation = mutation
+        self.error = None
+        self.done = False
+
+class JsonRegistry():
+    """ In-memory view of a json registry file (spaces.json, profiles.json).
+        The parsed content is kept in memory and only reloaded when the
+        (inode, mtime, size) stamp of the file changes on disk.
+        Changes go through update() which commits them under a file lock
+        by writing a temp file and renaming it over the registry, mutations
+        queued while another thread is committing are flushed together.
+    """
+    def __init__(self, path):
+        """
+        :param path: absolute path of the json file backing the registry
+        :type path: Path
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._data = {}
+        self._stamp = None
+        self._sorted_keys = None
+        self._path_index = None
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"JsonRegistry(path={self.path})"
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        """reload the file if it changed since the last read"""
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            with open(self.path, 'r') as json_cache_file:
+                self._data = json.load(json_cache_file)
+            self._sorted_keys = None
+            self._path_index = None
+            self._stamp = stamp
+            log.debug(f"reloaded registry {self.path} with {len(self._data)} entries")
+        return self._data
+
+    def get(self, uuid, default=None):
+        """get a copy of the entry for the given uuid
+        :param uuid: key of the entry
+        :type  uuid: str
+        :return: the entry as a dict or default if not found
+        """
+        with self._lock:
+            entry = self._refresh().get(uuid)
+        return default if entry is None else dict(entry)
+
+    def __getitem__(self, uuid):
+        entry = self.get(uuid)
+        if entry is None:
+            raise KeyError(uuid)
+        return entry
+
+    def __contains__(self, uuid):
+        with self._lock:
+            return uuid in self._refresh()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._refresh())
+
+    def keys(self):
+        with self._lock:
+            return list(self._refresh().keys())
+
+    def items(self):
+        """list of (uuid, entry) tuples, the entries are copies"""
+        with self._lock:
+            return [(uuid, dict(entry)) for uuid, entry in self._refresh().items()]
+
+    def as_dict(self):
+        """shallow copy of the complete registry, safe to modify by the caller"""
+        return dict(self.items())
+
+    def find(self, field, value):
+        """list of (uuid, entry) tuples for all entries where entry[field] == value"""
+        return [(uuid, entry) for uuid, entry in self.items() if entry.get(field) == value]
+
+    def scan(self, after=None, where=None, prefix=None):
+        """iterate over (uuid, entry) tuples ordered by uuid
+        :param after: Optional - only give entries with a uuid sorting after this one
+        :type  after: str
+        :param where: Optional - dict of field: value the entries must be equal to
+        :type  where: dict
+        :param prefix: Optional - dict of field: prefix the entry fields must start with
+        :type  prefix: dict
+        """
+        with self._lock:
+            data = self._refresh()
+            if self._sorted_keys is None:
+                self._sorted_keys = sorted(data)
+            keys = self._sorted_keys
+        #data and keys are replaced, never modified, on reload or commit so they stay a consistent snapshot
+        start = 0 if after is None else bisect.bisect_right(keys, after)
+        for uuid in keys[start:]:
+            entry = data[uuid]
+            if _matches(entry, where, prefix):
+                yield uuid, dict(entry)
+
+    def path_conflict(self, storage_path):
+        """find the entry whose storage_path is the given path, one of its parents or a folder inside it
+        :param storage_path: path to check
+        :type  storage_path: Path
+        :return: the uuid of the conflicting entry or None
+        :rtype: str
+        """
+        with self._lock:
+            self._refresh()
+            if self._path_index is None:
+                self._path_index = StoragePathIndex(
+                    (uuid, entry['storage_path']) for uuid, entry in self._data.items() if entry.get('storage_path'))
+            path_index = self._path_index
+        return path_index.conflict(storage_path)
+
+    def _update_path_index(self, old_data, new_data):
+        """keep an already built path index in line with a commit instead of rebuilding it"""
+        if self._path_index is None:
+            return
+        for uuid in old_data.keys() - new_data.keys():
+            self._path_index.remove(uuid)
+        for uuid, entry in new_data.items():
+            old_path = old_data.get(uuid, {}).get('storage_path')
+            if entry.get('storage_path') != old_path:
+                if entry.get('storage_path'):
+                    self._path_index.add(uuid, entry['storage_path'])
+                else:
+                    self._path_index.remove(uuid)
+
+    def set(self, uuid, entry: dict):
+        """add or overwrite the entry for the given uuid"""
+        entry = dict(entry)
+        self.update(lambda data: data.__setitem__(uuid, entry))
+
+    def delete(self, uuid):
+        """remove the entry for the given uuid
+        :raises KeyError: the supplied key was not found in the registry
+        """
+        self.update(lambda data: data.pop(uuid))
+
+    def patch(self, uuid, changes: dict):
+        """update some fields of an existing entry
+        :raises KeyError: the supplied key was not found in the registry
+        """
+        changes = dict(changes)
+        self.update(lambda data: data[uuid].update(changes))
+
+    def replace(self, data: dict):
+        """write the complete registry dict back to disk and keep it as the in-memory view"""
+        new_data = {uuid: dict(entry) for uuid, entry in data.items()}
+        def _replace(current):
+            current.clear()
+            current.update(new_data)
+        self.update(_replace)
+
+    def update(self, mutation):
+        """apply a mutation to the registry and commit it to disk
+        :param mutation: callable that gets the registry dict and modifies it in place
+        :type  mutation: callable
+        :raises: any exception raised by the mutation itself
+        """
+        pending = _PendingWrite(mutation)
+        with self._pending_lock:
+            self._pending.append(pending)
+        with self._commit_lock:
+            #an earlier flush might have committed this mutation together with its own
+            if not pending.done:
+                self._flush()
+        if pending.error is not None:
+            raise pending.error
+
+    def _flush(self):
+        """commit all queued mutations with a single write of the registry file"""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        with FileLock(self.path + '.lock'), self._lock:
+            #other processes could have committed in the mean time, start from what is on disk
+            if os.path.exists(self.path):
+                self._refresh()
+            data = {uuid: dict(entry) for uuid, entry in self._data.items()}
+            for pending in batch:
+                try:
+                    pending.mutation(data)
+                except Exception as e:
+                    pending.error = e
+            try:
+                self._write_atomic(data)
+                self._update_path_index(self._data, data)
+                self._data = data
+                self._sorted_keys = None
+                self._stamp = self._file_stamp()
+            except Exception as e:
+                log.error(f"committing registry {self.path} failed")
+                log.exception(e)
+                for pending in batch:
+                    pending.error = pending.error or e
+            finally:
+                for pending in batch:
+                    pending.done = True
+        log.debug(f"committed {len(batch)} change(s) to {self.path}")
+
+    def _write_atomic(self, data: dict):
+        folder, filename = os.path.split(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.'+filename+'.', suffix='.tmp', dir=folder)
+        try:
+            with os.fdopen(fd, 'w') as json_file:
+                json.dump(data, json_file)
+                json_file.flush()
+                os.fsync(json_file.fileno())
+            if os.path.exists(self.path):
+                shutil.copymode(self.path, tmp_path)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+class SqliteRegistry():
+    """ Registry stored as rows of a table in a sqlite database.
+        Each entry is kept as a json document next to indexed columns for the
+        fields that are looked up (uuid, storage_path, ro_profile, repo_url) so
+        single entry changes are row updates instead of full file rewrites.
+        The first time a table is opened it is filled from the json registry
+        file that it replaces.
+    """
+    INDEXED_FIELDS = {
+        'spaces': ('storage_path', 'ro_profile'),
+        'profiles': ('repo_url',),
+    }
+    #indexed columns computed from the entry instead of copied from it
+    DERIVED_FIELDS = {
+        'spaces': {'storage_key': lambda entry: storage_path_key(entry['storage_path']) if entry.get('storage_path') else None},
+    }
+
+    def __init__(self, db_path, table, json_path=None):
+        """
+        :param db_path: path of the sqlite database file
+        :type db_path: Path
+        :param table: name of the table holding the registry (spaces, profiles)
+        :type table: str
+        :param json_path: Optional - json registry file to migrate from on first use
+        :type json_path: Path
+        """
+        self.path = db_path
+        self.table = table
+        self.fields = SqliteRegistry.INDEXED_FIELDS.get(table, ())
+        self.derived = SqliteRegistry.DERIVED_FIELDS.get(table, {})
+        self._local = threading.local()
+        self._setup(json_path)
+
+    def __repr__(self) -> str:
+        return f"SqliteRegistry(path={self.path}, table={self.table})"
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _setup(self, json_path):
+        connection = self._connection()
+        all_fields = self.fields + tuple(self.derived)
+        columns = "".join(f", {field} TEXT" for field in all_fields)
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (uuid TEXT PRIMARY KEY{columns}, data TEXT NOT NULL)")
+        #databases made by an older version can miss some of the columns
+        existing = {row[1] for row in connection.execute(f"PRAGMA table_info({self.table})").fetchall()}
+        missing = [field for field in all_fields if field not in existing]
+        for field in missing:
+            connection.execute(f"ALTER TABLE {self.table} ADD COLUMN {field} TEXT")
+        for field in all_fields:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_{field} ON {self.table}({field})")
+        if missing:
+            with self._transaction() as cursor:
+                for uuid, data in cursor.execute(f"SELECT uuid, data FROM {self.table}").fetchall():
+                    self._write_row(cursor, uuid, json.loads(data))
+        connection.execute("CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY, migrated_at TEXT NOT NULL)")
+        with self._transaction() as cursor:
+            done = cursor.execute("SELECT 1 FROM migrations WHERE name = ?", (self.table,)).fetchone()
+            if done is None:
+                migrated = 0
+                if json_path is not None and os.path.exists(json_path):
+                    with open(json_path, 'r') as json_cache_file:
+                        for uuid, entry in json.load(json_cache_file).items():
+                            self._write_row(cursor, uuid, entry)
+                            migrated += 1
+                cursor.execute("INSERT INTO migrations (name, migrated_at) VALUES (?, ?)", (self.table, datetime.now().isoformat()))
+                log.info(f"migrated {migrated} entries from {json_path} into {self}")
+
+    @contextmanager
+    def _transaction(self):
+        """write transaction, BEGIN IMMEDIATE takes the database write lock up front"""
+        cursor = self._connection().cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.close()
+
+    def _write_row(self, cursor, uuid, entry: dict):
+        all_fields = self.fields + tuple(self.derived)
+        columns = "".join(f", {field}" for field in all_fields)
+        placeholders = ", ?" * len(all_fields)
+        values = ([uuid] + [entry.get(field) for field in self.fields]
+                  + [derive(entry) for derive in self.derived.values()] + [json.dumps(entry)])
+        cursor.execute(f"INSERT OR REPLACE INTO {self.table} (uuid{columns}, data) VALUES (?{placeholders}, ?)", values)
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    def get(self, uuid, default=None):
+        """get a copy of the entry for the given uuid
+        :param uuid: key of the entry
+        :type  uuid: str
+        :return: the entry as a dict or default if not found
+        """
+        rows = self._query(f"SELECT data FROM {self.table} WHERE uuid = ?", (uuid,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def __getitem__(self, uuid):
+        entry = self.get(uuid)
+        if entry is None:
+            raise KeyError(uuid)
+        return entry
+
+    def __contains__(self, uuid):
+        return bool(self._query(f"SELECT 1 FROM {self.table} WHERE uuid = ?", (uuid,)))
+
+    def __len__(self):
+        return self._query(f"SELECT COUNT(*) FROM {self.table}")[0][0]
+
+    def keys(self):
+        return [row[0] for row in self._query(f"SELECT uuid FROM {self.table} ORDER BY uuid")]
+
+    def items(self):
+        """list of (uuid, entry) tuples"""
+        return [(row[0], json.loads(row[1])) for row in self._query(f"SELECT uuid, data FROM {self.table} ORDER BY uuid")]
+
+    def as_dict(self):
+        """copy of the complete registry, safe to modify by the caller"""
+        return dict(self.items())
+
+    def find(self, field, value):
+        """list of (uuid, entry) tuples for all entries where entry[field] == value"""
+        if field not in self.fields:
+            return [(uuid, entry) for uuid, entry in self.items() if entry.get(field) == value]
+        rows = self._query(f"SELECT uuid, data FROM {self.table} WHERE {field} = ? ORDER BY uuid", (value,))
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def path_conflict(self, storage_path):
+        """find the entry whose storage_path is the given path, one of its parents or a folder inside it
+        :param storage_path: path to check
+        :type  storage_path: Path
+        :return: the uuid of the conflicting entry or None
+        :rtype: str
+        """
+        key = storage_path_key(storage_path)
+        #the path itself or anything nested in it is one range scan on the storage_key index
+        rows = self._query(f"SELECT uuid FROM {self.table} WHERE storage_key >= ? AND storage_key < ? LIMIT 1",
+                           (key, key + "\U0010ffff"))
+        if rows:
+            return rows[0][0]
+        parents = list(ancestor_keys(key))
+        placeholders = ", ".join("?" * len(parents))
+        rows = self._query(f"SELECT uuid FROM {self.table} WHERE storage_key IN ({placeholders}) LIMIT 1", parents)
+        return rows[0][0] if rows else None
+
+    SCAN_BATCH = 500
+
+    def scan(self, after=None, where=None, prefix=None):
+        """iterate over (uuid, entry) tuples ordered by uuid
+        :param after: Optional - only give entries with a uuid sorting after this one
+        :type  after: str
+        :param where: Optional - dict of field: value the entries must be equal to
+        :type  where: dict
+        :param prefix: Optional - dict of field: prefix the entry fields must start with
+        :type  prefix: dict
+        """
+        conditions, params = [], []
+        #indexed fields are filtered by sqlite, the others on the decoded entries
+        rest_where = {}
+        for field, value in (where or {}).items():
+            if field in self.fields:
+                conditions.append(f"{field} = ?")
+                params.append(value)
+            else:
+                rest_where[field] = value
+        rest_prefix = {}
+        for field, value in (prefix or {}).items():
+            if field in self.fields:
+                #range condition so the index on the column can be used
+                conditions.append(f"{field} >= ? AND {field} < ?")
+                params.extend([value, value + "\U0010ffff"])
+            else:
+                rest_prefix[field] = value
+        last = after
+        while True:
+            #keyset pagination, every batch is a separate query so the generator can be consumed from any thread
+            batch_conditions = conditions + (["uuid > ?"] if last is not None else [])
+            batch_params = params + ([last] if last is not None else [])
+            where_sql = (" WHERE " + " AND ".join(batch_conditions)) if batch_conditions else ""
+            rows = self._query(f"SELECT uuid, data FROM {self.table}{where_sql} ORDER BY uuid LIMIT {self.SCAN_BATCH}", batch_params)
+            for uuid, data in rows:
+                entry = json.loads(data)
+                if _matches(entry, rest_where, rest_prefix):
+                    yield uuid, entry
+            if len(rows) < self.SCAN_BATCH:
+                return
+            last = rows[-1][0]
+
+    def set(self, uuid, entry: dict):
+        """add or overwrite the entry for the given uuid"""
+        with self._transaction() as cursor:
+            self._write_row(cursor, uuid, entry)
+
+    def delete(self, uuid):
+        """remove the entry for the given uuid
+        :raises KeyError: the supplied key was not found in the registry
+        """
+        with self._transaction() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE uuid = ?", (uuid,))
+            if cursor.rowcount == 0:
+                raise KeyError(uuid)
+
+    def patch(self, uuid, changes: dict):
+        """update some fields of an existing entry
+        :raises KeyError: the supplied key was not found in the registry
+        """
+        with self._transaction() as cursor:
+            row = cursor.execute(f"SELECT data FROM {self.table} WHERE uuid = ?", (uuid,)).fetchone()
+            if row is None:
+                raise KeyError(uuid)
+            entry = json.loads(row[0])
+            entry.update(changes)
+            self._write_row(cursor, uuid, entry)
+
+    def replace(self, data: dict):
+        """replace the complete content of the registry"""
+        with self._transaction() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            for uuid, entry in data.items():
+                self._write_row(cursor, uuid, entry)
+
+    def update(self, mutation):
+        """apply a mutation to the complete registry dict, only the changed rows are written
+        :param mutation: callable that gets the registry dict and modifies it in place
+        :type  mutation: callable
+        """
+        with self._transaction() as cursor:
+            rows = cursor.execute(f"SELECT uuid, data FROM {self.table}").fetchall()
+            current = {row[0]: json.loads(row[1]) for row in rows}
+            data = {uuid: dict(entry) for uuid, entry in current.items()}
+            mutation(data)
+            for uuid in current.keys() - data.keys():
+                cursor.execute(f"DELETE FROM {self.table} WHERE uuid = ?", (uuid,))
+            for uuid, entry in data.items():
+                if current.get(uuid) != entry:
+                    self._write_row(cursor, uuid, entry)
+
+@singleton
+class Registries():
+    """ Process wide store of the registries, one per backing file.
+        The env var DMBON_FAST_API_REGISTRY_BACKEND selects where the
+        registries are kept: "json" (default) or "sqlite".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._registries = {}
+
+    def get(self, filename):
+        """get the registry for a file in the root of the Locations()
+        :param filename: name of the json file (spaces.json, profiles.json)
+        :type  filename: str
+        :rtype: JsonRegistry or SqliteRegistry
+        """
+        backend = os.environ.get("DMBON_FAST_API_REGISTRY_BACKEND", "json").lower()
+        path = Locations().join_abs_path(filename)
+        with self._lock:
+            if (backend, path) not in self._registries:
+                if backend == "sqlite":
+                    table = os.path.splitext(filename)[0]
+                    registry = SqliteRegistry(Locations().join_abs_path('registry.sqlite'), table, json_path=path)
+                else:
+                    registry = JsonRegistry(path)
+                self._registries[(backend, path)] = registry
+            return self._registries[(backend, path)]
+
+    def spaces(self):
+        return self.get('spaces.json')
+
+    def profiles(self):
+        return self.get('profiles.json')
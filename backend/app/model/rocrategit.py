@@ -1,12 +1,18 @@
 import git, os, json
+from urllib.parse import quote
+import uuid as uuidmake
 from abc import abstractmethod
+from contextlib import contextmanager
 from .location import Locations
+from .cratecache import CrateMetadataCache
+from .crategraph import CrateGraph
 from rocrate.rocrate import ROCrate
 import logging
 import stat
 import shutil
 from subprocess import call
-import app.shacl_helper as shclh
+from .constraints import ConstraintModels
+from .registry import FileLock
 
 log=logging.getLogger(__name__)
 
@@ -24,16 +30,62 @@ class GitRepoCache():
         return("git@github.com:"+repo_owner+"/"+repo_name+".git")
     
     @staticmethod
-    def clone_content(location, repo_url): 
+    def mirror(repo_url, fetch_url=None):
+        """ bring the local bare mirror of a repo up to date, cloning it the first time
+        :param repo_url: url of the repo, its mirror is found by the normalised url
+        :type  repo_url: str
+        :param fetch_url: Optional - url to fetch from, defaults to the github ssh url of repo_url
+        :type  fetch_url: str
+        :return: path of the mirror
+        :rtype: Path
+        """
+        fetch_url = fetch_url or GitRepoCache.repo_url_to_git_ssh_url(repo_url=repo_url)
+        mirror_path = Locations().get_mirror_location_by_url(repo_url)
+        os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+        with FileLock(mirror_path + '.lock'):
+            if os.path.isdir(mirror_path):
+                log.debug(f"fetching {fetch_url} into mirror {mirror_path}")
+                git.Repo(mirror_path).git.fetch('--prune', fetch_url, '+refs/*:refs/*')
+            else:
+                log.info(f"making mirror {mirror_path} of {fetch_url}")
+                tmp_path = f"{mirror_path}.{uuidmake.uuid4().hex}.tmp"
+                try:
+                    mirror_repo = git.Repo.clone_from(fetch_url, tmp_path, mirror=True)
+                    #checkouts borrow objects from the mirror, gc must never drop them
+                    mirror_repo.git.config('gc.auto', '0')
+                    mirror_repo.git.config('gc.pruneExpire', 'never')
+                    os.rename(tmp_path, mirror_path)
+                except BaseException:
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    raise
+        return mirror_path
+
+    @staticmethod
+    def clone_content(location, repo_url, fetch_url=None): 
         #  clone repo_url to location
         #  convert the repo url to a ssh url
-        ssh_url = GitRepoCache.repo_url_to_git_ssh_url(repo_url=repo_url)
-        try:
-            git.Repo.clone_from(ssh_url, location)
-        except:
+        ssh_url = fetch_url or GitRepoCache.repo_url_to_git_ssh_url(repo_url=repo_url)
+        if os.path.exists(location):
             log.info(f"deleting existing repo on location {location} for repo :{ssh_url}")
             shutil.rmtree(location, onerror=on_rm_error)
-            git.Repo.clone_from(ssh_url, location)         
+        try:
+            mirror_path = GitRepoCache.mirror(repo_url, fetch_url=ssh_url)
+        except Exception as e:
+            log.warning(f"no mirror for {repo_url}, cloning it directly: {e}")
+            git.Repo.clone_from(ssh_url, location)
+            return
+        #the objects stay in the mirror (alternates), only the checkout is written
+        repo = git.Repo.clone_from(mirror_path, location, shared=True)
+        repo.remote(name='origin').set_url(ssh_url)
+
+    @staticmethod
+    def read_file(repo_url, path, fetch_url=None):
+        """ content of a file at HEAD of a repo, read from its mirror without a checkout
+        :raises git.exc.GitCommandError: the file is not in the repo
+        :rtype: str
+        """
+        mirror_path = GitRepoCache.mirror(repo_url, fetch_url=fetch_url)
+        return git.Repo(mirror_path).git.show(f"HEAD:{path}")
     
     @staticmethod
     def update_content(location):
@@ -64,6 +116,8 @@ class GitRepoCache():
         repo.create_head('master')
 
 class RoCrateGitBase():
+    #no instance dict, the subclasses declare their own __slots__
+    __slots__ = ()
     
     def __init__():
         pass
@@ -91,13 +145,8 @@ class RoCrateGitBase():
     def get_predicates_all(self):
         """ get predicates from all ids
         """
-        md = self._read_metadata_datacrate()
-        log.debug(md)
-        all_files = []
-        for dictionaries in md["@graph"]:
-            for item, value in dictionaries.items():
-                if item == "@id":
-                    all_files.append(value)
+        graph = self._crate_graph()
+        all_files = graph.ids()
         log.debug(all_files)
         #foreach file get all the attributes
         files_attributes = {}
@@ -108,13 +157,10 @@ class RoCrateGitBase():
                     #TODO use uri templates and rename /file/ to /resource/ 
                     # urit = "os.getenv('BASE_URL_SERVER') + 'apiv1/' + 'spaces/{uuid}/annotation/resource/{rid}'"
                     # uritemplates(urit).expand(dict(uuid=self.uuid, rid=file))
-                    clicktrough_url = os.getenv('BASE_URL_SERVER') + 'apiv1/' + 'spaces/' + self.uuid + '/annotation/file/' + file
+                    clicktrough_url = os.getenv('BASE_URL_SERVER') + 'apiv1/' + 'spaces/' + self.uuid + '/annotation/file/' + quote(file)
                     files_attributes[file]['url_file_metadata'] = clicktrough_url
-                    for dictionaries in md["@graph"]:
-                        for item, value in dictionaries.items():
-                            if item == "@id" and value==file:
-                                for item_save, value_save in dictionaries.items():
-                                    files_attributes[file][item_save] = value_save
+                    for entity in graph.entities(file):
+                        files_attributes[file].update(entity)
         log.debug(f'All predicates from all files from project : {files_attributes}')
         return {"data":files_attributes}
     
@@ -124,69 +170,38 @@ class RoCrateGitBase():
         :param id: str of the id to get all the predicates of in the ro-crate-metadata.json
         :type  id: str
         """
-        data = self._read_metadata_datacrate()
-        log.info(f"metadata of the space: {data}")
+        graph = self._crate_graph()
         path_shacl = os.path.join(Locations().get_workspace_location_by_uuid(space_uuid=self.uuid),"all_constraints.ttl")
         log.info(path_shacl)
         all_files = []
         #implement the shacl constraint check here
         #read in shacl file
-        f_constraints = open(path_shacl, "r")
-        f_constraints_text = f_constraints.read()
-        test = shclh.ShapesInfoGraph(path_shacl)
-        shacldata = test.full_shacl_graph_dict()
-        #convert the shacl file to have all the properties per node id
-        node_properties_dicts = []
-        for node_to_check in shacldata:
-            toaddnode = {}
-            if node_to_check["target"] is not None:
-                target = node_to_check["target"].split("/")[-1]
-                toaddnode[target] = []
-                for propname , semantic_properties in node_to_check["properties"].items():
-                    #add reciproce checking for nodes in nodes here
-                    toaddnode[target].append({propname.split('/')[-1]: semantic_properties})
-                node_properties_dicts.append(toaddnode)
-        
-        log.debug(node_properties_dicts)
+        with open(path_shacl, "r") as f_constraints:
+            f_constraints_text = f_constraints.read()
+        model = self._constraint_model(path_shacl)
                 
         all_predicates = []
-        #get all files from the projectfile
-        for dictionaries in data["@graph"]:
-            for item, value in dictionaries.items():
-                if item == "@id" and value == file_id:
-                    for item_save, value_save in dictionaries.items():
-                        all_predicates.append(item_save)
-                        all_files.append({'predicate':item_save,'value':value_save})
+        #get all predicates of the resource from the projectfile
+        for entity in graph.entities(file_id):
+            for item_save, value_save in entity.items():
+                all_predicates.append(item_save)
+                all_files.append({'predicate':item_save,'value':value_save})
         
         if len(all_predicates) == 0:
             return {"error":404,"detail":"Resource not found"}
         
         log.info(all_files)
         all_props = []
+        all_props_shacl = []
         #get all predicates and if they are required
         for items in all_files:
-            if items["predicate"] == "@type":
-                for node in node_properties_dicts:
-                    for nodekey, nodevalue in node.items():
-                        if nodekey == items["value"]:
-                            all_props = []
-                            all_props_shacl = []
-                            for prop in nodevalue:
-                                for propkey, propvalue in prop.items():
-                                    propmin = 0
-                                    for propattribute, propattributevalue in propvalue.items():
-                                        if propmin == 0:
-                                            if propattribute == "min" and propattributevalue is not None:
-                                                propmin = 1
-                                        if propattribute == "type" and propattributevalue is not None:
-                                            proptype = propattributevalue
-                                        if propattribute == "type" and propattributevalue is None:
-                                            proptype = 'String'
-                                        if propattribute == "values" and propattributevalue is not None:
-                                            valueprop = propattributevalue                                             
-                                    all_props.append({propkey:{'min':propmin,'value':valueprop,'typeprop':proptype}})
-                                    all_props_shacl.append({'label':propkey,'min':propmin,'value':valueprop,'typeprop':proptype})
-                                log.debug(all_props)
+            if items["predicate"] == "@type" and model.shape_for(items["value"]) is not None:
+                all_props = []
+                all_props_shacl = []
+                for prop in model.properties_for(items["value"]):
+                    all_props.append({prop.label:prop.requirement()})
+                    all_props_shacl.append(dict(label=prop.label, **prop.requirement()))
+                log.debug(all_props)
         try:                              
             present = 0
             missing = 0
@@ -218,30 +233,25 @@ class RoCrateGitBase():
         :param toadd_dict: dictionary of all the predicates and value to add to the ro-crate-metadata.json
         :type  toadd_dict: dict
         """
-        #try and get the same result by using rocrate
-        myrocrate = ROCrate(self.storage_path)
-        data_entities = myrocrate.data_entities
-        for entity in data_entities:
-            log.info(f"Crate data entities: {entity._jsonld}")
-            for annotationfile in toadd_dict:
-                uri_name  = annotationfile.URI_predicate_name
-                value_uri = annotationfile.value
-                entity[uri_name] = value_uri
-        myrocrate.write(self.storage_path)
+        with self._edit_crate_graph() as graph:
+            for entity in graph.data_entities():
+                log.info(f"Crate data entities: {entity}")
+                for annotationfile in toadd_dict:
+                    uri_name  = annotationfile.URI_predicate_name
+                    value_uri = annotationfile.value
+                    graph.set(entity, uri_name, value_uri)
     
     def delete_predicates_all(self,todelete_dict=dict):
         """ delete predicates from all ids 
         :param todelete_dict: dictionary of all the predicates and value to delete from the ro-crate-metadata.json
         :type  todelete_dict: dict
         """
-        myrocrate = ROCrate(self.storage_path)
-        data_entities = myrocrate.data_entities
-        for entity in data_entities:
-            log.info(f"Crate data entities: {entity._jsonld}")
-            for annotationfile in todelete_dict:
-                uri_name  = annotationfile.URI_predicate_name
-                entity.pop(uri_name, None)
-        myrocrate.write(self.storage_path)
+        with self._edit_crate_graph() as graph:
+            for entity in graph.data_entities():
+                log.info(f"Crate data entities: {entity}")
+                for annotationfile in todelete_dict:
+                    uri_name  = annotationfile.URI_predicate_name
+                    graph.pop(entity, uri_name, None)
         
     def delete_predicates_by_id(self,to_delete_predicate=str, file_id=str):
         """ delete predicates to given ids by giving a dictionary of predicates to delete 
@@ -251,26 +261,18 @@ class RoCrateGitBase():
         :type  file_id: str
         :raises KeyError: the supplied key was not found in the ro-crate-metadata.json file
         """
-        tocheck_folder = self.storage_path
-        todelete = False
-        #load in metadata files
-        data = self._read_metadata_datacrate()
-
         #find id of file and delete predicate of existing 
-        for ids in data['@graph']:
-            if ids['@id'] == file_id:
-                todelete = True
-                try:
-                    ids.pop(to_delete_predicate)
-                except:
-                    return {"error":404,"detail":"Predicate not found"}
-                
-        if todelete != True:
+        entities = self._crate_graph().entities(file_id)
+        if any(to_delete_predicate not in entity for entity in entities):
+            return {"error":404,"detail":"Predicate not found"}
+        if len(entities) == 0:
             return {"error":404,"detail":"File not found"}
-                            
-        #write back data to meta json file
-        self._write_metadata_datacrate(data=data)
-        return {"data":data}
+        
+        #write back data to meta json file when done
+        with self._edit_crate_graph() as graph:
+            for entity in graph.entities(file_id):
+                graph.pop(entity, to_delete_predicate, None)
+        return {"data":graph.data}
     
     def add_predicates_by_id(self,toadd_dict_list=list, file_id=str):
         """ add predicates to given ids by giving a dictionary of predicates to add to what id
@@ -280,115 +282,97 @@ class RoCrateGitBase():
         :type  file_id: str
         :raises KeyError: the supplied key was not found in the ro-crate-metadata.json file
         """
-        path_shacl = os.path.join(Locations().get_workspace_location_by_uuid(space_uuid=self.uuid),"all_constraints.ttl")
-        log.info(path_shacl)
-        test = shclh.ShapesInfoGraph(path_shacl)
-        shacldata = test.full_shacl_graph_dict()
-        data = self._read_metadata_datacrate()
-        
-        myrocrate = ROCrate(self.storage_path)
-        data_entities = myrocrate.data_entities
-
-        #convert the chacl file to have all the properties per node id
-        node_properties_dicts = []
-        for node_to_check in shacldata:
-            toaddnode = {}
-            if node_to_check["target"] is not None:
-                target = node_to_check["target"].split("/")[-1]
-                toaddnode[target] = []
-                for propname , semantic_properties in node_to_check["properties"].items():
-                    #add reciproce checking for nodes in nodes here 
-                    toaddnode[target].append({propname.split('/')[-1]: semantic_properties})
-                node_properties_dicts.append(toaddnode)
-        
+        model = self._constraint_model()
+        graph = self._crate_graph()
         
         all_files = []
         all_predicates = []
-        #get all files from the projectfile
-        for dictionaries in data["@graph"]:
-            for iteme, value in dictionaries.items():
-                if iteme == "@id" and value == file_id:
-                    for item_save, value_save in dictionaries.items():
-                        all_predicates.append(item_save)
-                        all_files.append({'predicate':item_save,'value':value_save})
+        #get all predicates of the resource from the projectfile
+        for entity in graph.entities(file_id):
+            for item_save, value_save in entity.items():
+                all_predicates.append(item_save)
+                all_files.append({'predicate':item_save,'value':value_save})
         
         if len(all_predicates) == 0:
             return {"error":404,"detail":"Resource not found"}
         
+        #the constraints to check against are the ones of the (last) @type of the resource
+        to_search_type = None
+        for predicates in all_files:
+            if predicates['predicate'] == "@type":
+                to_search_type = predicates['value']
+        
         ## for each annotation given ##
         warnings = []
-        for annotationfile in toadd_dict_list:
-            uri_name  = annotationfile.URI_predicate_name
-            value_uri = annotationfile.value
+        with self._edit_crate_graph() as graph:
+            for annotationfile in toadd_dict_list:
+                uri_name  = annotationfile.URI_predicate_name
+                value_uri = annotationfile.value
             
-            ## check if annotation is in the shacl file ##
-            for predicates in all_files:
-                find_now = 0
-                for itemee, value in predicates.items():
-                    if itemee == 'predicate' and value == "@type":
-                        find_now = 1
-                    if itemee == "value" and find_now == 1:
-                        to_search_type = value
-            for node in node_properties_dicts:
-                for nodekey, nodevalue in node.items():
-                    if nodekey == to_search_type:
-                        all_props = []
-                        for prop in nodevalue:
-                            for propkey, propvalue in prop.items():
-                                propmin = 0
-                                for propattribute, propattributevalue in propvalue.items():
-                                    if propmin == 0:
-                                        if propattribute == "min" and propattributevalue is not None:
-                                            propmin = 1
-                                    
-                                    if propattribute == "type" and propattributevalue is not None:
-                                        proptype = propattributevalue
-                                    
-                                    if propattribute == "type" and propattributevalue is None:
-                                        proptype = 'String'
-                                    
-                                    if propattribute == "values" and propattributevalue is not None:
-                                        valueprop = propattributevalue
-                                            
-                                all_props.append({propkey:{'min':propmin,'value':valueprop,'typeprop':proptype}})
-
-            chacl_URI_list = []
-            for diff_kind_annotations in all_props:
-                for key_annotation , metadata_annotation in diff_kind_annotations.items():
-                    chacl_URI_list.append(key_annotation)
-            log.info(f"chacl_list_printed: {chacl_URI_list}")
-            for entity in data_entities:
-                log.info(f"Crate data entities: {entity._jsonld}")
-                if entity["@id"] == file_id:
-                    entity[uri_name]= value_uri
-            if uri_name not in chacl_URI_list:
-                warnings.append("non shacl defined constraint metadata has been added: "+ uri_name)
+                ## check if annotation is in the shacl file ##
+                chacl_URI_list = [prop.label for prop in model.properties_for(to_search_type)]
+                log.info(f"chacl_list_printed: {chacl_URI_list}")
+                for entity in graph.data_entities(file_id):
+                    log.info(f"Crate data entities: {entity}")
+                    graph.set(entity, uri_name, value_uri)
+                if uri_name not in chacl_URI_list:
+                    warnings.append("non shacl defined constraint metadata has been added: "+ uri_name)
                 
-            ## implement annotation in the data is found , send warning message is annotation title not found in constraints ##
-        ## write back to metadata file and return metadata.json file 
-        myrocrate.write(self.storage_path)
-        data = self._read_metadata_datacrate()
-        return {"Data":data, "Warnings":warnings}
+                ## implement annotation in the data is found , send warning message is annotation title not found in constraints ##
+        ## the metadata file was written back when leaving the with block, return it
+        return {"Data":graph.data, "Warnings":warnings}
         
     
     def _read_metadata_datacrate(self):
+        # the returned dict is shared through the CrateMetadataCache, do not change it, edit through _edit_crate_graph
         metadata_location = os.path.join(self.storage_path,'ro-crate-metadata.json') 
-        with open(metadata_location) as metadata_file:
-            return(json.load(metadata_file))
+        return CrateMetadataCache().read(metadata_location)
     
     def _write_metadata_datacrate(self,data):
         metadata_location = os.path.join(self.storage_path,'ro-crate-metadata.json') 
-        with open(metadata_location, 'w') as metadata_file:
-            json.dump(data, metadata_file)
+        CrateMetadataCache().write(metadata_location, data)
+    
+    def _crate_graph(self):
+        """ CrateGraph over the metadata of the data crate, kept with it in the CrateMetadataCache
+        """
+        metadata_location = os.path.join(self.storage_path,'ro-crate-metadata.json') 
+        return CrateMetadataCache().derived(metadata_location, 'graph', CrateGraph)
+    
+    def _crate_rdf(self, base):
+        """ rdf graph of the metadata of the data crate, converted once per revision of the crate by the CrateRdfs cache
+        :param base: iri the relative @ids of the crate are resolved against
+        :type  base: str
+        """
+        from app.services.craterdf import CrateRdfs
+        return CrateRdfs().graph(self.storage_path, base, metadata=self._read_metadata_datacrate())
+
+    @contextmanager
+    def _edit_crate_graph(self):
+        """ yields a CrateGraph over a copy of the metadata of the data crate and writes it back afterwards,
+            edits of the crate wait on each other and readers keep the metadata they had until the write,
+            on errors the copy is dropped and the crate stays as it was
+        """
+        metadata_location = os.path.join(self.storage_path,'ro-crate-metadata.json') 
+        cache = CrateMetadataCache()
+        with cache.lock(metadata_location):
+            graph = CrateGraph(cache.read_copy(metadata_location))
+            yield graph
+            cache.write(metadata_location, graph.data, derived={'graph':graph})
+    
+    def _constraint_model(self, path_shacl=None):
+        """ compiled constraints of the all_constraints.ttl in the workspace of this crate
+        :param path_shacl: Optional - path of the ttl file when it is not the one in the workspace
+        :type  path_shacl: Path
+        :rtype: ConstraintModel
+        """
+        if path_shacl is None:
+            path_shacl = os.path.join(Locations().get_workspace_location_by_uuid(space_uuid=self.uuid),"all_constraints.ttl")
+        return ConstraintModels().get(path_shacl)
     
     def _read_metadata(self):
         # use self.location() to extend towards ./ro-crate-metadata.json
         metadata_location = os.path.join(Locations().get_repo_location_by_url(self.repo_url),'ro-crate-metadata.json') 
-        # load it and return it in some form?
-        with open(metadata_location) as metadata_file:
-            return(json.load(metadata_file))
-        # and/or us the rocrate-py stuff
-        
+        return CrateMetadataCache().read(metadata_location)
     
 
     @abstractmethod
@@ -397,11 +381,21 @@ class RoCrateGitBase():
         """
         pass
 
-    def sync(self):
-        GitRepoCache().update_content(self.location())
+    def sync(self, force=False):
+        """ pull the repo unless it was fetched within the ttl of the sync scheduler
+        :param force: Optional - fetch even when the last fetch is still fresh
+        :type  force: bool
+        :return: the sync record
+        :rtype: dict
+        """
+        #imported here as the scheduler builds on GitRepoCache
+        from app.services.sync import RepoSyncs
+        return RepoSyncs().sync(self.repo_url, self.location(), force=force)
 
     def clone_repo(self,repo_url):
+        from app.services.sync import RepoSyncs
         GitRepoCache().clone_content(self.location(), repo_url)
+        RepoSyncs().record(repo_url, self.location())
         
     def make_repo(self):
         GitRepoCache().init_repo(self.location())
\ No newline at end of file
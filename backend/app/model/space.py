@@ -2,7 +2,12 @@
 import shutil
 from .profile import Profile
 from .location import Locations
+from .registry import Registries
 from .rocrategit import RoCrateGitBase
+from app.services.seeding import materialise_seeds
+from app.services.constraintbundle import build_constraint_bundle
+from app.services.execution import Execution
+from concurrent.futures import ThreadPoolExecutor
 import os, json, stat
 import uuid as uuidmake
 import logging
@@ -11,7 +16,11 @@ class Space(RoCrateGitBase):
     """ Class to represent a selectable profile for data spaces.
     This class tracks and manages/caches incomming profile data 
     retrieved from github repos.
+    A loaded space only keeps its registry entry, the profile is
+    loaded the first time ro_profile is used.
     """
+    __slots__ = ('storage_path', 'remote_url', 'uuid', 'workspace_path', '_name', '_ro_profile_uuid', '_ro_profile')
+    
     def __init__(self,storage_path,ro_profile,uuid=None,remote_url=None,workspace_path=None,name=None):
         """     
         :param storage_path: path on local disk where to store the dataset repo of the space
@@ -26,9 +35,13 @@ class Space(RoCrateGitBase):
         :type workspace_path: Path
         """  
         self.storage_path = storage_path
-        self.ro_profile = Profile.load(uuid = ro_profile)
+        self._ro_profile_uuid = ro_profile
+        self._ro_profile = None
         self.remote_url = remote_url #TODO: what todo with the the optionality of the property
+        self.workspace_path = workspace_path
         if uuid is None:
+            #a new space needs its profile now, this raises the KeyError of an unknown profile
+            self._ro_profile = Profile.load(uuid = ro_profile)
             self.uuid = uuidmake.uuid4().hex
             #check if remote url was  given, if yes then only init the repo and not copy files 
             log.debug(remote_url)
@@ -37,26 +50,38 @@ class Space(RoCrateGitBase):
                 log.debug(seed_dependencies)
                 #TODO: get all the seed_dependencies from the given profile uuid
                 self.make_repo()
-                repos_to_copy_over = []
-                for seed_repo in seed_dependencies.keys():
-                    repos_to_copy_over.append(seed_repo)
+                #a new space copies the seed crates, bring them up to date unless fetched within the ttl
+                seed_crates = list(seed_dependencies.values())
+                if seed_crates:
+                    with ThreadPoolExecutor(max_workers=len(seed_crates)) as pool:
+                        list(pool.map(lambda seed_crate: seed_crate.sync(), seed_crates))
                 #make the folder where the workspace will reside
                 self.workspace_path = Locations().get_workspace_location_by_uuid(self.uuid)
                 os.mkdir(self.workspace_path)
                 #copy over all the files from the repos
-                for repo in repos_to_copy_over:
-                    self._copy_files_to_workspace(repo_url=repo)
+                self._copy_files_to_workspace(repo_urls=list(seed_dependencies.keys()))
             #TODO: add the new metadata to the spaces.json file
             self.write()
         else:
             self.uuid = uuid
-            self.workspace_path = workspace_path #TODO: when to instantiate the workspace_path
+            #TODO: when to instantiate the workspace_path
         self._name = os.path.basename(self.storage_path)
         
     @property
     def name(self):
         return self._name       
     
+    @property
+    def ro_profile(self):
+        """the profile of the space, loaded on first use"""
+        if self._ro_profile is None:
+            self._ro_profile = Profile.load(uuid = self._ro_profile_uuid)
+        return self._ro_profile
+    
+    @property
+    def ro_profile_uuid(self):
+        return self._ro_profile_uuid
+    
     def __str__(self):
         return f"Space(uuid = {self.uuid})" 
     
@@ -74,7 +99,7 @@ class Space(RoCrateGitBase):
         """
         return dict(
                     storage_path= self.storage_path,
-                    ro_profile= self.ro_profile.uuid,
+                    ro_profile= self._ro_profile_uuid,
                     uuid= self.uuid,
                     remote_url= self.remote_url, 
                     workspace_path = self.workspace_path
@@ -89,57 +114,57 @@ class Space(RoCrateGitBase):
         :rtype: Space
         :raises KeyError: the supplied key was not found in the spaces.json file
         """
-        #get metadata profiles 
-        spaces_dict = Space._read_spaces()
-        return Space(**spaces_dict[uuid])
+        #get metadata space from the in-memory registry
+        return Space(**Space.registry()[uuid])
     
     @staticmethod
     def load_all():
         """creates a dictionary by uuid of all known profiles"""
-        spaces_dict = Space._read_spaces()
-        return {uuid:Space(**spaces_dict[uuid]) for uuid in spaces_dict}
+        return {uuid:Space(**info) for uuid, info in Space.registry().items()}
+    
+    @staticmethod
+    def exists(uuid :str):
+        """check if a space with the given uuid is known in the spaces.json"""
+        return uuid in Space.registry()
+    
+    @staticmethod
+    def read_info(uuid :str):
+        """get the spaces.json entry of a space without constructing the Space object
+        :param uuid: uuid of the space
+        :type uuid: str
+        :return: the dict entry of the space
+        :rtype: dict
+        :raises KeyError: the supplied key was not found in the spaces.json file
+        """
+        return Space.registry()[uuid]
     
     def write(self):
-        spaces_dict = Space._read_spaces()
-        spaces_dict[self.uuid] = self.as_dict()
-        Space._write_spaces(spaces_dict)
+        Space.registry().set(self.uuid, self.as_dict())
+    
+    @staticmethod
+    def registry():
+        return Registries().spaces()
         
     @staticmethod
     def _read_spaces():
-        with open(Locations().join_abs_path('spaces.json'), 'r') as json_cache_file:
-            return json.load(json_cache_file)
+        return Space.registry().as_dict()
     
     @staticmethod
     def _write_spaces(spaces_dict: dict):
-        with open(Locations().join_abs_path('spaces.json'), 'w') as json_file:
-            json.dump(spaces_dict, json_file)
+        Space.registry().replace(spaces_dict)
           
     def location(self):
         return self.storage_path
     
-    def _copy_files_to_workspace(self, repo_url):
-        """copy all the files from a given repo url to the workspace folder"""
-        #convert repo url to folder of the repo 
-        repo_location = Locations().get_repo_location_by_url(repo_url)
+    def _copy_files_to_workspace(self, repo_urls):
+        """copy all the files from the given seed repo urls to the space, their constraints to the workspace folder"""
+        #convert repo urls to folders of the repos
+        repo_locations = [Locations().get_repo_location_by_url(repo_url) for repo_url in repo_urls]
         #init the workspacvemanager
         workspace_manager = WorkSpaceManager(workspace_path=self.workspace_path)
-        # go over each file in the given folder and check if its not part of the .git folder -> copy over to the given self.storage_path
-        for subdir, dirs, files in os.walk(repo_location):
-            for file in files:
-                filepath = subdir + os.sep + file
-                if ".git" not in filepath:
-                    filetest = False
-                    #copy over the files to the workspace folder with the path structure intact relative to the seed repo location
-                    relative_path = filepath.split(file)[0].split(repo_location)[-1].replace(os.path.sep, "")
-                    #do all the workspâce tests here, if all give back false then copy the file over to the space folder
-                    filetest = workspace_manager.check_write_constraints(filepath=filepath)
-                    if filetest == False:
-                        if relative_path != "": 
-                            fileout  = os.path.join(self.storage_path,relative_path,file)
-                            if not os.path.exists(os.path.join(self.storage_path,relative_path)):
-                                os.makedirs(os.path.join(self.storage_path,relative_path))
-                        else: fileout  = os.path.join(self.storage_path,file)
-                        shutil.copyfile(filepath,fileout)
+        #the files keep their path relative to the seed repo location, the constraints are bundled in seed order
+        constraint_files = materialise_seeds(repo_locations, self.storage_path, is_constraint=WorkSpaceManager.is_constraint)
+        workspace_manager.write_constraints(filepaths=constraint_files)
                             
 class WorkSpaceManager():
     """Class to manage all the functions that will handle the copying of certain data to be put into the workspaces"""
@@ -147,19 +172,14 @@ class WorkSpaceManager():
     def __init__(self, workspace_path):
         self.workspace_path = workspace_path
     
-    def check_write_constraints(self,filepath):
-        if filepath.endswith(".ttl"):
-            #check if combined_file_name is already present in the workspace folder, if not make it , if yes then append to the file
-            fileout  = os.path.join(self.workspace_path,"all_constraints.ttl")
-            #open the file and get the data from it
-            #open the toappend file in a mode and append file data to it
-            f1 = open(filepath, 'r')
-            f2 = open(fileout, 'a+')
-            f2.write(f1.read())
-            f1.seek(0)
-            f1.close()
-            f2.seek(0)
-            f2.close()
-            return True
-        else:
-            return False
\ No newline at end of file
+    @staticmethod
+    def is_constraint(filepath):
+        return filepath.endswith(".ttl")
+    
+    def write_constraints(self,filepaths):
+        """bundle the shapes of the given ttl files, without duplicates, into all_constraints.ttl (and .nt) of the workspace"""
+        if not filepaths:
+            return None
+        fileout  = os.path.join(self.workspace_path,"all_constraints.ttl")
+        #parsing turtle is cpu bound, keep it off the GIL of the server process
+        return Execution().cpu(build_constraint_bundle, list(filepaths), fileout)
@@ -6,6 +6,7 @@ import requests, tempfile, shutil, subprocess, stat, numpy
 import uuid
 from rocrate.rocrate import ROCrate
 from abc import abstractmethod
+from app.model.rocrategit import GitRepoCache as MirrorCache
 
 # helper functions to read an rocrate
 def on_rm_error(func, path, exc_info):
@@ -19,29 +20,14 @@ class rocrate_helper:
         self.all_metadata = []
         try:
             response = requests.get(self.ro_path)
-            tpdir = tempfile.mkdtemp()
-            print(tpdir)
-            git.Repo.clone_from(self.ro_path, os.path.join(tpdir))
-            for filename in os.listdir(tpdir):
-                print(filename)
-                if filename == "ro-crate-metadata.json":
-                    self.ro_metafile = os.path.join(tpdir, filename)
-                    with open(os.path.join(self.ro_metafile), "r+")as file:
-                        self.ro_metadata = json.load(file)
-                        self.all_metadata.append({"location":"root","data":self.ro_metadata})
+            #read the metadata from the local mirror of the repo instead of a throwaway clone
+            mirror_path = MirrorCache.mirror(self.ro_path, fetch_url=self.ro_path)
             try:
-                #delete the folder where the project was stored
-                shutil.rmtree(tpdir)
-            except:
-                for i in os.listdir(tpdir):
-                    if i.endswith('git'):
-                        tmp = os.path.join(tpdir, i)
-                        # We want to unhide the .git folder before unlinking it.
-                        while True:
-                            subprocess.call(['attrib', '-H', tmp])
-                            break
-                        shutil.rmtree(tmp, onerror=on_rm_error)
-                shutil.rmtree(tpdir)
+                self.ro_metadata = json.loads(git.Repo(mirror_path).git.show("HEAD:ro-crate-metadata.json"))
+                self.all_metadata.append({"location":"root","data":self.ro_metadata})
+            except git.exc.GitCommandError:
+                #no ro-crate-metadata.json in the repo
+                pass
         except:
             #check if there is a rocratemetadata.json file in the ro_path
             for filename in os.listdir(self.ro_path):
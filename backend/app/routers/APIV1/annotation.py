@@ -9,7 +9,7 @@ from datetime import datetime
 from aiohttp import ClientSession
 from rocrate.rocrate import ROCrate
 from pathlib import Path as pads
-from collections import MutableMapping
+from collections.abc import MutableMapping
 from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.docs import (
     get_redoc_html,
@@ -22,6 +22,8 @@ import app.shacl_helper as shclh
 
 from app.model.location import Locations
 from app.model.space import Space
+from app.model.constraints import ConstraintModels
+from app.services.completeness import crate_completeness
 
 router = APIRouter(
     prefix="/annotation",
@@ -79,43 +81,13 @@ class DeleteContentModel(BaseModel):
 #TODO: function that reads the shacl contraint file and gets the right properties for an accordingly chosen schema target class (@type in rocrate metadata.json)
 
 def check_space_name(spacename):
-    with open(Locations().join_abs_path('spaces.json'), "r+")as file:
-        data = json.load(file)
-    for space, info in data.items():
-        if spacename == space:
-            return True
-    return False
+    return Space.exists(spacename)
 
 def on_rm_error(func, path, exc_info):
     #from: https://stackoverflow.com/questions/4829043/how-to-remove-read-only-attrib-directory-with-python-in-windows
     os.chmod(path, stat.S_IWRITE)
     os.unlink(path)
 
-async def check_path_availability(tocheckpath,space_id):
-    if os.path.isdir(os.path.join(tocheckpath)) == False:
-        raise HTTPException(status_code=400, detail="Given storage path does not exist on local storage")
-    #check if given path is already used by another project
-    toposturl = 'http://localhost:6656/apiv1/spaces' #TODO : figure out how to not hardcode this <---
-    async with ClientSession() as session:
-        response = await session.request(method='GET', url=toposturl)
-        text = await response.content.read()
-        all_spaces = json.loads(text.decode('utf8').replace("'", '"'))
-        for space,info_space in all_spaces.items():
-            print(info_space["storage_path"], file=sys.stderr)
-            print(str("/".join((tocheckpath,str(space_id)))), file=sys.stderr)
-            if info_space['storage_path'] == str("/".join((tocheckpath,str(space_id)))) or info_space['storage_path'] == str(tocheckpath):
-                raise HTTPException(status_code=400, detail="Given storage path is already in use by another project")
-    if len(os.listdir(os.path.join(tocheckpath)) ) != 0:
-        try:
-            os.mkdir(os.path.join(tocheckpath,str(space_id)))
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-        except:
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in existing folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-
 ### api paths ###
 
 ### space resource annotation ###
@@ -123,12 +95,10 @@ async def check_path_availability(tocheckpath,space_id):
 @router.get('/', status_code=200)
 def get_all_resources_annotation(*,space_id: str = Path(None,description="space_id name")):
     
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
 
     try:
         space_object = Space.load(uuid=space_id)
@@ -141,20 +111,17 @@ def get_all_resources_annotation(*,space_id: str = Path(None,description="space_
         raise HTTPException(status_code=500, detail=e)
     return toreturn
 
-@router.post('/file/{file_id}', status_code=200)
-def make_resource_annotation_single_file(*,space_id: str = Path(None,description="space_id name"), file_id: str = Path(None,description="id of the file that will be searched in the ro-crate-metadata.json file"), item: AnnotationsModel):
-    ## get the current metadata.json ##
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+#before the /file/{file_id:path} routes, a file id can hold / and would take the predicate in with it
+@router.delete('/file/{file_id:path}/{predicate}', status_code=200)
+def delete_resource_annotation(*,space_id: str = Path(None,description="space_id name"), file_id: str = Path(None,description="id of the file that will be searched in the ro-crate-metadata.json file"), predicate: str = Path(None,description="To delete predicate from the file annotations")):
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
     try:
-        #read in ROCrate metadata file
         space_object = Space.load(uuid=space_id)
-        log.debug(space_object)
-        prerreturn = space_object.add_predicates_by_id(toadd_dict_list=item.Annotations, file_id=file_id)
+        prerreturn = space_object.delete_predicates_by_id(to_delete_predicate=predicate, file_id=file_id)
+        log.info(prerreturn)
         if "error" in prerreturn.keys():
             return JSONResponse(status_code=int(prerreturn["error"]),content=str(prerreturn["detail"]))
         return prerreturn
@@ -163,19 +130,18 @@ def make_resource_annotation_single_file(*,space_id: str = Path(None,description
         log.exception(e)
         raise HTTPException(status_code=500, detail=e)
 
-
-@router.delete('/file/{file_id}/{predicate}', status_code=200)
-def delete_resource_annotation(*,space_id: str = Path(None,description="space_id name"), file_id: str = Path(None,description="id of the file that will be searched in the ro-crate-metadata.json file"), predicate: str = Path(None,description="To delete predicate from the file annotations")):
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+@router.post('/file/{file_id:path}', status_code=200)
+def make_resource_annotation_single_file(*,space_id: str = Path(None,description="space_id name"), file_id: str = Path(None,description="id of the file that will be searched in the ro-crate-metadata.json file"), item: AnnotationsModel):
+    ## get the current metadata.json ##
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
     try:
+        #read in ROCrate metadata file
         space_object = Space.load(uuid=space_id)
-        prerreturn = space_object.delete_predicates_by_id(to_delete_predicate=predicate, file_id=file_id)
-        log.info(prerreturn)
+        log.debug(space_object)
+        prerreturn = space_object.add_predicates_by_id(toadd_dict_list=item.Annotations, file_id=file_id)
         if "error" in prerreturn.keys():
             return JSONResponse(status_code=int(prerreturn["error"]),content=str(prerreturn["detail"]))
         return prerreturn
@@ -184,14 +150,13 @@ def delete_resource_annotation(*,space_id: str = Path(None,description="space_id
         log.exception(e)
         raise HTTPException(status_code=500, detail=e)
 
-@router.get('/file/{file_id}', status_code=200)
+
+@router.get('/file/{file_id:path}', status_code=200)
 def get_resource_annotation(*,space_id: str = Path(None,description="space_id name"), file_id: str = Path(None,description="id of the file that will be searched in the ro-crate-metadata.json file")):
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
     try:
         space_object = Space.load(uuid=space_id)
         prerreturn = space_object.get_predicates_by_id(file_id=file_id)
@@ -207,28 +172,39 @@ def get_resource_annotation(*,space_id: str = Path(None,description="space_id na
 @router.get('/terms', status_code=200)
 def get_terms_shacl(*, space_id: str = Path(None,description="space_id name")):
     #TODO from json select which shacl file should be taken
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
     #read in shacl file 
     path_shacl = os.path.join(Locations().get_workspace_location_by_uuid(space_uuid=space_id),"all_constraints.ttl")
     print(path_shacl, file=sys.stderr)
-    test = shclh.ShapesInfoGraph(path_shacl)
-    shacldata = test.full_shacl_graph_dict()
+    shacldata = ConstraintModels().get(path_shacl).as_shacl_dict()
     return shacldata
 
+@router.get('/summary', status_code=200)
+def get_completeness_summary(*, space_id: str = Path(None,description="space_id name"),
+                             resources: bool = Query(True, description="also return the score of every single resource")):
+    try:
+        Space.read_info(space_id)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_object = Space.load(uuid=space_id)
+        toreturn = crate_completeness(space_object._crate_graph(), space_object._constraint_model(), include_resources=resources)
+    except Exception as e:
+        log.error(e)
+        log.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return toreturn
+
 @router.post('/', status_code=200)
 def make_annotations_for_all_resources(*,space_id: str = Path(None,description="space_id name"), item: AnnotationsModel):
     #get path of metadatafile
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
     
     space_object = Space.load(uuid=space_id)
     space_object.add_predicates_all(toadd_dict=item.Annotations)
@@ -239,12 +215,10 @@ def make_annotations_for_all_resources(*,space_id: str = Path(None,description="
 @router.delete('/', status_code=200)
 def delete_annotations_for_all_resources(*,space_id: str = Path(None,description="space_id name"), item: AnnotationsModel):
     #get path of metadatafile
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
     
     space_object = Space.load(uuid=space_id)
     space_object.delete_predicates_all(todelete_dict=item.Annotations)
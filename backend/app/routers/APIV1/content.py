@@ -1,9 +1,10 @@
 from logging import exception
-from fastapi import FastAPI, Path, Query, HTTPException, status, APIRouter
+from fastapi import FastAPI, Path, Query, HTTPException, status, APIRouter, Response
+from fastapi.responses import StreamingResponse
 from fastapi.openapi.utils import get_openapi
 from typing import List, Optional, Set
 from pydantic import BaseModel, Field
-import os, json, requests, asyncio, sys, aiohttp, shutil, git, uuid, subprocess, stat
+import os, json, requests, asyncio, sys, aiohttp, shutil, git, uuid, subprocess, stat, itertools
 from importlib import import_module
 from datetime import datetime
 from aiohttp import ClientSession
@@ -23,6 +24,11 @@ import app.shacl_helper as shclh
 
 from app.model.location import Locations
 from app.model.space import Space
+from app.services.space_service import fix_space_crate
+from app.services.listing import space_content
+from app.services.ingest import ingest_content
+from app.services.jobs import Jobs
+from .jobs import job_accepted
 
 router = APIRouter(
     prefix="/content",
@@ -80,125 +86,92 @@ class DeleteContentModel(BaseModel):
 #TODO: function that reads the shacl contraint file and gets the right properties for an accordingly chosen schema target class (@type in rocrate metadata.json)
 
 def check_space_name(spacename):
-    with open(Locations().join_abs_path('spaces.json'), "r+")as file:
-        data = json.load(file)
-    for space, info in data.items():
-        if spacename == space:
-            return True
-    return False
+    return Space.exists(spacename)
+
+def content_listing(response, entries, limit, stream):
+    """ pages or streams the (cursor, entry) pairs of a content listing
+        With a limit the X-Next-Cursor header holds the cursor for the next page,
+        when streaming the client continues with the path of the last line as cursor.
+    """
+    if stream:
+        def ndjson_lines():
+            for _, entry in itertools.islice(entries, limit):
+                yield json.dumps(entry) + "\n"
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+    toreturn = []
+    last_cursor = None
+    for cursor, entry in entries:
+        if limit is not None and len(toreturn) == limit:
+            response.headers['X-Next-Cursor'] = last_cursor
+            break
+        toreturn.append(entry)
+        last_cursor = cursor
+    return toreturn
 
 def on_rm_error(func, path, exc_info):
     #from: https://stackoverflow.com/questions/4829043/how-to-remove-read-only-attrib-directory-with-python-in-windows
     os.chmod(path, stat.S_IWRITE)
     os.unlink(path)
 
-async def check_path_availability(tocheckpath,space_id):
-    if os.path.isdir(os.path.join(tocheckpath)) == False:
-        raise HTTPException(status_code=400, detail="Given storage path does not exist on local storage")
-    #check if given path is already used by another project
-    toposturl = 'http://localhost:6656/apiv1/spaces' #TODO : figure out how to not hardcode this <---
-    async with ClientSession() as session:
-        response = await session.request(method='GET', url=toposturl)
-        text = await response.content.read()
-        all_spaces = json.loads(text.decode('utf8').replace("'", '"'))
-        for space,info_space in all_spaces.items():
-            print(info_space["storage_path"], file=sys.stderr)
-            print(str("/".join((tocheckpath,str(space_id)))), file=sys.stderr)
-            if info_space['storage_path'] == str("/".join((tocheckpath,str(space_id)))) or info_space['storage_path'] == str(tocheckpath):
-                raise HTTPException(status_code=400, detail="Given storage path is already in use by another project")
-    if len(os.listdir(os.path.join(tocheckpath)) ) != 0:
-        try:
-            os.mkdir(os.path.join(tocheckpath,str(space_id)))
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-        except:
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in existing folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-
 ### api paths ###
 
 @router.get('/')
-def get_space_content_info(*,space_id: str = Path(None,description="space_id name")):
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
-    toreturn = []
-    for (dirpath, dirnames, filenames) in os.walk(space_folder):
-        for filen in filenames:
-            if '.git' not in dirpath:
-                toreturn.append({"file":filen,"folder":dirpath})
-    return toreturn
+def get_space_content_info(*,space_id: str = Path(None,description="space_id name"), response: Response,
+                           depth: Optional[int] = Query(None, ge=0, description="how many levels of subfolders to list, 0 only lists the top folder"),
+                           limit: Optional[int] = Query(None, ge=1, description="max number of files to return, the X-Next-Cursor header holds the cursor for the next page"),
+                           cursor: Optional[str] = Query(None, description="path of the file, relative to the space, after which the listing continues"),
+                           stream: bool = Query(False, description="stream the files as newline delimited json")):
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
+    return content_listing(response, space_content(space_id, space_folder, max_depth=depth, after=cursor), limit, stream)
 
 @router.post('/', status_code=202)
-async def add_new_content(*,space_id: str = Path(None,description="space_id name"), item: ContentModel, path_folder: Optional[str] = None):  
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+def add_new_content(*,space_id: str = Path(None,description="space_id name"), item: ContentModel, path_folder: Optional[str] = None,
+                    response: Response,
+                    background: bool = Query(False, description="add the content in a background job and answer 202 with the job handle")):  
+    try:
+        space_root = Space.read_info(space_id)['storage_path']
+        space_folder = space_root
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
 
     if path_folder != None:
-        space_folder = os.path.join(os.sep.join((data[space_id]['storage_path'])), path_folder) 
+        space_folder = os.path.join(space_root, path_folder) 
         try:
             pads(space_folder).mkdir(parents=True, exist_ok=True)
         except:
             raise HTTPException(status_code=400, detail="Directory could not be made")
 
-    datalog = []
-    crate = ROCrate(space_folder)
-    repo = git.Repo(data[space_id]['storage_path'])
-    for content_item in item.content:
-        #check if file or url are present
-        if (content_item.content == None and content_item.name == None):
-            content_present = False
-        #check if only url prsent:
-        if ('.html' in content_item.content or 'http' in content_item.content):
-            try:
-                crate.add_file(content_item.content, fetch_remote = False)
-            except Exception as e:
-                datalog.append({content_item.content:e})
-        #check if content_item.content is a directory
-        if os.path.isdir(content_item.content):
-            try:
-                crate.add_directory(content_item.content,str(os.sep.join((space_folder,os.path.basename(os.path.normpath(content_item.content))))))
-            except Exception as e:
-                datalog.append({content_item.content:e})
-        else:
+    repo = git.Repo(space_root)
+    contents = [content_item.content for content_item in item.content if content_item.content is not None]
+    def add_content():
+        try:
+            datalog = ingest_content(space_root, contents, target_folder=space_folder, repo=repo)
+        except Exception as e:
+            log.exception(e)
+            #auto resolve the crate by running the space fixcrate, it stages the crate itself
             try:
-                print("trying to add {}".format(content_item.content), file=sys.stderr)
-                crate.add_file(content_item.content)
-            except Exception as e:
-                datalog.append({content_item.content:e})
-    crate.write_crate(space_folder)
-    try:
-        crate.write_crate(space_folder)
-    except:
-        #auto resolve the crate by calling the space fixcrate 
-        toposturl = 'http://localhost:6656/apiv1/spaces/'+space_id+'/fixcrate' #TODO : figure out how to not hardcode this <---
-        async with ClientSession() as session:
-            response = await session.request(method='GET', url=toposturl)
-    repo.git.add(all=True)
-    if len(datalog) > 0:
-        raise HTTPException(status_code=400, detail=datalog)
-
-    return {'Data':'all content successfully added to space'}
+                fix_space_crate(space_id)
+            except Exception as fix_error:
+                log.exception(f"fixcrate after the failed content add of space {space_id} failed: {fix_error}")
+            raise HTTPException(status_code=500, detail=f"adding content failed: {e}")
+        if any(report['status'] == 'failed' for report in datalog):
+            raise HTTPException(status_code=400, detail=datalog)
+        return {'Data':'all content successfully added to space', 'Items':datalog}
+    if background:
+        return job_accepted(response, Jobs().submit("content.add", add_content, params={'space_id':space_id, 'content':contents, 'path_folder':path_folder}))
+    return add_content()
 
 @router.delete('/', status_code=202)
 def delete_content(*,space_id: str = Path(None,description="space_id name"), item: DeleteContentModel):
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
         
-    repo = git.Repo(data[space_id]['storage_path'])
+    repo = git.Repo(space_folder)
     crate = ROCrate(space_folder)
     try:
         for content_item in item.content:
@@ -238,18 +211,17 @@ def delete_content(*,space_id: str = Path(None,description="space_id name"), ite
     return {'Data':'all content successfully deleted from space :TODO: currently delete function is not working'}
 
 @router.get('/{path_folder:path}')
-def get_space_content_folder_info(*,space_id: str = Path(None,description="space_id name"), path_folder: str = Path(None,description="folder  path to get the files from")):
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            toreturn = data[space_id]
-            allpaths = path_folder
-            space_folder = os.path.join(data[space_id]['storage_path'], path_folder) 
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
-    toreturn = []
-    for (dirpath, dirnames, filenames) in os.walk(space_folder):
-        for filen in filenames:
-            if '.git' not in dirpath:
-                toreturn.append({"file":filen,"folder":dirpath})
+def get_space_content_folder_info(*,space_id: str = Path(None,description="space_id name"), path_folder: str = Path(None,description="folder  path to get the files from"),
+                                  response: Response,
+                                  depth: Optional[int] = Query(None, ge=0, description="how many levels of subfolders to list, 0 only lists the folder itself"),
+                                  limit: Optional[int] = Query(None, ge=1, description="max number of files to return, the X-Next-Cursor header holds the cursor for the next page"),
+                                  cursor: Optional[str] = Query(None, description="path of the file, relative to the folder, after which the listing continues"),
+                                  stream: bool = Query(False, description="stream the files as newline delimited json")):
+    try:
+        space_folder = os.path.join(Space.read_info(space_id)['storage_path'], path_folder) 
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
+    toreturn = content_listing(response, space_content(space_id, space_folder, max_depth=depth, after=cursor), limit, stream)
+    if stream:
+        return toreturn
     return {'Data':toreturn}
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Path, Query, HTTPException, status, APIRouter
+from fastapi import FastAPI, Path, Query, HTTPException, status, APIRouter, Response
 from fastapi.openapi.utils import get_openapi
 from typing import List, Optional, Set
 from pydantic import BaseModel, Field
@@ -15,6 +15,12 @@ from fastapi.openapi.docs import (
     get_swagger_ui_html,
     get_swagger_ui_oauth2_redirect_html,
 )
+import logging
+log=logging.getLogger(__name__)
+
+from app.model.space import Space
+from app.services.jobs import Jobs
+from .jobs import job_accepted
 
 router = APIRouter(
     prefix="/git",
@@ -67,54 +73,22 @@ class DeleteContentModel(BaseModel):
 #TODO: function that reads the shacl contraint file and gets the right properties for an accordingly chosen schema target class (@type in rocrate metadata.json)
 
 def check_space_name(spacename):
-    with open(os.path.join(os.getcwd(),"app","webtop-work-space","spaces.json"), "r+")as file:
-        data = json.load(file)
-    for space, info in data.items():
-        if spacename == space:
-            return True
-    return False
+    return Space.exists(spacename)
 
 def on_rm_error(func, path, exc_info):
     #from: https://stackoverflow.com/questions/4829043/how-to-remove-read-only-attrib-directory-with-python-in-windows
     os.chmod(path, stat.S_IWRITE)
     os.unlink(path)
 
-async def check_path_availability(tocheckpath,space_id):
-    if os.path.isdir(os.path.join(tocheckpath)) == False:
-        raise HTTPException(status_code=400, detail="Given storage path does not exist on local storage")
-    #check if given path is already used by another project
-    toposturl = 'http://localhost:6656/apiv1/spaces' #TODO : figure out how to not hardcode this <---
-    async with ClientSession() as session:
-        response = await session.request(method='GET', url=toposturl)
-        text = await response.content.read()
-        all_spaces = json.loads(text.decode('utf8').replace("'", '"'))
-        for space,info_space in all_spaces.items():
-            print(info_space["storage_path"], file=sys.stderr)
-            print(str("/".join((tocheckpath,str(space_id)))), file=sys.stderr)
-            if info_space['storage_path'] == str("/".join((tocheckpath,str(space_id)))) or info_space['storage_path'] == str(tocheckpath):
-                raise HTTPException(status_code=400, detail="Given storage path is already in use by another project")
-    if len(os.listdir(os.path.join(tocheckpath)) ) != 0:
-        try:
-            os.mkdir(os.path.join(tocheckpath,str(space_id)))
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-        except:
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in existing folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-
 ### api paths ###
 
 @router.get('/status/', status_code=200)
 def get_git_status(*,space_id: str = Path(None,description="space_id name")):
     toreturn =[]
-    with open(os.path.join(os.getcwd(),"app","webtop-work-space","spaces.json"), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
     #function to pull data from remote if remote was provided and if pulse finds diff 
     try:
         repo = git.Repo(space_folder)
@@ -155,14 +129,14 @@ def get_git_status(*,space_id: str = Path(None,description="space_id name")):
     return {'data':toreturn}
 
 @router.post('/{command}', status_code=200)
-def get_git_status(*,space_id: str = Path(None,description="space_id name"),command: str = Path("commit",description="git command to use (commit,pull,push)")):
+def get_git_status(*,space_id: str = Path(None,description="space_id name"),command: str = Path("commit",description="git command to use (commit,pull,push)"),
+                   response: Response,
+                   background: bool = Query(False, description="run a push or pull in a background job and answer 202 with the job handle")):
     toreturn =[]
-    with open(os.path.join(os.getcwd(),"app","webtop-work-space","spaces.json"), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        space_folder = Space.read_info(space_id)['storage_path']
+    except Exception as e:
+        raise HTTPException(status_code=404, detail="Space not found")
     try:
         repo = git.Repo(space_folder)
     except:
@@ -187,6 +161,16 @@ def get_git_status(*,space_id: str = Path(None,description="space_id name"),comm
         raise HTTPException(status_code=400, detail="repo has no remote references to push or pull to.")
 
     # try and do push pull
+    if background:
+        try:
+            origin = repo.remote(name='origin')
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=e)
+        def run_git():
+            origin.push() if command == "push" else origin.pull()
+            return {"data":"{} successfull".format(str(command))}
+        return job_accepted(response, Jobs().submit(f"git.{command}", run_git, params={'space_id':space_id, 'command':command}))
+
     if command == "push":
         try:
             origin = repo.remote(name='origin')
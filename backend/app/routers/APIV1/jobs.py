@@ -0,0 +1,28 @@
+from fastapi import Path, HTTPException, APIRouter, Response
+import logging
+log=logging.getLogger(__name__)
+
+from app.services.jobs import Jobs
+
+router = APIRouter(
+    prefix="",
+    tags=["Jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+### define helper functions for the api ###
+
+def job_accepted(response, job_id):
+    """answer of a mutating route that handed its work to a background job"""
+    response.status_code = 202
+    response.headers['Location'] = f"/apiv1/jobs/{job_id}"
+    return {'job_id':job_id, 'status_url':f"/apiv1/jobs/{job_id}"}
+
+### api paths ###
+
+@router.get('/{job_id}')
+def get_job(*,job_id: str = Path(None,description="id of the job")):
+    try:
+        return Jobs().get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
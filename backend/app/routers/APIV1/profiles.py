@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Path, Query, HTTPException, status, APIRouter
+from fastapi import FastAPI, Path, Query, HTTPException, status, APIRouter, Response
 from fastapi.openapi.utils import get_openapi
 from typing import List, Optional, Set
 from pydantic import BaseModel, Field
@@ -24,6 +24,9 @@ from .git import router as git_router
 from .annotation import router as annotation_router
 from app.model.location import Locations
 from app.model.profile import Profile
+from app.services.jobs import Jobs
+from app.services.sync import RepoSyncs
+from .jobs import job_accepted
 
 router = APIRouter(
     prefix="",
@@ -68,93 +71,61 @@ class DeleteContentModel(BaseModel):
 ### define helper functions for the api ###
 
 def check_space_name(spacename):
-    with open(Locations().join_abs_path('spaces.json'), "r+")as file:
-        data = json.load(file)
-    for space, info in data.items():
-        if spacename == space:
-            return True
-    return False
+    return Space.exists(spacename)
 
 def on_rm_error(func, path, exc_info):
     #from: https://stackoverflow.com/questions/4829043/how-to-remove-read-only-attrib-directory-with-python-in-windows
     os.chmod(path, stat.S_IWRITE)
     os.unlink(path)
 
-async def check_path_availability(tocheckpath,space_id):
-    if os.path.isdir(os.path.join(tocheckpath)) == False:
-        raise HTTPException(status_code=400, detail="Given storage path does not exist on local storage")
-    #check if given path is already used by another project
-    toposturl = 'http://localhost:6656/apiv1/spaces' #TODO : figure out how to not hardcode this <---
-    async with ClientSession() as session:
-        response = await session.request(method='GET', url=toposturl)
-        text = await response.content.read()
-        all_spaces = json.loads(text.decode('utf8').replace("'", '"'))
-        for space,info_space in all_spaces.items():
-            print(info_space["storage_path"], file=sys.stderr)
-            print(str("/".join((tocheckpath,str(space_id)))), file=sys.stderr)
-            if info_space['storage_path'] == str("/".join((tocheckpath,str(space_id)))) or info_space['storage_path'] == str(tocheckpath):
-                raise HTTPException(status_code=400, detail="Given storage path is already in use by another project")
-    if len(os.listdir(os.path.join(tocheckpath)) ) != 0:
-        try:
-            os.mkdir(os.path.join(tocheckpath,str(space_id)))
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-        except:
-            tocheckpath = os.path.join(tocheckpath,str(space_id))
-            returnmessage = "Space created in existing folder: " + str(os.path.join(tocheckpath))
-            return [returnmessage,tocheckpath]
-
 ### api paths ###
 
 @router.get('/')
 def get_all_profiles_info():
     log.info(f"profile get all begin")
-    with open(Locations().join_abs_path('profiles.json'), "r+") as file:
-        data = json.load(file)
-        return data
+    return Profile._read_profiles()
 
 @router.get('/{profile_id}/')
 def get_profile_info(profile_id: str = Path(None,description="profile_id name")):
     log.info(f"profile get begin")
-    with open(Locations().join_abs_path('profiles.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            toreturn = data[profile_id]
-            return toreturn
-        except Exception as e:
-            log.error(f"profile get profile by id error")
-            log.exception(f"{e}")
-            raise HTTPException(status_code=404, detail="profile not found")
+    try:
+        toreturn = Profile.read_info(profile_id)
+        return toreturn
+    except Exception as e:
+        log.error(f"profile get profile by id error")
+        log.exception(f"{e}")
+        raise HTTPException(status_code=404, detail="profile not found")
 
 @router.delete('/{profile_id}/', status_code=202)
 def delete_profile(profile_id: str = Path(None,description="profile_id name")):
     log.info(f"profile delete begin")
-    with open(Locations().join_abs_path('profiles.json')) as data_file:
-            data = json.load(data_file)
-            try:
-                del data[profile_id]
-            except Exception as e:
-                log.error(f"profile delete profile by id error")
-                log.exception(f"{e}")
-                raise HTTPException(status_code=404, detail=f"profile {profile_id} was not found in profiles")
-    with open(Locations().join_abs_path('profiles.json'), 'w') as data_file:
-        data = json.dump(data, data_file)    
-        return {'message':'successfully deleted profile'}
+    try:
+        Profile.registry().delete(profile_id)
+    except Exception as e:
+        log.error(f"profile delete profile by id error")
+        log.exception(f"{e}")
+        raise HTTPException(status_code=404, detail=f"profile {profile_id} was not found in profiles")
+    return {'message':'successfully deleted profile'}
 
 @router.post('/', status_code=201)
-def add_profile(*,item: ProfileModel):
+def add_profile(*,item: ProfileModel, response: Response,
+                background: bool = Query(False, description="make the profile in a background job and answer 202 with the job handle")):
     log.info(f"profile add begin")
     if item.logo != None or item.description != None  or item.url_ro_profile != None or item.name != None:
-        #add check for the url of the profile:
-        try:
-            #tocheckrocrate = ro_read.MakeNewProfile(profile_id=item.name, logo=item.logo ,description= item.description, repo_url=item.url_ro_profile)
-            Profile(
+        def make_profile():
+            profile = Profile(
                 repo_url = item.url_ro_profile,
                 name = item.name,
                 description = item.description,
                 logo_url = item.logo,
             )
+            return {'Message':'Profile added', 'profile_id':profile.uuid}
+        if background:
+            return job_accepted(response, Jobs().submit("profile.create", make_profile, params={'name':item.name, 'url_ro_profile':item.url_ro_profile}))
+        #add check for the url of the profile:
+        try:
+            #tocheckrocrate = ro_read.MakeNewProfile(profile_id=item.name, logo=item.logo ,description= item.description, repo_url=item.url_ro_profile)
+            make_profile()
         except Exception as e:
             log.error(f"profile make profile error")
             log.exception(f"{e}")
@@ -164,27 +135,38 @@ def add_profile(*,item: ProfileModel):
         keys = dict(item).keys()
         raise HTTPException(status_code=400, detail="supplied body must have following keys: {}".format(keys))
 
+@router.post('/{profile_id}/sync')
+def sync_profile(*,profile_id: str = Path(None,description="profile_id name"), response: Response,
+                 force: bool = Query(True, description="fetch even when the repos were fetched within the sync ttl"),
+                 background: bool = Query(False, description="sync in a background job and answer 202 with the job handle")):
+    log.info(f"profile sync begin")
+    try:
+        info = Profile.read_info(profile_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="profile not found")
+    repo_urls = [info['repo_url']] + list(info.get('seed_dependencies') or [])
+    def sync_repos():
+        return {repo_url: RepoSyncs().sync(repo_url, Locations().get_repo_location_by_url(repo_url), force=force) for repo_url in repo_urls}
+    if background:
+        return job_accepted(response, Jobs().submit("profile.sync", sync_repos, params={'profile_id':profile_id, 'force':force}))
+    return {'Data':sync_repos()}
+
 @router.put('/{profile_id}/', status_code=202)
 def update_profile(*,profile_id: str = Path(None,description="profile_id name"), item: ProfileModel):
     log.info(f"profile update begin")
-    with open(Locations().join_abs_path('profiles.json'), "r+")as file:
-        data = json.load(file)
-    for profile in data.keys():
-        if profile_id == profile:
-            try:
-                if item.logo != None or item.description != None or item.url_ro_profile != None:
-                    data[profile_id].update({'logo_url':item.logo,'description':item.description,'repo_url':item.url_ro_profile})
-                    with open(Locations().join_abs_path('profiles.json'), "w") as file:
-                        json.dump(data, file)  
-                        return {'Data':'Update successfull'} 
-                else:
-                    log.info(f"profile update fail")
-                    log.info(f"supplied body must have following keys: {format(keys)}")
-                    keys = dict(item).keys()
-                    raise HTTPException(status_code=400, detail="supplied body must have following keys: {}".format(keys))
-            except Exception as e:
-                log.error(f"profile update profile error")
-                log.exception(f"{e}")
+    if Profile.exists(profile_id):
+        try:
+            if item.logo != None or item.description != None or item.url_ro_profile != None:
+                Profile.registry().patch(profile_id, {'logo_url':item.logo,'description':item.description,'repo_url':item.url_ro_profile})
+                return {'Data':'Update successfull'} 
+            else:
+                log.info(f"profile update fail")
+                log.info(f"supplied body must have following keys: {format(keys)}")
                 keys = dict(item).keys()
                 raise HTTPException(status_code=400, detail="supplied body must have following keys: {}".format(keys))
+        except Exception as e:
+            log.error(f"profile update profile error")
+            log.exception(f"{e}")
+            keys = dict(item).keys()
+            raise HTTPException(status_code=400, detail="supplied body must have following keys: {}".format(keys))
     raise HTTPException(status_code=404, detail="profile not found")
\ No newline at end of file
@@ -18,8 +18,12 @@ from fastapi.openapi.docs import (
 
 from .profiles import router as profile_router
 from .spaces import router as space_router
+from .jobs import router as job_router
+from .system import router as system_router
 #make the routers
 router = APIRouter()
 router.include_router(profile_router, prefix="/profiles")
 router.include_router(space_router, prefix="/spaces")
+router.include_router(job_router, prefix="/jobs")
+router.include_router(system_router, prefix="/system")
 
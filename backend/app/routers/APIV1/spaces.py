@@ -1,8 +1,9 @@
-from fastapi import FastAPI, Path, Query, HTTPException, status, APIRouter
+from fastapi import FastAPI, Path, Query, HTTPException, status, APIRouter, Response
+from fastapi.responses import StreamingResponse
 from fastapi.openapi.utils import get_openapi
 from typing import List, Optional, Set
 from pydantic import BaseModel, Field
-import os, json, requests, asyncio, sys, aiohttp, shutil, git, uuid, subprocess, stat
+import os, json, requests, asyncio, sys, aiohttp, shutil, git, uuid, subprocess, stat, itertools
 from importlib import import_module
 from datetime import datetime
 from aiohttp import ClientSession
@@ -24,6 +25,12 @@ from .git import router as git_router
 from .annotation import router as annotation_router
 from app.model.location import Locations
 from app.model.space import Space
+from app.services.space_service import check_path_availability, profile_exists, fix_space_crate, validate_space
+from app.services.listing import ListingCaches
+from app.services.jobs import Jobs
+from app.services.validation import Validations
+from app.services.craterdf import CrateRdfs
+from .jobs import job_accepted
 
 router = APIRouter(
     prefix="",
@@ -83,304 +90,182 @@ class DeleteContentModel(BaseModel):
 
 #TODO: function that reads the shacl contraint file and gets the right properties for an accordingly chosen schema target class (@type in rocrate metadata.json)
 
-def complete_metadata_crate(source_path_crate):
-    
-    ## get all the file_ids with their metadata ##
-    #open up the metadata.json file
-    with open(os.path.join(source_path_crate, 'ro-crate-metadata.json')) as json_file:
-        datao = json.load(json_file)
-        
-    #check if the ids from relation are present in the json file
-    all_meta_ids_data = []
-    for id in datao['@graph']:
-        toappend_id = {}
-        toappand_data_values = []
-        for key_id, value_id in id.items():
-            if key_id != "@id":
-                toappand_data_values.append({key_id:value_id})
-        toappend_id[id['@id']] = toappand_data_values
-        all_meta_ids_data.append(toappend_id)
-    
-    log.debug(f"all metadata ids of data: {all_meta_ids_data}")
-    
-    ## start from fresh file with metadata template  ##
-    with open(os.path.join(os.getcwd(),'app',"webtop-work-space",'ro-crate-metadata.json')) as json_file:
-        data = json.load(json_file)
-        
-    log.debug(f"data from rocrate: {data}")
-    
-    
-    ## add data to the fresh file ##
-      
-    relation = []
-    for root, dirs, files in os.walk(source_path_crate, topdown=False):   
-        for name in files:
-            if root.split(source_path_crate)[-1] == "":
-                parent_folder = ""
-                relative_path = "./"
-            else:
-                relative_path = root.split(source_path_crate)[-1]
-                parent_folder = relative_path.split(os.path.sep)[-1]
-            relation.append({'parent_folder':parent_folder,"relative_path":relative_path,"name":name})
-    all_ids = []
-    for x in relation:
-        #log.debug(x)
-        all_ids.append(x["name"])
-    
-    #check if the ids from relation are present in the json file
-    all_meta_ids = []
-    for id in data['@graph']:
-        all_meta_ids.append(id['@id'])
-        #log.debug(id['@id'])
-    for i in all_ids: 
-        if i not in all_meta_ids:
-            #log.debug("not present: "+ i)
-            #check if parent is present in the file
-            
-            def add_folder_path(path_folder):
-                toaddppaths = path_folder.split("\\")
-                previous = "./"
-                for toadd in toaddppaths:         
-                    if str(toadd+"/") not in all_meta_ids:
-                        if toadd != "":
-                            data['@graph'].append({'@id':toadd+"/", '@type':"Dataset", 'hasPart':[]})
-                            # add ro right haspart
-                            for ids in data['@graph']:
-                                if ids['@id'] == previous:
-                                    try:
-                                        ids['hasPart'].append({'@id':toadd+"/"})
-                                    except:
-                                        ids['hasPart'] = []
-                                        ids['hasPart'].append({'@id':toadd+"/"})
-                            all_meta_ids.append(str(toadd+"/"))
-                    if toadd == "":
-                        previous = './'
-                    else:
-                        previous = toadd+"/"
-                        
-                            
-            for checkparent in relation:
-                if checkparent['name'] == i:
-                    if str(checkparent['parent_folder']+"/") not in all_meta_ids:
-                        if checkparent['parent_folder'] != "":
-                            #make the parent_folder in ids
-                            data['@graph'].append({'@id':checkparent['parent_folder']+"/", '@type':"Dataset", 'hasPart':[]})
-                            #check if folder has no parent
-                            if len(checkparent['relative_path'].split("\\")) == 2:
-                                checkparentpath = checkparent['relative_path'].split("\\")
-                                log.debug(f"splitted relative path: {checkparentpath}")
-                                for ids in data['@graph']:
-                                    if ids['@id'] == './':
-                                        if {'@id':checkparent['relative_path'].split("\\")[-1]+"/"} not in ids['hasPart']:
-                                            ids['hasPart'].append({'@id':checkparent['relative_path'].split("\\")[-1]+"/"})
-                            
-                            add_folder_path(checkparent['relative_path'])
-                    #add the non present id to the folder haspart
-                    for ids in data['@graph']:
-                        if checkparent['parent_folder'] == "":
-                            if ids['@id'] == "."+checkparent['parent_folder']+"/":
-                                ids['hasPart'].append({'@id':i})
-                        else:
-                            if ids['@id'] == checkparent['parent_folder']+"/":
-                                ids['hasPart'].append({'@id':i})
-            #add the id to the @graph
-            data['@graph'].append({'@id':i, '@type':"File"})
-            #add id to ./ folder if necessary
-    
-    #remove duplicates
-    seen_ids = []
-    for ids in data['@graph']:
-        if ids['@id'] in seen_ids:
-            data['@graph'].remove(ids)
-        else:
-            seen_ids.append(ids['@id'])
-    
-    ## add file_ids metadata correspondingly ##
-    for ids in data['@graph']:
-        for tocheck_id in all_meta_ids_data:
-            if ids['@id'] in str(tocheck_id.keys()):
-                for dict_single_metadata in tocheck_id[ids['@id']]:
-                    for key_dict_single_meta, value_dcit_sinle_meta in dict_single_metadata.items():
-                        if key_dict_single_meta not in ids.keys():
-                            log.debug(f"key of single file metadata: {key_dict_single_meta}")
-                            ids[key_dict_single_meta] = value_dcit_sinle_meta
-                            
-    #write the rocrate file back 
-    with open(os.path.join(source_path_crate, 'ro-crate-metadata.json'), 'w') as json_file:
-        json.dump(data, json_file)
-
-    return data
-
 def check_space_name(spacename):
-    with open(Locations().join_abs_path('spaces.json'), "r+")as file:
-        data = json.load(file)
-    for space, info in data.items():
-        if spacename == space:
-            return True
-    return False
+    return Space.exists(spacename)
 
 def on_rm_error(func, path, exc_info):
     #from: https://stackoverflow.com/questions/4829043/how-to-remove-read-only-attrib-directory-with-python-in-windows
     os.chmod(path, stat.S_IWRITE)
     os.unlink(path)
 
-async def check_path_availability(tocheckpath,space_id):
-    if os.path.isdir(os.path.join(tocheckpath)) == False:
-        raise HTTPException(status_code=400, detail="Given storage path does not exist on local storage")
-    #check if given path is already used by another project
-    toposturl = 'http://localhost:6656/apiv1/spaces' #TODO : figure out how to not hardcode this <---
-    async with ClientSession() as session:
-        response = await session.request(method='GET', url=toposturl)
-        text = await response.content.read()
-        all_spaces = json.loads(text.decode('utf8').replace("'", '"'))
-        try:
-            for space,info_space in all_spaces.items():
-                str_space = info_space["storage_path"]
-                log.debug(f"Storage path space:{str_space}")
-                str_space_f_path = str("/".join((tocheckpath,str(space_id))))
-                log.debug(f"Storage path with space_id: {str_space_f_path}")
-                if info_space['storage_path'] == str("/".join((tocheckpath,str(space_id)))) or info_space['storage_path'] == str(tocheckpath):
-                    raise HTTPException(status_code=400, detail="Given storage path is already in use by another project")
-        except:
-            pass
-    if len(os.listdir(os.path.join(tocheckpath)) ) != 0:
-        try:
-            return tocheckpath
-        except Exception as e:
-            log.error("checking space folder failed")
-            log.exception(e)
-
 ### api paths ###
 
+def space_listing_entry(space_id, info):
+    clicktrough_url = BASE_URL_SERVER + 'apiv1/' + 'spaces/' + space_id 
+    #example_url: https://example.org/dmbon/ns/entity_types#Space
+    return {'name':space_id,
+            'storage_path':info['storage_path'],
+            'RO_profile':info['ro_profile'],
+            '@type':'https://example.org/dmbon/ns/entity_types#Space',
+            'url_space':clicktrough_url}
+
 @router.get('/', tags=["Spaces"])
-def get_all_spaces():
-    with open(Locations().join_abs_path('spaces.json'), "r+")as file:
-        try:
-            log.info(f"env variable base_url_server == {BASE_URL_SERVER}")
-            data = json.load(file)
-            toreturn = []
-            for i,y in data.items():
-                clicktrough_url = BASE_URL_SERVER + 'apiv1/' + 'spaces/' + i 
-                #example_url: https://example.org/dmbon/ns/entity_types#Space
-                toreturn.append({'name':i,
-                                'storage_path':y['storage_path'],
-                                'RO_profile':y['ro_profile'],
-                                '@type':'https://example.org/dmbon/ns/entity_types#Space',
-                                'url_space':clicktrough_url})   
-            return toreturn
-        except Exception as e:
-            log.error(f"error  :{e}")
-            log.exception(e)
-            raise HTTPException(status_code=500, detail=e)
+def get_all_spaces(*,response: Response,
+                   limit: Optional[int] = Query(None, ge=1, description="max number of spaces to return, the X-Next-Cursor header holds the cursor for the next page"),
+                   cursor: Optional[str] = Query(None, description="space_id after which the listing continues"),
+                   ro_profile: Optional[str] = Query(None, description="only list spaces using this ro_profile"),
+                   storage_path_prefix: Optional[str] = Query(None, description="only list spaces with a storage_path starting with this prefix"),
+                   stream: bool = Query(False, description="stream the spaces as newline delimited json")):
+    log.info(f"env variable base_url_server == {BASE_URL_SERVER}")
+    where = {'ro_profile':ro_profile} if ro_profile is not None else None
+    prefix = {'storage_path':storage_path_prefix} if storage_path_prefix is not None else None
+    spaces = Space.registry().scan(after=cursor, where=where, prefix=prefix)
+    if stream:
+        #the client continues with the name of the last line as cursor
+        def ndjson_lines():
+            for space_id, info in itertools.islice(spaces, limit):
+                yield json.dumps(space_listing_entry(space_id, info)) + "\n"
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+    try:
+        toreturn = []
+        for space_id, info in spaces:
+            if limit is not None and len(toreturn) == limit:
+                response.headers['X-Next-Cursor'] = toreturn[-1]['name']
+                break
+            toreturn.append(space_listing_entry(space_id, info))
+        return toreturn
+    except Exception as e:
+        log.error(f"error  :{e}")
+        log.exception(e)
+        raise HTTPException(status_code=500, detail=e)
 
 @router.get('/{space_id}/', tags=["Spaces"])
 def get_space_info(*,space_id: str = Path(None,description="space_id name")):
-    if check_space_name(space_id):
-        with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-            data = json.load(file)
-            try:
-                for i,y in data.items():
-                    if i == space_id:
-                        clicktrough_url = BASE_URL_SERVER + 'apiv1/' + 'spaces/' + i 
-                        #example_url: https://example.org/dmbon/ns/entity_types#Space
-                        toreturn= { 'name':i,
-                                    'storage_path':y['storage_path'],
-                                    'ro_profile':y['ro_profile'],
-                                    '@type':'https://example.org/dmbon/ns/entity_types#Space',
-                                    'url_content':clicktrough_url+"/content",
-                                    'url_metadata':clicktrough_url+"/annotation",
-                                    'url_constraints':clicktrough_url+"/annotation/terms"}
-                
-                return toreturn
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=e)
-    else:
+    try:
+        y = Space.read_info(space_id)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        clicktrough_url = BASE_URL_SERVER + 'apiv1/' + 'spaces/' + space_id 
+        #example_url: https://example.org/dmbon/ns/entity_types#Space
+        toreturn= { 'name':space_id,
+                    'storage_path':y['storage_path'],
+                    'ro_profile':y['ro_profile'],
+                    '@type':'https://example.org/dmbon/ns/entity_types#Space',
+                    'url_content':clicktrough_url+"/content",
+                    'url_metadata':clicktrough_url+"/annotation",
+                    'url_constraints':clicktrough_url+"/annotation/terms"}
+        return toreturn
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=e)
 
 @router.delete('/{space_id}/', status_code=202, tags=["Spaces"])
 def delete_space(*,space_id: str = Path(None,description="space_id name")):
-    with open(Locations().join_abs_path('spaces.json')) as data_file:
-            data = json.load(data_file)
-            try:
-                #delete the folder where the project was stored
-                shutil.rmtree(data[space_id]["storage_path"])
-            except:
-                try:
-                    for i in os.listdir(data[space_id]["storage_path"]):
-                        if i.endswith('git'):
-                            tmp = os.path.join(data[space_id]["storage_path"], i)
-                            # We want to unhide the .git folder before unlinking it.
-                            while True:
-                                subprocess.call(['attrib', '-H', tmp])
-                                break
-                            shutil.rmtree(tmp, onerror=on_rm_error)
-                    shutil.rmtree(data[space_id]["storage_path"])
-                except Exception as e:
-                    log.error(f"space deletion error")
-                    log.exception(f"{e}")
-                    raise HTTPException(status_code=500, detail="Space delete failed {}".format(e)) 
-            del data[space_id]
-            
-    with open(Locations().join_abs_path('spaces.json'), 'w') as data_file:
-        data = json.dump(data, data_file)    
-        return {'message':'successfully deleted space'}
+    try:
+        storage_path = Space.read_info(space_id)["storage_path"]
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Space not found")
+    try:
+        #delete the folder where the project was stored
+        shutil.rmtree(storage_path)
+    except:
+        try:
+            for i in os.listdir(storage_path):
+                if i.endswith('git'):
+                    tmp = os.path.join(storage_path, i)
+                    # We want to unhide the .git folder before unlinking it.
+                    while True:
+                        subprocess.call(['attrib', '-H', tmp])
+                        break
+                    shutil.rmtree(tmp, onerror=on_rm_error)
+            shutil.rmtree(storage_path)
+        except Exception as e:
+            log.error(f"space deletion error")
+            log.exception(f"{e}")
+            raise HTTPException(status_code=500, detail="Space delete failed {}".format(e)) 
+    try:
+        Space.registry().delete(space_id)
+    except KeyError:
+        #a concurrent delete request got there first
+        pass
+    ListingCaches().drop(space_id)
+    Validations().drop(space_id)
+    CrateRdfs().drop(storage_path)
+    return {'message':'successfully deleted space'}
 
 @router.post('/', status_code=201, tags=["Spaces"])
-async def add_space(*,item: SpaceModel):
+def add_space(*,item: SpaceModel, response: Response,
+              background: bool = Query(False, description="make the space in a background job and answer 202 with the job handle")):
     tocheckpath = str(item.storage_path)
     space_id = uuid.uuid4().hex
-    with open(Locations().join_abs_path('spaces.json'), "r+")as file:
-        data = json.load(file)
-        if space_id in data.keys():
-            raise HTTPException(status_code=400, detail="Space already exists")
-        check_aval = await check_path_availability(tocheckpath,space_id)
-        tocheckpath = check_aval
-        toposturl = 'http://localhost:6656/apiv1/profiles/'+str(item.RO_profile)  #TODO : figure out how to not hardcode this <---
-        async with ClientSession() as session:
-            response = await session.request(method='GET', url=toposturl)
-            log.debug(response.status)
-            if response.status != 200:
-                raise HTTPException(status_code=400, detail="Given RO-profile does not exist")
-            if response.status == 200:
-                try:
-                    Space(
-                        storage_path=os.path.join(item.storage_path,item.name),
-                        ro_profile=item.RO_profile,
-                        remote_url=item.remote_url
-                    )
-                except Exception as e:
-                    log.error(f"Error wile making space : {e}")
-                    log.exception(e)
+    if Space.exists(space_id):
+        raise HTTPException(status_code=400, detail="Space already exists")
+    check_aval = check_path_availability(tocheckpath,item.name)
+    tocheckpath = check_aval
+    if not profile_exists(item.RO_profile):
+        raise HTTPException(status_code=400, detail="Given RO-profile does not exist")
+    def make_space():
+        space = Space(
+            storage_path=os.path.join(item.storage_path,item.name),
+            ro_profile=item.RO_profile,
+            remote_url=item.remote_url
+        )
+        return {'Message':f"Space made, location:{item.storage_path}", 'name': item.name, 'space_id': space.uuid}
+    if background:
+        return job_accepted(response, Jobs().submit("space.create", make_space, params={'name':item.name, 'storage_path':item.storage_path}))
+    try:
+        make_space()
+    except Exception as e:
+        log.error(f"Error wile making space : {e}")
+        log.exception(e)
     return {'Message':f"Space made, location:{item.storage_path}", 'name': item.name}
 
 @router.put('/{space_id}/', status_code=202, tags=["Spaces"])
-async def update_space(*,space_id: str = Path(None,description="space_id name"), item: SpaceModel):
+def update_space(*,space_id: str = Path(None,description="space_id name"), item: SpaceModel):
     tocheckpath = str(item.storage_path)
-    with open(Locations().join_abs_path('spaces.json'), "r+")as file:
-        data = json.load(file)
-    for space, info in data.items():
-        if space_id == space:
-            toposturl = 'http://localhost:6656/apiv1/profiles/'+str(item.RO_profile)  #TODO : figure out how to not hardcode this <---
-            async with ClientSession() as session:
-                response = await session.request(method='GET', url=toposturl)
-                log.debug(response.status)
-                if response.status != 200:
-                    raise HTTPException(status_code=400, detail="Given RO-profile does not exist")
-            data[space_id]= {'storage_path':info["storage_path"],'ro_profile':item.RO_profile}
-            with open(Locations().join_abs_path('spaces.json'), "w") as file:
-                json.dump(data, file)  
-            return {'Data':'Update successfull'} 
-    raise HTTPException(status_code=404, detail="Space not found")
+    if not Space.exists(space_id):
+        raise HTTPException(status_code=404, detail="Space not found")
+    if not profile_exists(item.RO_profile):
+        raise HTTPException(status_code=400, detail="Given RO-profile does not exist")
+    try:
+        Space.registry().patch(space_id, {'ro_profile':item.RO_profile})
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Space not found")
+    return {'Data':'Update successfull'} 
 
 @router.get('/{space_id}/fixcrate', status_code=201, tags=["Spaces"])
-async def fix_crate(*,space_id: str = Path(None,description="space_id name")): 
-    with open(Locations().join_abs_path('spaces.json'), "r+") as file:
-        data = json.load(file)
-        try:
-            space_folder = data[space_id]['storage_path']
-            repo = git.Repo(space_folder)
-        except Exception as e:
+def fix_crate(*,space_id: str = Path(None,description="space_id name"), response: Response,
+              dry_run: bool = Query(False, description="only report the changes fixcrate would make"),
+              full: bool = Query(False, description="rebuild the whole crate instead of only what changed since the last fixcrate"),
+              background: bool = Query(False, description="run fixcrate in a background job and answer 202 with the job handle")): 
+    if background:
+        if not Space.exists(space_id):
             raise HTTPException(status_code=404, detail="Space not found")
-    test = complete_metadata_crate(source_path_crate=space_folder)
-    repo.git.add(all=True)
-    return {'Data':test} 
+        def run_fixcrate():
+            test, changes = fix_space_crate(space_id, dry_run=dry_run, full=full)
+            return {'Data':test, 'Changes':changes, 'dry_run':dry_run}
+        return job_accepted(response, Jobs().submit("space.fixcrate", run_fixcrate, params={'space_id':space_id, 'dry_run':dry_run, 'full':full}))
+    try:
+        test, changes = fix_space_crate(space_id, dry_run=dry_run, full=full)
+    except (KeyError, git.exc.NoSuchPathError, git.exc.InvalidGitRepositoryError) as e:
+        raise HTTPException(status_code=404, detail="Space not found")
+    return {'Data':test, 'Changes':changes, 'dry_run':dry_run} 
+
+@router.get('/{space_id}/validate', status_code=200, tags=["Spaces"])
+def validate_crate(*,space_id: str = Path(None,description="space_id name"), response: Response,
+                   full: bool = Query(False, description="validate the whole crate instead of only the entities changed since the last validation"),
+                   background: bool = Query(False, description="run the validation in a background job and answer 202 with the job handle")):
+    try:
+        Space.read_info(space_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Space not found")
+    if background:
+        return job_accepted(response, Jobs().submit("space.validate", validate_space, space_id, full=full, params={'space_id':space_id, 'full':full}))
+    try:
+        return validate_space(space_id, full=full)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Space crate or constraints not found: {e}")
+    except Exception as e:
+        log.error(f"validation of space {space_id} failed")
+        log.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
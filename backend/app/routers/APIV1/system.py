@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+import logging
+log=logging.getLogger(__name__)
+
+from app.model.cratecache import CrateMetadataCache
+from app.services.execution import Execution
+from app.services.listing import ListingCaches
+from app.services.jobs import Jobs
+from app.services.sync import RepoSyncs
+from app.services.validation import Validations
+from app.services.craterdf import CrateRdfs
+
+router = APIRouter(
+    prefix="",
+    tags=["System"],
+)
+
+### api paths ###
+
+@router.get('/stats')
+def get_stats():
+    """queue depths and latencies of the execution pools, the job queue and the cache counters of this worker process"""
+    return {'execution':Execution().metrics(),
+            'jobs':Jobs().metrics(),
+            'repo_sync':RepoSyncs().metrics(),
+            'validation':Validations().metrics(),
+            'caches':{'crate_metadata':CrateMetadataCache().metrics(),
+                      'listing':ListingCaches().metrics(),
+                      'crate_rdf':CrateRdfs().metrics()}}
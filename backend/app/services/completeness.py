@@ -0,0 +1,111 @@
+#crate completeness scoring here
+import numpy as np
+import logging
+
+log=logging.getLogger(__name__)
+
+def resource_type(graph, model, resource_id):
+    """ the @type a resource is scored against, the same rule get_predicates_by_id uses:
+        the last @type of the resource that has a shape in the constraints
+    """
+    found = None
+    for entity in graph.entities(resource_id):
+        entity_type = entity.get("@type")
+        if model.shape_for(entity_type) is not None:
+            found = entity_type
+    return found
+
+def group_resources_by_type(graph, model):
+    """ids of all resources that can be scored, per constrained type"""
+    candidates = {}
+    for target_name in model.targets():
+        for resource_id in graph.ids_by_type(target_name):
+            candidates[resource_id] = None
+    groups = {}
+    for resource_id in candidates:
+        found = resource_type(graph, model, resource_id)
+        if found is not None:
+            groups.setdefault(found, []).append(resource_id)
+    return groups
+
+def presence_matrix(graph, resource_ids, labels):
+    """ resources x properties matrix, true where the resource has the predicate
+    :param resource_ids: @ids of the resources (rows)
+    :type  resource_ids: list
+    :param labels: predicate names (columns)
+    :type  labels: list
+    :rtype: numpy.ndarray of bool
+    """
+    predicates = []
+    for resource_id in resource_ids:
+        keys = set()
+        for entity in graph.entities(resource_id):
+            keys.update(entity)
+        predicates.append(keys)
+    matrix = np.zeros((len(resource_ids), len(labels)), dtype=bool)
+    for column, label in enumerate(labels):
+        matrix[:, column] = np.fromiter((label in keys for keys in predicates), dtype=bool, count=len(predicates))
+    return matrix
+
+def score_matrix(matrix, required):
+    """ green/orange/red percentages per row of a presence matrix
+        green: present properties, orange: missing optional ones, red: missing required ones
+    :param matrix: resources x properties presence
+    :type  matrix: numpy.ndarray of bool
+    :param required: per property, true when it has a minCount
+    :type  required: numpy.ndarray of bool
+    :return: green, orange and red arrays with one value per resource
+    :rtype: tuple
+    """
+    resources, properties = matrix.shape
+    if properties == 0:
+        zeros = np.zeros(resources)
+        return zeros, zeros, zeros
+    green = matrix.sum(axis=1) / properties * 100
+    orange = (~matrix & ~required).sum(axis=1) / properties * 100
+    red = (~matrix & required).sum(axis=1) / properties * 100
+    return green, orange, red
+
+def crate_completeness(graph, model, include_resources=True):
+    """ completeness of all resources of a crate against its constraints, per resource and per type
+    :param graph: the indexed crate metadata
+    :type  graph: CrateGraph
+    :param model: the compiled constraints of the space
+    :type  model: ConstraintModel
+    :param include_resources: Optional - also return the scores of every single resource
+    :type  include_resources: bool
+    """
+    types = {}
+    resources = {}
+    all_green, all_orange, all_red = [], [], []
+    for type_name, resource_ids in group_resources_by_type(graph, model).items():
+        props = model.properties_for(type_name)
+        labels = [prop.label for prop in props]
+        required = np.array([prop.required == 1 for prop in props], dtype=bool)
+        matrix = presence_matrix(graph, resource_ids, labels)
+        green, orange, red = score_matrix(matrix, required)
+        filled = matrix.mean(axis=0) if len(resource_ids) else np.zeros(len(labels))
+        types[type_name] = {'resources': len(resource_ids),
+                            'green': float(green.mean()),
+                            'orange': float(orange.mean()),
+                            'red': float(red.mean()),
+                            'properties': {label: {'min': prop.required, 'filled': float(fill)}
+                                           for label, prop, fill in zip(labels, props, filled)}}
+        if include_resources:
+            for i, resource_id in enumerate(resource_ids):
+                resources[resource_id] = {'type': type_name,
+                                          'green': float(green[i]),
+                                          'orange': float(orange[i]),
+                                          'red': float(red[i])}
+        all_green.append(green)
+        all_orange.append(orange)
+        all_red.append(red)
+    if all_green:
+        green, orange, red = (np.concatenate(scores) for scores in (all_green, all_orange, all_red))
+        summary = {'resources': int(green.size), 'green': float(green.mean()), 'orange': float(orange.mean()), 'red': float(red.mean())}
+    else:
+        summary = {'resources': 0, 'green': 0, 'orange': 0, 'red': 0}
+    toreturn = {'summary': summary, 'types': types}
+    if include_resources:
+        toreturn['resources'] = resources
+    return toreturn
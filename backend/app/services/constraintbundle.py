@@ -0,0 +1,111 @@
+#constraint bundle builder here
+import os, hashlib, tempfile
+from rdflib import Graph, BNode
+from rdflib.compare import to_canonical_graph
+from app.shacl_helper import load_graph
+import logging
+
+log=logging.getLogger(__name__)
+
+#the bundle is kept as turtle for people and as n-triples next to it for fast reloads
+NT_SUFFIX = '.nt'
+
+def bundle_nt_path(path_ttl):
+    """the n-triples form of a bundle, all_constraints.ttl -> all_constraints.nt"""
+    return os.path.splitext(path_ttl)[0] + NT_SUFFIX
+
+def top_level_subjects(graph):
+    """the iri subjects and the blank node subjects no other triple points to"""
+    objects = set(o for o in graph.objects() if isinstance(o, BNode))
+    return [s for s in set(graph.subjects()) if not isinstance(s, BNode) or s not in objects]
+
+def shape_triples(graph, subject):
+    """ the triples of a subject and of the blank nodes below it (its concise bounded description)
+    :rtype: list
+    """
+    triples = []
+    seen = {subject}
+    todo = [subject]
+    while todo:
+        node = todo.pop()
+        for triple in graph.triples((node, None, None)):
+            triples.append(triple)
+            obj = triple[2]
+            if isinstance(obj, BNode) and obj not in seen:
+                seen.add(obj)
+                todo.append(obj)
+    return triples
+
+def shape_key(triples):
+    """hash of a shape that is the same whatever its blank nodes are named"""
+    shape = Graph()
+    for triple in triples:
+        shape.add(triple)
+    lines = sorted(" ".join(term.n3() for term in triple) for triple in to_canonical_graph(shape))
+    return hashlib.sha1("\n".join(lines).encode('utf-8')).hexdigest()
+
+def merge_shapes(ttl_files):
+    """ parse the turtle files once and merge them into one graph, a shape that is
+        exactly the same in several files (blank node names aside) is only kept once
+    :param ttl_files: turtle files, in the order of the seeds
+    :type  ttl_files: list
+    :return: the merged graph and the number of left out duplicate shapes
+    :rtype: tuple
+    """
+    merged = Graph()
+    seen = set()
+    duplicates = 0
+    for path in ttl_files:
+        source = load_graph(path, rdf_format='turtle')
+        for prefix, namespace in source.namespaces():
+            merged.bind(prefix, namespace, override=False)
+        for subject in top_level_subjects(source):
+            triples = shape_triples(source, subject)
+            key = shape_key(triples)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            for triple in triples:
+                merged.add(triple)
+    return merged, duplicates
+
+def _write_atomic(path, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(prefix='.bundle.', suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def build_constraint_bundle(ttl_files, path_ttl):
+    """ write the deduplicated shapes of the turtle files to path_ttl and its n-triples form,
+        a rebuild replaces the bundle instead of growing it
+    :param ttl_files: turtle files of the seed crates, in seed order
+    :type  ttl_files: list
+    :param path_ttl: the bundle, i.e. all_constraints.ttl in the workspace
+    :type  path_ttl: Path
+    :return: counts of the files, triples and duplicate shapes
+    :rtype: dict
+    """
+    merged, duplicates = merge_shapes(ttl_files)
+    _write_atomic(path_ttl, merged.serialize(format='turtle', encoding='utf-8'))
+    #written after the turtle, a newer or equally old .nt is in sync with it
+    _write_atomic(bundle_nt_path(path_ttl), merged.serialize(format='nt', encoding='utf-8'))
+    log.info(f"built constraint bundle {path_ttl} of {len(ttl_files)} files: {len(merged)} triples, {duplicates} duplicate shapes left out")
+    return {'files':len(ttl_files), 'triples':len(merged), 'duplicate_shapes':duplicates}
+
+def load_bundle_graph(path_ttl):
+    """ the graph of a constraint bundle, from the n-triples form when it is in sync with the turtle
+    :rtype: rdflib.Graph
+    """
+    path_nt = bundle_nt_path(path_ttl)
+    try:
+        if os.stat(path_nt).st_mtime_ns >= os.stat(path_ttl).st_mtime_ns:
+            return load_graph(path_nt)
+    except FileNotFoundError:
+        pass
+    return load_graph(path_ttl)
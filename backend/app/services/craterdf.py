@@ -0,0 +1,238 @@
+#json-ld to rdf conversion of crate metadata here
+import os, json, hashlib, tempfile, threading
+from collections import OrderedDict
+from functools import lru_cache
+import git
+import rdflib
+from rdflib import Graph, URIRef, BNode, Literal
+import logging
+from app.model.location import Locations, singleton
+
+log=logging.getLogger(__name__)
+
+DEFAULT_CACHE_ENTRIES = 32
+#the urls crates use for the ro-crate context, all resolved to the local copy
+ROCRATE_CONTEXT_URLS = tuple(f"{scheme}://w3id.org/ro/crate/{version}/context"
+                             for scheme in ("https", "http") for version in ("1.0", "1.1", "1.2", "1.3"))
+
+@lru_cache(maxsize=1)
+def rocrate_context():
+    """ the ro-crate json-ld context, read from DMBON_FAST_API_ROCRATE_CONTEXT when set or else
+        from the context the rocrate library ships with, never fetched over the network
+    :rtype: dict
+    """
+    path = os.environ.get("DMBON_FAST_API_ROCRATE_CONTEXT")
+    if not path:
+        import rocrate
+        path = os.path.join(os.path.dirname(rocrate.__file__), 'data', 'ro-crate.jsonld')
+    with open(path, encoding='utf-8') as context_file:
+        document = json.load(context_file)
+    log.info(f"using the ro-crate context of {path}")
+    return document.get('@context', document)
+
+@lru_cache(maxsize=1)
+def conversion_version():
+    """changes whenever a crate would convert to other triples: another context or rdflib version"""
+    context = json.dumps(rocrate_context(), sort_keys=True)
+    return hashlib.sha1(f"{rdflib.__version__}\n{context}".encode('utf-8')).hexdigest()[:16]
+
+def local_context(context):
+    """the @context of a crate with the ro-crate context urls replaced by the local copy"""
+    if isinstance(context, str):
+        return rocrate_context() if context.rstrip('/') in ROCRATE_CONTEXT_URLS else context
+    if isinstance(context, list):
+        return [local_context(item) for item in context]
+    return context
+
+def metadata_to_graph(metadata, base):
+    """ the rdf graph of the json-ld of a crate, without fetching the ro-crate context
+    :param metadata: the ro-crate-metadata.json content
+    :type  metadata: dict
+    :param base: iri the relative @ids of the crate are resolved against
+    :type  base: str
+    :rtype: rdflib.Graph
+    """
+    if '@context' in metadata:
+        metadata = dict(metadata, **{'@context':local_context(metadata['@context'])})
+    return Graph().parse(data=json.dumps(metadata), format='json-ld', base=base)
+
+def crate_revision(storage_path):
+    """ what the rdf of a crate depends on: the git HEAD of its folder and the
+        (mtime_ns, size) of its ro-crate-metadata.json in the working tree
+    :raises FileNotFoundError: the crate has no ro-crate-metadata.json
+    :rtype: tuple
+    """
+    stat = os.stat(os.path.join(storage_path, 'ro-crate-metadata.json'))
+    try:
+        head = git.Repo(storage_path).head.commit.hexsha
+    except Exception:
+        #not a git repo (yet) or no commits, the working tree stamp alone keys it
+        head = None
+    return (head, stat.st_mtime_ns, stat.st_size)
+
+def triples_to_json(triples):
+    """ compact json of triples: a table of the distinct terms and the triples as indexes into it.
+        An iri is a string, a blank node [id] and a literal [lexical form, datatype, language].
+    :rtype: bytes
+    """
+    index, terms, rows = {}, [], []
+    for triple in triples:
+        row = []
+        for term in triple:
+            position = index.get(term)
+            if position is None:
+                position = index[term] = len(terms)
+                if isinstance(term, URIRef):
+                    terms.append(str(term))
+                elif isinstance(term, BNode):
+                    terms.append([str(term)])
+                else:
+                    terms.append([str(term), str(term.datatype) if term.datatype is not None else None, term.language])
+            row.append(position)
+        rows.append(row)
+    return json.dumps({'terms':terms, 'triples':rows}, separators=(',', ':')).encode('utf-8')
+
+def _term(encoded):
+    if isinstance(encoded, str):
+        return URIRef(encoded)
+    if len(encoded) == 1:
+        return BNode(encoded[0])
+    lexical, datatype, language = encoded
+    return Literal(lexical, datatype=datatype, lang=language)
+
+def triples_from_json(data):
+    """the triples of triples_to_json, a file of it is only ever read as json"""
+    document = json.loads(data)
+    terms = [_term(encoded) for encoded in document['terms']]
+    return [(terms[s], terms[p], terms[o]) for s, p, o in document['triples']]
+
+def _graph_of(triples):
+    graph = Graph()
+    graph.addN((s, p, o, graph) for s, p, o in triples)
+    return graph
+
+class CrateRdfCache():
+    """ Converts the ro-crate-metadata.json of crates to rdf once per revision of the crate.
+        The triples are kept in memory for the most recently used crates and written as compact
+        json to cache_folder, so other workers and restarts load them instead of expanding the json-ld again.
+        Every call returns a new graph, callers can change it.
+    """
+    def __init__(self, cache_folder, max_entries=None):
+        """
+        :param cache_folder: folder keeping the triples as json, one file per crate
+        :type cache_folder: Path
+        :param max_entries: Optional - number of crates kept in memory, DMBON_FAST_API_RDF_CACHE_ENTRIES by default
+        :type max_entries: int
+        """
+        if max_entries is None:
+            max_entries = int(os.environ.get("DMBON_FAST_API_RDF_CACHE_ENTRIES", DEFAULT_CACHE_ENTRIES))
+        self.cache_folder = cache_folder
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.loads = 0
+        self.conversions = 0
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(cache_folder={self.cache_folder}, entries={len(self._entries)})"
+
+    @staticmethod
+    def _crate_prefix(storage_path):
+        return hashlib.sha1(os.path.abspath(storage_path).encode('utf-8')).hexdigest()[:16] + '-'
+
+    def _cache_file(self, storage_path, key):
+        return os.path.join(self.cache_folder, self._crate_prefix(storage_path) + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16] + '.json')
+
+    def _remove_files(self, prefix, keep=None):
+        try:
+            names = os.listdir(self.cache_folder)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith(prefix) and name != keep:
+                try:
+                    os.unlink(os.path.join(self.cache_folder, name))
+                except FileNotFoundError:
+                    pass
+
+    def _load(self, cache_file):
+        try:
+            with open(cache_file, 'rb') as cached:
+                return triples_from_json(cached.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning(f"ignoring unreadable rdf cache file {cache_file}: {e}")
+            return None
+
+    def _dump(self, storage_path, cache_file, triples):
+        os.makedirs(self.cache_folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.rdf.', suffix='.tmp', dir=self.cache_folder)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(triples_to_json(triples))
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        #older revisions of the same crate are of no use anymore
+        self._remove_files(self._crate_prefix(storage_path), keep=os.path.basename(cache_file))
+
+    def graph(self, storage_path, base, metadata=None):
+        """ the rdf graph of the ro-crate-metadata.json of a crate
+        :param storage_path: folder of the crate
+        :type  storage_path: Path
+        :param base: iri the relative @ids of the crate are resolved against
+        :type  base: str
+        :param metadata: Optional - the parsed metadata, read from the crate when it has to be converted
+        :type  metadata: dict
+        :raises FileNotFoundError: the crate has no ro-crate-metadata.json
+        :rtype: rdflib.Graph
+        """
+        key = (crate_revision(storage_path), base, conversion_version())
+        with self._lock:
+            entry = self._entries.get(storage_path)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(storage_path)
+                self.hits += 1
+                return _graph_of(entry[1])
+        cache_file = self._cache_file(storage_path, key)
+        triples = self._load(cache_file)
+        if triples is not None:
+            self.loads += 1
+        else:
+            if metadata is None:
+                with open(os.path.join(storage_path, 'ro-crate-metadata.json'), encoding='utf-8') as metadata_file:
+                    metadata = json.load(metadata_file)
+            log.debug(f"converting the json-ld of {storage_path} to rdf")
+            triples = list(metadata_to_graph(metadata, base))
+            self.conversions += 1
+            try:
+                self._dump(storage_path, cache_file, triples)
+            except OSError as e:
+                log.warning(f"could not write rdf cache file {cache_file}: {e}")
+        with self._lock:
+            self._entries[storage_path] = (key, triples)
+            self._entries.move_to_end(storage_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return _graph_of(triples)
+
+    def drop(self, storage_path):
+        """forget the rdf of a crate, in memory and on disk"""
+        with self._lock:
+            self._entries.pop(storage_path, None)
+        self._remove_files(self._crate_prefix(storage_path))
+
+    def metrics(self):
+        with self._lock:
+            return {'entries':len(self._entries), 'max_entries':self.max_entries,
+                    'hits':self.hits, 'loads':self.loads, 'conversions':self.conversions}
+
+@singleton
+class CrateRdfs(CrateRdfCache):
+    """the rdf cache of the api, its files are kept in the rdf-cache folder next to the registries"""
+    def __init__(self):
+        super().__init__(Locations().join_abs_path("rdf-cache"))
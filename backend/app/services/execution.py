@@ -0,0 +1,182 @@
+#execution layer here
+import os, time, threading, asyncio
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+from app.model.location import singleton
+
+log=logging.getLogger(__name__)
+
+DEFAULT_IO_WORKERS = 16
+DEFAULT_CPU_WORKERS = 2
+
+def _call_name(func):
+    return getattr(func, '__qualname__', None) or getattr(func, '__name__', None) or repr(func)
+
+def _timed_call(func, args, kwargs):
+    """runs in the worker process, returns when it started and how long it ran next to the result"""
+    started_at = time.time()
+    result = func(*args, **kwargs)
+    return started_at, time.time() - started_at, result
+
+class PoolStats():
+    """ Counters of one pool: queue depth, running calls and
+        the wait (queued) and run time of the calls, per called function.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self._calls = {}
+
+    def submitted(self):
+        with self._lock:
+            self.queued += 1
+
+    def started(self):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+
+    def finished(self, name, waited, ran, ok):
+        with self._lock:
+            self.running -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            calls = self._calls.setdefault(name, {'count':0, 'wait_total':0.0, 'run_total':0.0, 'run_max':0.0})
+            calls['count'] += 1
+            calls['wait_total'] += waited
+            calls['run_total'] += ran
+            calls['run_max'] = max(calls['run_max'], ran)
+
+    def as_dict(self):
+        with self._lock:
+            calls = {name:{'count':c['count'],
+                           'wait_avg_s':c['wait_total'] / c['count'],
+                           'run_avg_s':c['run_total'] / c['count'],
+                           'run_max_s':c['run_max']} for name, c in self._calls.items()}
+            return {'queued':self.queued, 'running':self.running, 'completed':self.completed, 'failed':self.failed, 'calls':calls}
+
+class Executor():
+    """ Runs blocking work on dedicated pools instead of the event loop:
+        git, filesystem and json file i/o on a thread pool, awaited with aio from async code
+        (plain def routes already run on the route threads and call blocking code directly),
+        cpu heavy work such as rdflib/shacl parsing on a process pool so it does not hold the GIL of the server.
+        Pool sizes are set with DMBON_FAST_API_IO_WORKERS and DMBON_FAST_API_CPU_WORKERS,
+        with 0 cpu workers the cpu work runs on the io pool instead.
+        The process pool uses spawn as forking a threaded server is not safe,
+        cpu calls need a module level function and picklable arguments and results.
+        For the process pool the queued count holds all calls in flight, a process can not tell when it starts.
+    """
+    def __init__(self, io_workers=None, cpu_workers=None):
+        """
+        :param io_workers: Optional - number of io threads
+        :type io_workers: int
+        :param cpu_workers: Optional - number of cpu processes
+        :type cpu_workers: int
+        """
+        if io_workers is None:
+            io_workers = int(os.environ.get("DMBON_FAST_API_IO_WORKERS", DEFAULT_IO_WORKERS))
+        if cpu_workers is None:
+            cpu_workers = int(os.environ.get("DMBON_FAST_API_CPU_WORKERS", DEFAULT_CPU_WORKERS))
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers
+        self._io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix='dmbon-io')
+        self._cpu_pool = None
+        self._cpu_lock = threading.Lock()
+        self.io_stats = PoolStats()
+        self.cpu_stats = PoolStats()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(io_workers={self.io_workers}, cpu_workers={self.cpu_workers})"
+
+    def _run_io(self, name, queued_at, func, args, kwargs):
+        started_at = time.monotonic()
+        self.io_stats.started()
+        ok = False
+        try:
+            result = func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self.io_stats.finished(name, started_at - queued_at, time.monotonic() - started_at, ok)
+
+    def submit_io(self, func, *args, **kwargs):
+        """ queue blocking i/o on the io thread pool
+        :rtype: concurrent.futures.Future
+        """
+        self.io_stats.submitted()
+        return self._io_pool.submit(self._run_io, _call_name(func), time.monotonic(), func, args, kwargs)
+
+    def submit_cpu(self, func, *args, **kwargs):
+        """ queue cpu heavy work on the process pool
+        :param func: module level function, it is pickled to the worker process
+        :type  func: callable
+        :rtype: concurrent.futures.Future
+        """
+        if self.cpu_workers <= 0:
+            return self.submit_io(func, *args, **kwargs)
+        name = _call_name(func)
+        self.cpu_stats.submitted()
+        queued_at = time.time()
+        future = Future()
+        def _done(timed):
+            self.cpu_stats.started()
+            error = timed.exception()
+            if error is not None:
+                self.cpu_stats.finished(name, time.time() - queued_at, 0.0, False)
+                future.set_exception(error)
+            else:
+                started_at, ran, result = timed.result()
+                self.cpu_stats.finished(name, max(0.0, started_at - queued_at), ran, True)
+                future.set_result(result)
+        self._process_pool_submit(func, args, kwargs).add_done_callback(_done)
+        return future
+
+    def _process_pool_submit(self, func, args, kwargs):
+        with self._cpu_lock:
+            if self._cpu_pool is None:
+                #started on first use, most requests never need it
+                self._cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_workers, mp_context=multiprocessing.get_context('spawn'))
+            try:
+                return self._cpu_pool.submit(_timed_call, func, args, kwargs)
+            except BrokenProcessPool:
+                #a worker process died, start a fresh pool
+                log.warning("cpu process pool broke, starting a new one")
+                self._cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_workers, mp_context=multiprocessing.get_context('spawn'))
+                return self._cpu_pool.submit(_timed_call, func, args, kwargs)
+
+    def io(self, func, *args, **kwargs):
+        """run blocking i/o on the io pool and wait for its result"""
+        return self.submit_io(func, *args, **kwargs).result()
+
+    def cpu(self, func, *args, **kwargs):
+        """run cpu heavy work on the process pool and wait for its result"""
+        return self.submit_cpu(func, *args, **kwargs).result()
+
+    async def aio(self, func, *args, **kwargs):
+        """await blocking i/o on the io pool from async code"""
+        return await asyncio.wrap_future(self.submit_io(func, *args, **kwargs))
+
+    def metrics(self):
+        """pool sizes, queue depths and call latencies"""
+        return {'io':dict(workers=self.io_workers, **self.io_stats.as_dict()),
+                'cpu':dict(workers=self.cpu_workers, **self.cpu_stats.as_dict())}
+
+    def shutdown(self, wait=True):
+        self._io_pool.shutdown(wait=wait)
+        with self._cpu_lock:
+            if self._cpu_pool is not None:
+                self._cpu_pool.shutdown(wait=wait)
+                self._cpu_pool = None
+
+@singleton
+class Execution(Executor):
+    """the execution pools of the api process"""
+    def __init__(self):
+        super().__init__()
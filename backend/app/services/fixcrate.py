@@ -0,0 +1,340 @@
+#fixcrate service here
+import os, json, copy, tempfile, contextlib
+import logging
+from app.model.cratecache import CrateMetadataCache, copy_metadata
+from app.model.crategraph import CrateGraph
+
+log=logging.getLogger(__name__)
+
+#folders that are never part of the crate
+SKIP_DIRS = frozenset(('.git',))
+#bump when the layout of the fixcrate manifest changes
+MANIFEST_VERSION = 1
+#the crate is rebuilt starting from this template
+TEMPLATE_METADATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "webtop-work-space", "ro-crate-metadata.json")
+
+def parent_id(entity_id):
+    """@id of the folder holding an entity, './' for the top level"""
+    parent = os.path.dirname(entity_id.rstrip('/'))
+    return parent + '/' if parent else './'
+
+def scan_folder(folder):
+    """ lists one folder with os.scandir, without following symlinks and leaving out .git
+    :return: name -> [is_dir, size, mtime_ns, inode] of all entries
+    :rtype: dict
+    """
+    entries = {}
+    with os.scandir(folder) as listing:
+        for entry in listing:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir and entry.name in SKIP_DIRS:
+                continue
+            st = entry.stat(follow_symlinks=False)
+            entries[entry.name] = [is_dir, 0 if is_dir else st.st_size, st.st_mtime_ns, st.st_ino]
+    return entries
+
+def restat_files(folder, entries):
+    """ the entries of a folder listing with the [is_dir, size, mtime_ns, inode] of its files stat-ed again,
+        folders are kept as they were
+    :return: the refreshed entries or None when a file is gone, the folder then has to be listed again
+    :rtype: dict
+    """
+    refreshed = {}
+    #names are looked up relative to the open folder where the os allows it, without joining and resolving paths
+    dir_fd = os.open(folder, os.O_RDONLY) if os.stat in os.supports_dir_fd else None
+    try:
+        for name, info in entries.items():
+            if info[0]:
+                refreshed[name] = info
+                continue
+            try:
+                if dir_fd is None:
+                    st = os.stat(os.path.join(folder, name), follow_symlinks=False)
+                else:
+                    st = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+            except FileNotFoundError:
+                return None
+            refreshed[name] = [False, st.st_size, st.st_mtime_ns, st.st_ino]
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    return refreshed
+
+def _entry_id(relative_folder, name, is_dir):
+    return relative_folder + name + ('/' if is_dir else '')
+
+def _previous_subtree(previous, folder_id):
+    """@ids of everything the previous scan had below a folder"""
+    stack = [folder_id]
+    while stack:
+        relative_folder = stack.pop()
+        for name, info in previous.get(relative_folder, {}).get('entries', {}).items():
+            entity_id = _entry_id(relative_folder, name, info[0])
+            yield entity_id
+            if info[0]:
+                stack.append(entity_id)
+
+def scan_storage(source_path_crate, previous=None):
+    """ scans the storage path of a crate, only listing the folders that changed since a previous scan
+        A folder's mtime changes whenever entries are added, removed or renamed in it, so folders
+        with the same (mtime_ns, inode) as before keep their previous listing and only get their
+        files stat-ed again, which finds the files that were edited in place.
+    :param source_path_crate: root folder of the crate
+    :type  source_path_crate: Path
+    :param previous: Optional - the folders of a previous scan, without it everything counts as added
+    :type  previous: dict
+    :return: the folders of this scan and the changes: added (@id, is_dir) with parents before their content,
+             removed @ids and the @ids of files with another size, mtime or inode
+    :rtype: tuple
+    """
+    previous = previous or {}
+    folders = {}
+    added, removed, changed = [], [], []
+    stack = [""]
+    while stack:
+        relative_folder = stack.pop()
+        folder = os.path.join(source_path_crate, relative_folder)
+        try:
+            #stat before listing, a change during the listing then shows up again next time
+            st = os.stat(folder)
+            stamp = [st.st_mtime_ns, st.st_ino]
+            before = previous.get(relative_folder)
+            entries = None
+            if before is not None and before['stamp'] == stamp:
+                entries = restat_files(folder, before['entries'])
+            listed = entries is None
+            if listed:
+                entries = scan_folder(folder)
+        except OSError as e:
+            log.warning(f"could not list {relative_folder or './'} of {source_path_crate}: {e}")
+            continue
+        previous_entries = before['entries'] if before is not None else {}
+        for name in sorted(entries):
+            info = entries[name]
+            old_info = previous_entries.get(name)
+            if old_info is not None and old_info[0] != info[0]:
+                #a file became a folder or the other way around
+                removed.append(_entry_id(relative_folder, name, old_info[0]))
+                removed.extend(_previous_subtree(previous, _entry_id(relative_folder, name, old_info[0])))
+                old_info = None
+            if old_info is None:
+                added.append((_entry_id(relative_folder, name, info[0]), info[0]))
+            elif not info[0] and old_info != info:
+                changed.append(_entry_id(relative_folder, name, info[0]))
+        if listed:
+            for name, old_info in previous_entries.items():
+                if name not in entries:
+                    removed.append(_entry_id(relative_folder, name, old_info[0]))
+                    if old_info[0]:
+                        removed.extend(_previous_subtree(previous, _entry_id(relative_folder, name, True)))
+        folders[relative_folder] = {'stamp':stamp, 'entries':entries}
+        stack.extend(sorted((_entry_id(relative_folder, name, True) for name, info in entries.items() if info[0]), reverse=True))
+    return folders, {'added':added, 'removed':removed, 'changed':changed}
+
+def walk_storage(source_path_crate):
+    """ walks the storage path of a crate with os.scandir, without following symlinks and skipping .git
+    :param source_path_crate: root folder of the crate
+    :type  source_path_crate: Path
+    :return: (relative @id, is_dir) tuples, folders get a trailing / and come before their content
+    :rtype: list
+    """
+    return scan_storage(source_path_crate)[1]['added']
+
+def is_local_id(entity_id):
+    """false for web resources and contextual entities, those never come from the storage path"""
+    return not ('://' in entity_id or entity_id.startswith('#') or entity_id.startswith('_:'))
+
+def add_entity(graph, entity_id, is_dir):
+    """add a File or Dataset entity to a crate graph and link it from the hasPart of its folder"""
+    if is_dir:
+        graph.add({'@id':entity_id, '@type':"Dataset", 'hasPart':[]})
+    else:
+        graph.add({'@id':entity_id, '@type':"File"})
+    parent = graph.get(parent_id(entity_id)) or graph.get('./')
+    if parent is not None:
+        parent.setdefault('hasPart', []).append({'@id':entity_id})
+
+def apply_changes(graph, added, removed):
+    """ adds and removes files and folders in the graph of an existing crate
+    :param graph: the crate graph to change
+    :type  graph: CrateGraph
+    :param added: (relative @id, is_dir) of the new files and folders, parents before their content
+    :type  added: list
+    :param removed: @ids of the files and folders that are gone
+    :type  removed: list
+    :return: the @ids that were really added and removed
+    :rtype: tuple
+    """
+    removed_ids = [entity_id for entity_id in dict.fromkeys(removed)
+                   if entity_id in graph and entity_id not in CrateGraph.NON_DATA_ENTITY_IDS]
+    gone = set(removed_ids)
+    #unlink from the folders that stay, one pass over the hasPart of each of them
+    per_parent = {}
+    for entity_id in removed_ids:
+        if parent_id(entity_id) not in gone:
+            per_parent.setdefault(parent_id(entity_id), set()).add(entity_id)
+    for folder_id, part_ids in per_parent.items():
+        for parent in graph.entities(folder_id):
+            if isinstance(parent.get('hasPart'), list):
+                parent['hasPart'] = [part for part in parent['hasPart'] if not (isinstance(part, dict) and part.get('@id') in part_ids)]
+    graph.remove(*removed_ids)
+    added_ids = []
+    for entity_id, is_dir in added:
+        if entity_id not in graph:
+            add_entity(graph, entity_id, is_dir)
+            added_ids.append(entity_id)
+    return added_ids, removed_ids
+
+def build_crate(template, old_data, tree):
+    """ builds the metadata of a crate from the template and the files in its storage path,
+        keeping the metadata the old crate had on those files
+    :param template: parsed template metadata
+    :type  template: dict
+    :param old_data: parsed metadata the crate had so far
+    :type  old_data: dict
+    :param tree: (relative @id, is_dir) of all files and folders, parents before children
+    :type  tree: iterable
+    :return: the new metadata
+    :rtype: dict
+    """
+    data = copy.deepcopy(template)
+    graph = CrateGraph(data)
+    file_names = {}
+    for entity_id, is_dir in tree:
+        if entity_id in graph:
+            #the metadata file itself, already in the template
+            continue
+        add_entity(graph, entity_id, is_dir)
+        if not is_dir:
+            name = entity_id.rsplit('/', 1)[-1]
+            file_names[name] = None if name in file_names else entity_id
+
+    ## add the metadata of the old crate correspondingly ##
+    old_graph = CrateGraph(old_data)
+    for entity in data['@graph']:
+        for old_entity in old_graph.entities(entity['@id']):
+            for key, value in old_entity.items():
+                if key not in entity:
+                    entity[key] = value
+    #crates made before files got their relative path as @id used the bare file name
+    for name, entity_id in file_names.items():
+        if entity_id is None or '/' not in entity_id or name in graph:
+            continue
+        for old_entity in old_graph.entities(name):
+            if CrateGraph.is_data_entity(old_entity):
+                entity = graph.get(entity_id)
+                for key, value in old_entity.items():
+                    if key not in entity:
+                        entity[key] = value
+
+    #web resources and contextual entities are kept as they were
+    root = graph.get('./')
+    old_root = old_graph.get('./') or {}
+    old_root_parts = set(part.get('@id') for part in old_root.get('hasPart', []) if isinstance(part, dict))
+    for old_entity in old_data.get('@graph', []):
+        entity_id = old_entity.get('@id')
+        if entity_id is None or entity_id in graph or (is_local_id(entity_id) and CrateGraph.is_data_entity(old_entity)):
+            continue
+        graph.add(copy.deepcopy(old_entity))
+        if entity_id in old_root_parts:
+            root.setdefault('hasPart', []).append({'@id':entity_id})
+    return data
+
+def plan_changes(old_data, new_data):
+    """ the difference between two versions of the crate metadata
+    :return: @ids of the added, removed and changed entities
+    :rtype: dict
+    """
+    old_entities = {entity.get('@id'): entity for entity in old_data.get('@graph', [])}
+    new_entities = {entity.get('@id'): entity for entity in new_data['@graph']}
+    return {'added':[entity_id for entity_id in new_entities if entity_id not in old_entities],
+            'removed':[entity_id for entity_id in old_entities if entity_id not in new_entities],
+            'changed':[entity_id for entity_id, entity in new_entities.items()
+                       if entity_id in old_entities and old_entities[entity_id] != entity]}
+
+def read_crate_metadata(source_path_crate):
+    """the current metadata of a crate, an empty graph when it has none yet"""
+    try:
+        return CrateMetadataCache().read(os.path.join(source_path_crate, 'ro-crate-metadata.json'))
+    except FileNotFoundError:
+        return {'@graph':[]}
+
+def read_manifest(manifest_path, source_path_crate):
+    """ the folders of the last scan of a crate as stored by write_manifest
+    :return: the folders or None when there is no usable manifest
+    :rtype: dict
+    """
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning(f"ignoring unreadable fixcrate manifest {manifest_path}: {e}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('storage_path') != os.path.realpath(source_path_crate):
+        return None
+    return manifest['folders']
+
+def write_manifest(manifest_path, source_path_crate, folders):
+    """stores the folders of a scan of the crate so the next fixcrate only has to look at what changed"""
+    folder = os.path.dirname(manifest_path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.fixcrate-manifest.', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as manifest_file:
+            manifest_file.write(json.dumps({'version':MANIFEST_VERSION, 'storage_path':os.path.realpath(source_path_crate), 'folders':folders}))
+        os.replace(tmp_path, manifest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def complete_metadata_crate(source_path_crate, dry_run=False, manifest_path=None, full=False):
+    """ brings the ro-crate-metadata.json of a crate in line with the files and folders in its storage path
+        With a manifest of the previous run only the files and folders added or removed since then are
+        processed, without one (or with full=True) the crate is rebuilt from the template.
+    :param source_path_crate: root folder of the crate
+    :type  source_path_crate: Path
+    :param dry_run: Optional - only report what would change, do not write the metadata or manifest
+    :type  dry_run: bool
+    :param manifest_path: Optional - where the manifest of the last run is kept
+    :type  manifest_path: Path
+    :param full: Optional - rebuild the whole crate even when there is a manifest
+    :type  full: bool
+    :return: the new metadata and the planned or made changes
+    :rtype: tuple
+    """
+    metadata_location = os.path.join(source_path_crate, 'ro-crate-metadata.json')
+    cache = CrateMetadataCache()
+    #one run or edit of the crate at a time, a dry run writes nothing and does not wait for others
+    with contextlib.nullcontext() if dry_run else cache.lock(metadata_location):
+        old_data = read_crate_metadata(source_path_crate)
+        previous = None
+        if manifest_path is not None and not full and any(entity.get('@id') == './' for entity in old_data['@graph']):
+            previous = read_manifest(manifest_path, source_path_crate)
+        if previous is None:
+            folders, found = scan_storage(source_path_crate)
+            with open(TEMPLATE_METADATA) as json_file:
+                template = json.load(json_file)
+            data = build_crate(template, old_data, found['added'])
+            changes = plan_changes(old_data, data)
+            changes['full_rebuild'] = True
+            if not dry_run:
+                #write the rocrate file back
+                cache.write(metadata_location, data)
+        else:
+            folders, found = scan_storage(source_path_crate, previous=previous)
+            #changes go to a copy, the cached metadata is shared with readers
+            graph = CrateGraph(copy_metadata(old_data))
+            added, removed = apply_changes(graph, found['added'], found['removed'])
+            if not dry_run and (added or removed):
+                cache.write(metadata_location, graph.data, derived={'graph':graph})
+            data = graph.data
+            changes = {'added':added, 'removed':removed,
+                       'changed':[entity_id for entity_id in found['changed'] if entity_id not in CrateGraph.NON_DATA_ENTITY_IDS],
+                       'full_rebuild':False}
+        log.debug(f"fixcrate changes for {source_path_crate}: {changes}")
+        if manifest_path is not None and not dry_run:
+            write_manifest(manifest_path, source_path_crate, folders)
+    return data, changes
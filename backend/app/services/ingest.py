@@ -0,0 +1,147 @@
+#content ingestion service here
+import os, shutil
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from app.model.cratecache import CrateMetadataCache
+from app.model.crategraph import CrateGraph
+from app.services.fixcrate import SKIP_DIRS, apply_changes
+from app.services.jobs import report_progress
+
+log=logging.getLogger(__name__)
+
+#schemes of content that is only referenced in the crate, not copied
+WEB_SCHEMES = ('http', 'https', 'ftp')
+#paths per git add call, keeps the command line short
+GIT_ADD_CHUNK = 500
+
+def ingest_workers():
+    """size of the copy thread pool, set with the env var DMBON_FAST_API_INGEST_WORKERS"""
+    return int(os.environ.get("DMBON_FAST_API_INGEST_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+
+def is_web_content(content):
+    return urlparse(content).scheme in WEB_SCHEMES
+
+def relative_id(path, space_root):
+    """crate @id of a path in the space, with / separators as the /annotation/file/{file_id:path} routes take it"""
+    return os.path.relpath(path, space_root).replace(os.sep, '/')
+
+def plan_item(content, space_root, target_folder):
+    """ works out what adding one content item takes
+    :param content: url, file or directory to add
+    :type  content: str
+    :param space_root: storage path of the space
+    :type  space_root: Path
+    :param target_folder: folder in the space the content is copied to
+    :type  target_folder: Path
+    :return: report entry of the item, the (@id, is_dir) entities it adds, parents first,
+             and the (source, destination) file copies it needs
+    :rtype: tuple
+    """
+    report = {'content':content, 'status':'added'}
+    if is_web_content(content):
+        report['path'] = content
+        return report, [(content, False)], []
+    if not os.path.exists(content):
+        raise FileNotFoundError(f"{content} does not exist")
+    #the folders between the space root and the target get an entity as well
+    entities = []
+    relative_target = relative_id(target_folder, space_root)
+    if relative_target == '..' or relative_target.startswith('../'):
+        raise ValueError(f"{target_folder} is outside of the space")
+    if relative_target != '.':
+        parts = relative_target.split('/')
+        entities = [('/'.join(parts[:i+1]) + '/', True) for i in range(len(parts))]
+    destination = os.path.join(target_folder, os.path.basename(os.path.normpath(content)))
+    copies = []
+    if os.path.isdir(content):
+        report['path'] = relative_id(destination, space_root) + '/'
+        for dirpath, dirnames, filenames in os.walk(content):
+            dirnames[:] = sorted(name for name in dirnames if name not in SKIP_DIRS)
+            destination_folder = os.path.join(destination, os.path.relpath(dirpath, content))
+            entities.append((relative_id(destination_folder, space_root) + '/', True))
+            for name in sorted(filenames):
+                copies.append((os.path.join(dirpath, name), os.path.join(destination_folder, name)))
+                entities.append((relative_id(os.path.join(destination_folder, name), space_root), False))
+    else:
+        report['path'] = relative_id(destination, space_root)
+        copies.append((content, destination))
+        entities.append((report['path'], False))
+    return report, entities, copies
+
+def copy_file(source, destination):
+    """copy one file, making its folder when needed"""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    shutil.copy2(source, destination)
+
+def stage_paths(repo, paths):
+    """git add only the given paths (relative to the repo), in chunks"""
+    paths = list(dict.fromkeys(paths))
+    for i in range(0, len(paths), GIT_ADD_CHUNK):
+        repo.git.add('--', *paths[i:i+GIT_ADD_CHUNK])
+
+def ingest_content(space_root, contents, target_folder=None, repo=None, max_workers=None):
+    """ adds files, directories and urls to a space: copies the files on a bounded thread pool,
+        adds all new entities to the crate metadata in a single write and stages only the touched paths
+    :param space_root: storage path of the space
+    :type  space_root: Path
+    :param contents: urls, files or directories to add
+    :type  contents: list
+    :param target_folder: Optional - folder in the space to copy the content to, defaults to the space root
+    :type  target_folder: Path
+    :param repo: Optional - git repo of the space, when given the touched paths are staged
+    :type  repo: git.Repo
+    :param max_workers: Optional - number of copy threads, see ingest_workers
+    :type  max_workers: int
+    :return: one report entry per content item, with its status, path in the space and number of copied files
+    :rtype: list
+    """
+    target_folder = target_folder or space_root
+    reports, entities, tasks = [], [], []
+    for i, content in enumerate(contents):
+        try:
+            report, item_entities, copies = plan_item(content, space_root, target_folder)
+        except Exception as e:
+            log.warning(f"can not add {content} to {space_root}: {e}")
+            reports.append({'content':content, 'status':'failed', 'error':str(e)})
+            entities.append([])
+            continue
+        report['files'] = 0
+        reports.append(report)
+        entities.append(item_entities)
+        tasks.extend((i, source, destination) for source, destination in copies)
+
+    for item_entities in entities:
+        for entity_id, is_dir in item_entities:
+            if is_dir:
+                os.makedirs(os.path.join(space_root, *entity_id.rstrip('/').split('/')), exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max_workers or ingest_workers()) as pool:
+        futures = [(i, destination, pool.submit(copy_file, source, destination)) for i, source, destination in tasks]
+        failed = set()
+        for done, (i, destination, future) in enumerate(futures, 1):
+            try:
+                future.result()
+                reports[i]['files'] += 1
+            except Exception as e:
+                log.warning(f"copy of {destination} failed: {e}")
+                reports[i]['status'] = 'failed'
+                reports[i].setdefault('error', str(e))
+                failed.add(relative_id(destination, space_root))
+            report_progress(done, len(futures), "copying files")
+
+    #one metadata write for all items, without the files that could not be copied
+    added = [entity for item_entities in entities for entity in item_entities if entity[0] not in failed]
+    metadata_location = os.path.join(space_root, 'ro-crate-metadata.json')
+    cache = CrateMetadataCache()
+    with cache.lock(metadata_location):
+        #changes go to a copy, the cached metadata is shared with readers
+        graph = CrateGraph(cache.read_copy(metadata_location))
+        added_ids, _ = apply_changes(graph, added, [])
+        if added_ids:
+            cache.write(metadata_location, graph.data, derived={'graph':graph})
+    log.debug(f"ingested {len(contents)} items in {space_root}, {len(added_ids)} new entities")
+
+    if repo is not None:
+        touched = [report['path'].rstrip('/') for report in reports if report.get('files')]
+        stage_paths(repo, ['ro-crate-metadata.json'] + touched)
+    return reports
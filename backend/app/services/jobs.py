@@ -0,0 +1,188 @@
+#background jobs here
+import os, json, time, threading, traceback
+import uuid as uuidmake
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from app.model.location import singleton
+from app.model.registry import Registries
+
+log=logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+DEFAULT_WORKERS = 4
+DEFAULT_RETENTION_HOURS = 24
+#live progress is written to the registry at most this often (seconds)
+PROGRESS_INTERVAL = 1.0
+
+#the job the current thread is working on, set while a job runs
+_current = threading.local()
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def _process_alive(pid):
+    """check if a process still runs, without signals on windows where they would kill it"""
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _jsonable(value):
+    """the value when it survives json, its string form otherwise"""
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return str(value)
+
+def report_progress(done=None, total=None, message=None):
+    """ lets a job report how far it got, does nothing outside of a job
+    :param done: Optional - number of steps done
+    :type  done: int
+    :param total: Optional - number of steps in total
+    :type  total: int
+    :param message: Optional - what the job is doing
+    :type  message: str
+    """
+    job = getattr(_current, 'job', None)
+    if job is not None:
+        queue, job_id = job
+        queue._progress(job_id, {'done':done, 'total':total, 'message':message})
+
+class JobQueue():
+    """ Runs long operations on a bounded pool of worker threads.
+        Every job has a record in a registry (jobs.json) with its state
+        (queued, running, succeeded, failed), timestamps, progress and the
+        result or error, so its status can be asked from any worker process.
+        Finished jobs are removed from the registry after DMBON_FAST_API_JOB_RETENTION_HOURS,
+        the pool size is set with DMBON_FAST_API_JOB_WORKERS.
+    """
+    def __init__(self, registry, max_workers=None):
+        """
+        :param registry: registry keeping the job records
+        :type registry: JsonRegistry or SqliteRegistry
+        :param max_workers: Optional - number of jobs that run at the same time
+        :type max_workers: int
+        """
+        if max_workers is None:
+            max_workers = int(os.environ.get("DMBON_FAST_API_JOB_WORKERS", DEFAULT_WORKERS))
+        self.registry = registry
+        self.max_workers = max_workers
+        self.retention = timedelta(hours=float(os.environ.get("DMBON_FAST_API_JOB_RETENTION_HOURS", DEFAULT_RETENTION_HOURS)))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dmbon-job')
+        self._lock = threading.Lock()
+        self._live = {}
+        try:
+            len(self.registry)
+        except FileNotFoundError:
+            self.registry.replace({})
+        self._fail_interrupted()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(registry={self.registry}, max_workers={self.max_workers})"
+
+    def _fail_interrupted(self):
+        """jobs of processes that are gone will never finish, mark them as failed"""
+        def _mark(data):
+            for job_id, record in data.items():
+                if record['state'] not in FINISHED_STATES and (record.get('pid') == os.getpid() or not _process_alive(record.get('pid', 0))):
+                    record.update(state=FAILED, finished=_now(), error="interrupted by a restart of the server")
+        self.registry.update(_mark)
+
+    def _prune(self, data):
+        """drop the finished jobs older than the retention time"""
+        oldest = (datetime.now(timezone.utc) - self.retention).isoformat(timespec='seconds')
+        for job_id in [job_id for job_id, record in data.items() if record['state'] in FINISHED_STATES and record['finished'] < oldest]:
+            del data[job_id]
+
+    def submit(self, kind, func, *args, params=None, **kwargs):
+        """ queue a job
+        :param kind: what the job does, e.g. "space.create"
+        :type  kind: str
+        :param func: callable doing the work, its return value is kept as the job result
+        :type  func: callable
+        :param params: Optional - json data describing the job, kept in its record
+        :type  params: dict
+        :return: the id of the job
+        :rtype: str
+        """
+        job_id = uuidmake.uuid4().hex
+        record = {'kind':kind, 'state':QUEUED, 'params':_jsonable(params), 'pid':os.getpid(),
+                  'created':_now(), 'started':None, 'finished':None,
+                  'progress':None, 'result':None, 'error':None}
+        def _add(data):
+            self._prune(data)
+            data[job_id] = record
+        self.registry.update(_add)
+        self._pool.submit(self._run, job_id, func, args, kwargs)
+        log.debug(f"queued job {job_id} ({kind})")
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        self.registry.patch(job_id, {'state':RUNNING, 'started':_now()})
+        _current.job = (self, job_id)
+        try:
+            result = func(*args, **kwargs)
+            changes = {'state':SUCCEEDED, 'result':_jsonable(result)}
+        except Exception as e:
+            log.error(f"job {job_id} failed")
+            log.exception(e)
+            #HTTPExceptions raised by shared route code keep their detail and status
+            error = {'message':str(e), 'type':type(e).__name__, 'trace':traceback.format_exc(limit=5)}
+            if hasattr(e, 'status_code'):
+                error.update(status_code=e.status_code, detail=_jsonable(getattr(e, 'detail', None)))
+            changes = {'state':FAILED, 'error':error}
+        finally:
+            _current.job = None
+        with self._lock:
+            live = self._live.pop(job_id, None)
+        if live is not None:
+            changes['progress'] = live['progress']
+        changes['finished'] = _now()
+        self.registry.patch(job_id, changes)
+
+    def _progress(self, job_id, progress):
+        now = time.monotonic()
+        with self._lock:
+            live = self._live.setdefault(job_id, {'progress':None, 'written':0.0})
+            live['progress'] = progress
+            if now - live['written'] < PROGRESS_INTERVAL:
+                return
+            live['written'] = now
+        self.registry.patch(job_id, {'progress':progress})
+
+    def get(self, job_id):
+        """ the record of a job, with the latest progress when it runs in this process
+        :raises KeyError: no job with this id
+        :rtype: dict
+        """
+        record = self.registry[job_id]
+        with self._lock:
+            live = self._live.get(job_id)
+            if live is not None:
+                record['progress'] = live['progress']
+        record['id'] = job_id
+        return record
+
+    def metrics(self):
+        """number of jobs per state in the registry"""
+        counts = {QUEUED:0, RUNNING:0, SUCCEEDED:0, FAILED:0}
+        for job_id, record in self.registry.items():
+            counts[record['state']] = counts.get(record['state'], 0) + 1
+        return {'max_workers':self.max_workers, 'jobs':counts}
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+@singleton
+class Jobs(JobQueue):
+    """the job queue of the api, its records are kept in jobs.json next to the other registries"""
+    def __init__(self):
+        super().__init__(Registries().get('jobs.json'))
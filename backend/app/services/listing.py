@@ -0,0 +1,162 @@
+#space content listing here
+import os, threading
+from collections import OrderedDict
+import logging
+from app.model.location import singleton
+
+log=logging.getLogger(__name__)
+
+#folders that are never listed or descended into
+SKIP_DIRS = {'.git'}
+DEFAULT_CACHE_FOLDERS = 10000
+
+def list_folder(folder):
+    """ lists one folder with os.scandir the way os.walk splits it, leaving out .git
+        Symlinks to folders are neither listed nor descended into, like os.walk does by default.
+    :return: the sorted file names and the sorted names of the folders to descend into
+    :rtype: tuple
+    """
+    files, dirs = [], []
+    with os.scandir(folder) as listing:
+        for entry in listing:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(entry.name)
+            elif entry.name not in SKIP_DIRS and not entry.is_symlink():
+                dirs.append(entry.name)
+    return tuple(sorted(files)), tuple(sorted(dirs))
+
+class DirectoryCache():
+    """ LRU cache of folder listings of one space.
+        An entry is reused while the (mtime_ns, inode) of the folder still match,
+        adding, removing or renaming anything in a folder changes its mtime.
+        Capped on the number of folders, set with the env var DMBON_FAST_API_LISTING_CACHE_FOLDERS.
+    """
+    def __init__(self, max_folders=None):
+        """
+        :param max_folders: Optional - max number of cached folder listings
+        :type max_folders: int
+        """
+        if max_folders is None:
+            max_folders = int(os.environ.get("DMBON_FAST_API_LISTING_CACHE_FOLDERS", DEFAULT_CACHE_FOLDERS))
+        self.max_folders = max_folders
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(folders={len(self._entries)}, max_folders={self.max_folders})"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def list(self, folder):
+        """ the files and folders in a folder, see list_folder
+        :param folder: absolute path of the folder
+        :type  folder: Path
+        :raises OSError: the folder can not be listed
+        :rtype: tuple
+        """
+        #stat before listing, a change during the listing then gives another stamp next time
+        st = os.stat(folder)
+        stamp = (st.st_mtime_ns, st.st_ino)
+        with self._lock:
+            entry = self._entries.get(folder)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(folder)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        listed = list_folder(folder)
+        with self._lock:
+            self._entries[folder] = (stamp, listed)
+            self._entries.move_to_end(folder)
+            while len(self._entries) > self.max_folders:
+                self._entries.popitem(last=False)
+        return listed
+
+    def metrics(self):
+        """counters of the cache usage"""
+        with self._lock:
+            return {'folders':len(self._entries), 'max_folders':self.max_folders, 'hits':self.hits, 'misses':self.misses}
+
+@singleton
+class ListingCaches():
+    """the directory caches of all spaces, keyed by space_id"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spaces = {}
+
+    def for_space(self, space_id):
+        """the directory cache of a space, made on first use"""
+        with self._lock:
+            cache = self._spaces.get(space_id)
+            if cache is None:
+                cache = self._spaces[space_id] = DirectoryCache()
+            return cache
+
+    def drop(self, space_id):
+        """forget the cached listings of a space, e.g. when it is deleted"""
+        with self._lock:
+            self._spaces.pop(space_id, None)
+
+    def metrics(self):
+        """counters of the caches of all spaces"""
+        with self._lock:
+            caches = dict(self._spaces)
+        return {space_id:cache.metrics() for space_id, cache in caches.items()}
+
+def walk_files(root, max_depth=None, after=None, cache=None):
+    """ walks the files below a folder in a fixed order: the files of a folder (sorted)
+        and then its subfolders (sorted) one after the other, .git is never entered.
+    :param root: absolute path of the folder to list
+    :type  root: Path
+    :param max_depth: Optional - how many levels of subfolders to descend into, 0 only lists root itself
+    :type  max_depth: int
+    :param after: Optional - cursor, relative path (with /) of the file after which the walk continues
+    :type  after: str
+    :param cache: Optional - directory cache to take the folder listings from
+    :type  cache: DirectoryCache
+    :return: generator of (relative path of the file, absolute path of its folder, file name)
+    """
+    list_dir = cache.list if cache is not None else list_folder
+    #(relative folder, depth, remaining parts of the cursor within this folder)
+    stack = [("", 0, after.strip('/').split('/') if after else [])]
+    while stack:
+        relative_folder, depth, cursor = stack.pop()
+        folder = os.path.join(root, *relative_folder.rstrip('/').split('/')) if relative_folder else root
+        try:
+            files, dirs = list_dir(folder)
+        except OSError as e:
+            #gone or unreadable, os.walk skips these as well
+            log.debug(f"could not list {folder}: {e}")
+            continue
+        if len(cursor) == 1:
+            #the cursor is a file of this folder, continue after it
+            files = [name for name in files if name > cursor[0]]
+        elif cursor:
+            #the cursor is inside a subfolder, all files here were already returned
+            files = []
+        for name in files:
+            yield relative_folder + name, folder, name
+        if max_depth is not None and depth >= max_depth:
+            continue
+        if len(cursor) > 1:
+            subfolders = [(relative_folder + name + '/', depth + 1, []) for name in dirs if name > cursor[0]]
+            if cursor[0] in dirs:
+                subfolders.insert(0, (relative_folder + cursor[0] + '/', depth + 1, cursor[1:]))
+        else:
+            subfolders = [(relative_folder + name + '/', depth + 1, []) for name in dirs]
+        stack.extend(reversed(subfolders))
+
+def space_content(space_id, space_folder, max_depth=None, after=None):
+    """ the files of a space as {"file","folder"} entries, using the directory cache of the space
+    :return: generator of (cursor, entry), the cursor of an entry continues the listing after it
+    """
+    cache = ListingCaches().for_space(space_id)
+    for relative_path, folder, name in walk_files(space_folder, max_depth=max_depth, after=after, cache=cache):
+        yield relative_path, {"file":name, "folder":folder}
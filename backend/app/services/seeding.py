@@ -0,0 +1,94 @@
+#seed crate materialisation here
+import os, shutil
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from app.services.ingest import ingest_workers
+
+log=logging.getLogger(__name__)
+
+#ioctl that shares the extents of a file (reflink), on btrfs, xfs and other cow filesystems
+FICLONE = 0x40049409
+COPY_CHUNK = 1 << 30
+
+def _reflink(source_fd, destination_fd):
+    import fcntl
+    fcntl.ioctl(destination_fd, FICLONE, source_fd)
+
+def _copy_range(source_fd, destination_fd):
+    while os.copy_file_range(source_fd, destination_fd, COPY_CHUNK) > 0:
+        pass
+
+def clone_file(source, destination):
+    """ copy the content of a file the cheapest way the filesystem offers:
+        a reflink, an in-kernel copy_file_range or else a plain copy.
+        Hardlinks are not used, edits in the space would change the seed crate clone.
+    :return: how the file was copied: reflink, copy_file_range or copy
+    :rtype: str
+    """
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        for method, copy in (('reflink', _reflink if os.name == 'posix' else None),
+                             ('copy_file_range', _copy_range if hasattr(os, 'copy_file_range') else None)):
+            if copy is None:
+                continue
+            try:
+                copy(src.fileno(), dst.fileno())
+                return method
+            except OSError:
+                #not supported by this filesystem or across these devices, start over with the next one
+                dst.seek(0)
+                dst.truncate()
+    shutil.copyfile(source, destination)
+    return 'copy'
+
+def plan_seed(repo_location, is_constraint):
+    """ the files of a seed crate clone, without its git files
+    :param repo_location: folder of the seed crate clone
+    :type  repo_location: Path
+    :param is_constraint: tells if a file holds constraints for the workspace instead of data for the space
+    :type  is_constraint: callable
+    :return: (relative path, source) of the files to copy and the constraint files, both in walk order
+    :rtype: tuple
+    """
+    copies, constraints = [], []
+    for dirpath, dirnames, filenames in os.walk(repo_location):
+        #.git and the .git* files (.github, .gitignore, ...) are not part of the seed
+        dirnames[:] = sorted(name for name in dirnames if ".git" not in name)
+        for name in sorted(filenames):
+            if ".git" in name:
+                continue
+            source = os.path.join(dirpath, name)
+            if is_constraint(source):
+                constraints.append(source)
+            else:
+                copies.append((os.path.relpath(source, repo_location), source))
+    return copies, constraints
+
+def materialise_seeds(repo_locations, storage_path, is_constraint, max_workers=None):
+    """ copy the files of several seed crate clones into a space, the repos are walked
+        and the files copied on a thread pool. A file in more than one seed comes from
+        the last seed in repo_locations.
+    :param repo_locations: folders of the seed crate clones, in the order of the profile
+    :type  repo_locations: list
+    :param storage_path: folder of the space
+    :type  storage_path: Path
+    :param is_constraint: tells if a file holds constraints instead of data, those are not copied
+    :type  is_constraint: callable
+    :param max_workers: Optional - size of the thread pool, DMBON_FAST_API_INGEST_WORKERS by default
+    :type  max_workers: int
+    :return: the constraint files of all seeds, in repo and walk order
+    :rtype: list
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or ingest_workers(), thread_name_prefix='dmbon-seed') as pool:
+        plans = list(pool.map(lambda location: plan_seed(location, is_constraint), repo_locations))
+        targets = {}
+        constraints = []
+        for copies, repo_constraints in plans:
+            for relative_path, source in copies:
+                targets[os.path.join(storage_path, relative_path)] = source
+            constraints.extend(repo_constraints)
+        for folder in sorted({os.path.dirname(destination) for destination in targets}):
+            os.makedirs(folder, exist_ok=True)
+        methods = list(pool.map(lambda item: clone_file(item[1], item[0]), targets.items()))
+    log.debug(f"copied {len(methods)} seed files into {storage_path}: " +
+              ", ".join(f"{methods.count(method)} by {method}" for method in sorted(set(methods))))
+    return constraints
@@ -0,0 +1,79 @@
+#space service here
+#in-process replacements for the api calls the routes used to make to their own server
+import os, git
+import logging
+from fastapi import HTTPException
+from app.model.space import Space
+from app.model.profile import Profile
+from app.model.location import Locations
+from app.services.fixcrate import complete_metadata_crate
+from app.services.validation import Validations, crate_base
+
+log=logging.getLogger(__name__)
+
+def profile_exists(profile_id):
+    """check if a profile with the given uuid is registered"""
+    return Profile.exists(str(profile_id))
+
+def storage_path_in_use(storage_path):
+    """check if the storage path, one of its parent folders or a folder inside it is used by a space
+    :param storage_path: path to check against the storage_path of all spaces
+    :type  storage_path: str
+    :return: the uuid of the space using the path or None
+    :rtype: str
+    """
+    return Space.registry().path_conflict(storage_path)
+
+def check_path_availability(tocheckpath, space_name):
+    """check if a space with the given name can be made in the given storage path
+    :raises HTTPException: 400 when the path does not exist or overlaps with another space
+    """
+    if os.path.isdir(os.path.join(tocheckpath)) == False:
+        raise HTTPException(status_code=400, detail="Given storage path does not exist on local storage")
+    #check if given path is already used by another project
+    used_by = storage_path_in_use(os.path.join(tocheckpath, str(space_name)))
+    if used_by is not None:
+        log.debug(f"Storage path {tocheckpath} overlaps with space {used_by}")
+        raise HTTPException(status_code=400, detail="Given storage path is already in use by another project")
+    if len(os.listdir(os.path.join(tocheckpath)) ) != 0:
+        return tocheckpath
+
+def stage_all(repo):
+    """git add everything in the repo of a space"""
+    repo.git.add(all=True)
+
+def fix_space_crate(space_id, dry_run=False, full=False):
+    """complete the ro-crate-metadata.json of a space with all files in its storage path,
+    only the files added or removed since the last run are processed unless full is set
+    :param dry_run: Optional - only report the changes, do not write or stage anything
+    :type  dry_run: bool
+    :param full: Optional - rebuild the whole crate from its storage path
+    :type  full: bool
+    :raises KeyError: the supplied space_id was not found in the spaces registry
+    :return: the completed metadata and the changes made to it
+    :rtype: tuple
+    """
+    space_folder = Space.read_info(space_id)['storage_path']
+    repo = git.Repo(space_folder)
+    #the manifest of the last run is kept in the workspace, not in the crate itself
+    manifest_path = os.path.join(Locations().get_workspace_location_by_uuid(space_uuid=space_id), 'fixcrate-manifest.json')
+    data, changes = complete_metadata_crate(source_path_crate=space_folder, dry_run=dry_run, manifest_path=manifest_path, full=full)
+    if not dry_run:
+        stage_all(repo)
+    return data, changes
+
+def validate_space(space_id, full=False):
+    """validate the ro-crate-metadata.json of a space against the all_constraints.ttl of its workspace,
+    only the entities changed since the last validation are revalidated unless full is set
+    :param full: Optional - validate the whole crate
+    :type  full: bool
+    :raises KeyError: the supplied space_id was not found in the spaces registry
+    :return: conforms, mode, number of revalidated entities and the validation results
+    :rtype: dict
+    """
+    space_object = Space.load(uuid=space_id)
+    path_shacl = os.path.join(Locations().get_workspace_location_by_uuid(space_uuid=space_id), "all_constraints.ttl")
+    metadata = space_object._read_metadata_datacrate()
+    base = crate_base(space_object.storage_path)
+    return Validations().validate(space_id, metadata, path_shacl, base, full=full,
+                                  rdf=lambda: space_object._crate_rdf(base))
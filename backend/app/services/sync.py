@@ -0,0 +1,184 @@
+#repo sync scheduler here
+import os, time, threading
+from datetime import datetime, timezone
+import git
+import logging
+from app.model.location import Locations, singleton, normalise_repo_url
+from app.model.registry import Registries
+from app.model.rocrategit import GitRepoCache
+
+log=logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 900
+
+def _head_commit(location):
+    try:
+        return git.Repo(location).head.commit.hexsha
+    except Exception:
+        return None
+
+def known_repos():
+    """(repo_url, location) of the profile repos and their seed crates in the profiles registry"""
+    repo_urls = []
+    for uuid, info in Registries().profiles().items():
+        for repo_url in [info.get('repo_url')] + list(info.get('seed_dependencies') or []):
+            if repo_url and repo_url not in repo_urls:
+                repo_urls.append(repo_url)
+    return [(repo_url, Locations().get_repo_location_by_url(repo_url)) for repo_url in repo_urls]
+
+class RepoSync():
+    """ Keeps the local clones of the profile and seed crate repos up to date
+        without fetching on every use. Per repo (by normalised url) the commit and
+        time of the last fetch are kept in a registry (sync.json), a fetch within
+        DMBON_FAST_API_SYNC_TTL_SECONDS of the previous one is skipped unless forced.
+        refresh() runs the fetch in a background job, start() refreshes all stale
+        repos on a timer thread every ttl.
+    """
+    def __init__(self, registry, jobs=None, ttl=None):
+        """
+        :param registry: registry keeping the sync records
+        :type registry: JsonRegistry or SqliteRegistry
+        :param jobs: Optional - job queue for the background refreshes, the api queue by default
+        :type jobs: JobQueue
+        :param ttl: Optional - seconds a fetch stays fresh
+        :type ttl: float
+        """
+        if ttl is None:
+            ttl = float(os.environ.get("DMBON_FAST_API_SYNC_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+        self.registry = registry
+        self.ttl = ttl
+        self._jobs = jobs
+        self._lock = threading.Lock()
+        self._repo_locks = {}
+        self._pending = {}
+        self._timer = None
+        self._stopped = threading.Event()
+        self.skipped = 0
+        self.fetched = 0
+        try:
+            len(self.registry)
+        except FileNotFoundError:
+            self.registry.replace({})
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(registry={self.registry}, ttl={self.ttl})"
+
+    def jobs(self):
+        if self._jobs is None:
+            from app.services.jobs import Jobs
+            self._jobs = Jobs()
+        return self._jobs
+
+    def _repo_lock(self, key):
+        with self._lock:
+            return self._repo_locks.setdefault(key, threading.Lock())
+
+    def last(self, repo_url):
+        """the sync record of a repo, None when it was never fetched"""
+        return self.registry.get(normalise_repo_url(repo_url))
+
+    def is_fresh(self, repo_url, location=None):
+        record = self.last(repo_url)
+        if record is None or (location is not None and not os.path.isdir(location)):
+            return False
+        return time.time() - record['fetched_at'] < self.ttl
+
+    def sync(self, repo_url, location, force=False):
+        """ clone or pull a repo unless it was fetched within the ttl
+        :param repo_url: url of the repo
+        :type  repo_url: str
+        :param location: local clone of the repo
+        :type  location: Path
+        :param force: Optional - fetch even when the last fetch is still fresh
+        :type  force: bool
+        :return: the sync record with 'skipped' telling if the fetch was left out
+        :rtype: dict
+        """
+        key = normalise_repo_url(repo_url)
+        with self._repo_lock(key):
+            #a fetch that ran while waiting on the lock counts as fresh
+            if not force and self.is_fresh(repo_url, location):
+                self.skipped += 1
+                return dict(self.registry[key], skipped=True)
+            previous = _head_commit(location) if os.path.isdir(location) else None
+            error = None
+            try:
+                if previous is None:
+                    GitRepoCache.clone_content(location, repo_url)
+                else:
+                    error = GitRepoCache.update_content(location)
+            except Exception as e:
+                error = e
+            if error is not None:
+                log.warning(f"syncing {repo_url} into {location} failed: {error}")
+            record = self.record(repo_url, location, error=error)
+        return dict(record, skipped=False, changed=previous != record['commit'])
+
+    def record(self, repo_url, location, error=None):
+        """ keep the commit and time of a fetch of a repo, also for clones made outside of sync()
+        :param error: Optional - error of a failed fetch, it is retried after the ttl
+        :type  error: Exception
+        :rtype: dict
+        """
+        self.fetched += 1
+        now = time.time()
+        record = {'repo_url':repo_url, 'location':str(location), 'commit':_head_commit(location),
+                  'fetched':datetime.fromtimestamp(now, timezone.utc).isoformat(timespec='seconds'),
+                  'fetched_at':now, 'error':None if error is None else str(error)}
+        self.registry.set(normalise_repo_url(repo_url), record)
+        return record
+
+    def refresh(self, repo_url, location, force=False):
+        """ sync a repo in a background job, a refresh that is already queued for it is reused
+        :return: the id of the job
+        :rtype: str
+        """
+        key = normalise_repo_url(repo_url)
+        with self._lock:
+            job_id = self._pending.get(key)
+            if job_id is not None:
+                return job_id
+            def _sync():
+                try:
+                    return self.sync(repo_url, location, force=force)
+                finally:
+                    with self._lock:
+                        self._pending.pop(key, None)
+            job_id = self.jobs().submit("repo.sync", _sync, params={'repo_url':repo_url, 'force':force})
+            self._pending[key] = job_id
+            return job_id
+
+    def refresh_stale(self, repos):
+        """ background refreshes of the repos whose last fetch is older than the ttl
+        :param repos: (repo_url, location) tuples
+        :type  repos: list
+        :return: the ids of the started jobs
+        :rtype: list
+        """
+        return [self.refresh(repo_url, location) for repo_url, location in repos if not self.is_fresh(repo_url, location)]
+
+    def start(self, repos_func=known_repos, interval=None):
+        """refresh the stale repos given by repos_func every interval (the ttl by default) on a daemon thread"""
+        interval = interval or self.ttl
+        self._stopped.clear()
+        def _loop():
+            while not self._stopped.wait(interval):
+                try:
+                    self.refresh_stale(repos_func())
+                except Exception as e:
+                    log.error("refreshing the repos failed")
+                    log.exception(e)
+        self._timer = threading.Thread(target=_loop, name='dmbon-sync', daemon=True)
+        self._timer.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def metrics(self):
+        return {'ttl_s':self.ttl, 'repos':len(self.registry), 'fetched':self.fetched, 'skipped':self.skipped, 'pending':len(self._pending)}
+
+@singleton
+class RepoSyncs(RepoSync):
+    """the repo sync scheduler of the api, its records are kept in sync.json next to the other registries"""
+    def __init__(self):
+        super().__init__(Registries().get('sync.json'))
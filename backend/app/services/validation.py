@@ -0,0 +1,228 @@
+#shacl validation of crates here
+import os, json, threading, time, pathlib
+from rdflib import Graph, BNode, URIRef
+from pyshacl import Validator
+from pyshacl.shapes_graph import ShapesGraph
+from pyshacl.graph_abstraction import DataGraph
+from pyshacl.consts import SH
+import logging
+from app.model.location import singleton
+from app.model.constraints import source_stamp
+from app.services.constraintbundle import load_bundle_graph, shape_triples
+from app.services.craterdf import metadata_to_graph
+
+log=logging.getLogger(__name__)
+
+FULL, INCREMENTAL, CACHED = "full", "incremental", "cached"
+
+def crate_to_rdf(metadata, base):
+    """ the rdf graph of the json-ld of a crate, the ro-crate context is resolved locally
+    :param metadata: the ro-crate-metadata.json content
+    :type  metadata: dict
+    :param base: iri the relative @ids of the crate are resolved against
+    :type  base: str
+    :rtype: rdflib.Graph
+    """
+    return metadata_to_graph(metadata, base)
+
+def crate_base(storage_path):
+    """the base iri of the entities of a crate: the file uri of its folder"""
+    return pathlib.Path(os.path.abspath(storage_path)).as_uri().rstrip('/') + '/'
+
+def entity_snapshots(metadata):
+    """@id -> json of its entities, compared to find what changed between two validations"""
+    snapshots = {}
+    for entity in metadata.get('@graph', []):
+        snapshots.setdefault(entity.get('@id'), []).append(json.dumps(entity, sort_keys=True))
+    return snapshots
+
+class CrateValidation():
+    """ what the last validation of a crate left: its data graph, the json of every
+        entity it was made from and the results per entity
+    """
+    __slots__ = ('shapes_stamp', 'base', 'context', 'graph', 'snapshots', 'results')
+
+    def __init__(self, shapes_stamp, base, context, graph, snapshots, results):
+        self.shapes_stamp = shapes_stamp
+        self.base = base
+        self.context = context
+        self.graph = graph
+        self.snapshots = snapshots
+        self.results = results
+
+class ValidationCache():
+    """ Validates crates against their shacl constraints with pyshacl.
+        The shapes graph of a constraints file is parsed once and reused while the file
+        keeps its (mtime_ns, size). Per crate the last data graph and results are kept,
+        a next validation only reruns pyshacl for the entities whose json changed since,
+        and the entities pointing to them, after patching those into the data graph.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._shapes = {}
+        self._crates = {}
+        self.runs = {FULL:0, INCREMENTAL:0, CACHED:0}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(shapes={len(self._shapes)}, crates={len(self._crates)})"
+
+    def _crate_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def shapes(self, path_shacl):
+        """ the parsed pyshacl shapes graph of a constraints file
+        :return: the stamp of the file and the shapes graph
+        :rtype: tuple
+        """
+        stamp = source_stamp(path_shacl)
+        with self._lock:
+            cached = self._shapes.get(path_shacl)
+            if cached is not None and cached[0] == stamp:
+                return cached
+        log.info(f"parsing shapes graph of {path_shacl}")
+        shapes_graph = ShapesGraph(load_bundle_graph(path_shacl))
+        #the shapes are parsed out of the graph on first use, do it here instead of in a request
+        shapes_graph.shapes
+        with self._lock:
+            self._shapes[path_shacl] = (stamp, shapes_graph)
+        return stamp, shapes_graph
+
+    @staticmethod
+    def _run(data_graph, shapes_graph, focus_nodes=None):
+        """pyshacl on the data graph, with the cached shapes graph instead of one parsed for this call"""
+        options = {'inplace':True, 'focus_nodes':list(focus_nodes) if focus_nodes is not None else None}
+        validator = Validator(DataGraph.from_rdflib(data_graph), shacl_graph=shapes_graph.graph, options=options)
+        validator.shacl_graph = shapes_graph
+        conforms, report_graph, report_text = validator.run()
+        return report_graph
+
+    @staticmethod
+    def _owner(graph, node):
+        """the entity a (blank) node belongs to, following the triples pointing to it"""
+        seen = set()
+        while isinstance(node, BNode) and node not in seen:
+            seen.add(node)
+            parent = next(graph.subjects(None, node), None)
+            if parent is None:
+                break
+            node = parent
+        return node
+
+    @staticmethod
+    def _entity_id(node, base):
+        node = str(node)
+        if node.startswith(base):
+            node = node[len(base):]
+            return node if node else './'
+        return node
+
+    def _results(self, report_graph, data_graph, base):
+        """the results of a validation report by the @id of the entity they are about"""
+        by_entity = {}
+        for result in report_graph.objects(None, SH.result):
+            def value(predicate):
+                found = report_graph.value(result, predicate)
+                return None if found is None or isinstance(found, BNode) else str(found)
+            focus = report_graph.value(result, SH.focusNode)
+            entity_id = self._entity_id(self._owner(data_graph, focus), base)
+            by_entity.setdefault(entity_id, []).append({
+                'focus_node':entity_id,
+                'path':value(SH.resultPath),
+                'severity':value(SH.resultSeverity),
+                'message':value(SH.resultMessage),
+                'constraint':value(SH.sourceConstraintComponent),
+                'shape':value(SH.sourceShape),
+                'value':value(SH.value)})
+        return by_entity
+
+    def validate(self, key, metadata, path_shacl, base, full=False, rdf=None):
+        """ validate a crate, incrementally when only some of its entities changed since the last call
+        :param key: identifies the crate, e.g. the space id
+        :type  key: str
+        :param metadata: the ro-crate-metadata.json content
+        :type  metadata: dict
+        :param path_shacl: the constraints of the crate, i.e. all_constraints.ttl of the workspace
+        :type  path_shacl: Path
+        :param base: iri the relative @ids of the crate are resolved against
+        :type  base: str
+        :param full: Optional - validate the whole crate even when an incremental run would do
+        :type  full: bool
+        :param rdf: Optional - called for the rdf graph of metadata when the whole crate is validated, e.g. from the CrateRdfCache
+        :type  rdf: callable
+        :return: conforms, mode (full, incremental or cached), number of entities revalidated and the results
+        :rtype: dict
+        """
+        with self._crate_lock(key):
+            shapes_stamp, shapes_graph = self.shapes(path_shacl)
+            snapshots = entity_snapshots(metadata)
+            context = metadata.get('@context')
+            state = self._crates.get(key)
+            started = time.monotonic()
+            if not (full or state is None or state.shapes_stamp != shapes_stamp or state.base != base or state.context != context):
+                changed = [entity_id for entity_id in state.snapshots.keys() | snapshots.keys()
+                           if state.snapshots.get(entity_id) != snapshots.get(entity_id)]
+                #entities without an @id can not be patched into the data graph
+                full = None in changed
+            if full or state is None or state.shapes_stamp != shapes_stamp or state.base != base or state.context != context:
+                mode = FULL
+                graph = rdf() if rdf is not None else crate_to_rdf(metadata, base)
+                results = self._results(self._run(graph, shapes_graph), graph, base)
+                revalidated = len(snapshots)
+                state = CrateValidation(shapes_stamp, base, context, graph, snapshots, results)
+                self._crates[key] = state
+            else:
+                mode = INCREMENTAL if changed else CACHED
+                revalidated = 0
+                if changed:
+                    graph = state.graph
+                    nodes = [URIRef(entity_id, base=base) for entity_id in changed]
+                    for node in nodes:
+                        for triple in shape_triples(graph, node):
+                            graph.remove(triple)
+                    changed_ids = set(changed)
+                    changed_entities = [entity for entity in metadata.get('@graph', []) if entity.get('@id') in changed_ids]
+                    graph += crate_to_rdf({'@context':context, '@graph':changed_entities}, base)
+                    #the entities pointing to a changed one can (no longer) conform because of it
+                    focus = set(nodes)
+                    for node in nodes:
+                        focus.update(self._owner(graph, subject) for subject in graph.subjects(None, node))
+                    focus = [node for node in focus if isinstance(node, URIRef)]
+                    if len(focus) * 2 > len(snapshots):
+                        #pyshacl goes over focus nodes one by one, for most of the crate all of it is faster
+                        state.results = self._results(self._run(graph, shapes_graph), graph, base)
+                        revalidated = len(snapshots)
+                    else:
+                        results = self._results(self._run(graph, shapes_graph, focus_nodes=focus), graph, base)
+                        for node in focus:
+                            entity_id = self._entity_id(node, base)
+                            state.results.pop(entity_id, None)
+                            if entity_id in results:
+                                state.results[entity_id] = results[entity_id]
+                        for entity_id in changed:
+                            if entity_id not in snapshots:
+                                state.results.pop(entity_id, None)
+                        revalidated = len(focus)
+                    state.snapshots = snapshots
+            self.runs[mode] += 1
+            all_results = [result for entity_id in sorted(state.results) for result in state.results[entity_id]]
+            log.debug(f"{mode} validation of {key}: {revalidated} entities in {time.monotonic() - started:.3f}s")
+            #as pyshacl does by default, a crate with any result, warnings and infos too, does not conform
+            return {'conforms':not all_results,
+                    'mode':mode,
+                    'revalidated':revalidated,
+                    'results':all_results}
+
+    def drop(self, key):
+        with self._lock:
+            self._crates.pop(key, None)
+
+    def metrics(self):
+        return {'shapes_graphs':len(self._shapes), 'crates':len(self._crates), 'runs':dict(self.runs)}
+
+@singleton
+class Validations(ValidationCache):
+    """the validation cache of the api process"""
+    def __init__(self):
+        super().__init__()
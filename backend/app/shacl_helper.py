@@ -11,9 +11,11 @@ from pyshacl.rdfutil import (
     order_graph_literal,
 )
 import rdflib
-import os, sys
+import os, sys, mmap, pathlib
+import rdflib.util
+from rdflib.parser import InputSource
 from rdflib.namespace import RDF
-from rdflib import Graph, BNode, Namespace, URIRef
+from rdflib import Graph, BNode, Literal, Namespace, URIRef
 from pprint import pprint
 from SPARQLWrapper import SPARQLWrapper, JSON
 from pyshacl.consts import (
@@ -40,19 +42,58 @@ from pyshacl.consts import (
 SH_mincount = SH.minCount
 SH_maxcount = SH.maxCount
 SH_in = SH.term("in")
+RDF_first = RDF.first
+RDF_rest = RDF.rest
 
-class ShapesInfoGraph():
-    def __init__(self,rdf_graph_file_path):
-        shapes_file_raw = open(rdf_graph_file_path,'r') 
-        shapes_file = shapes_file_raw.read().replace('\n', '')
+#shape files from this size (MB) on are parsed from a memory map instead of read into memory, 0 turns it off
+DEFAULT_MMAP_MB = 64
+
+def load_graph(rdf_graph_file_path, rdf_format=None):
+    """ parse an rdf file by path into a single graph
+    :param rdf_graph_file_path: path of the file
+    :type rdf_graph_file_path: Path
+    :param rdf_format: Optional - rdflib format, guessed from the file extension by default (turtle when unknown)
+    :type rdf_format: str
+    :rtype: rdflib.Graph
+    """
+    rdf_format = rdf_format or rdflib.util.guess_format(str(rdf_graph_file_path)) or "turtle"
+    graph = Graph()
+    mmap_bytes = float(os.environ.get("DMBON_FAST_API_SHAPES_MMAP_MB", DEFAULT_MMAP_MB)) * 1024 * 1024
+    with open(rdf_graph_file_path, 'rb') as shapes_file:
+        size = os.fstat(shapes_file.fileno()).st_size
+        if mmap_bytes and size >= mmap_bytes:
+            #the pages are mapped from the file, not copied into a python string
+            with mmap.mmap(shapes_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                source = InputSource(pathlib.Path(rdf_graph_file_path).absolute().as_uri())
+                source.setByteStream(mapped)
+                graph.parse(source=source, format=rdf_format)
+        else:
+            graph.parse(file=shapes_file, format=rdf_format)
+    return graph
 
-        rdf_graph = load_from_source(
-                    shapes_file, rdf_format="turtle", multigraph=True, do_owl_imports=False
-                )
-        assert isinstance(rdf_graph, (rdflib.Dataset, rdflib.ConjunctiveGraph, rdflib.Graph))
-        self.sg = rdf_graph
-        if isinstance(self.sg, (rdflib.Dataset, rdflib.ConjunctiveGraph)):
-            self.sg = next(iter(self.sg.contexts()))
+class ShapesInfoGraph():
+    def __init__(self,rdf_graph_file_path, graph=None):
+        if graph is None:
+            graph = load_graph(rdf_graph_file_path)
+        #already parsed graphs come e.g. from the n-triples form of a constraint bundle
+        self.sg = graph
+        self._index = {}
+        self._literals = {}
+    
+    def predicates_of(self, subject):
+        """ predicate -> objects of a subject, read with a single lookup in the graph and kept,
+            instead of a triple pattern query per predicate
+        """
+        predicates = self._index.get(subject)
+        if predicates is None:
+            predicates = {}
+            for predicate, obj in self.sg.predicate_objects(subject):
+                predicates.setdefault(predicate, []).append(obj)
+            self._index[subject] = predicates
+        return predicates
+    
+    def objects_of(self, subject, predicate):
+        return self.predicates_of(subject).get(predicate, ())
     
     @property
     def node_shapes(self):
@@ -68,43 +109,49 @@ class ShapesInfoGraph():
         else:
              return leset
     
-    def reciproce_nodechecking(self,blindnode, categoricals):
-        categoricals = categoricals
-        if isinstance(blindnode, (rdflib.term.BNode)):
-            blindnode_values = ShapesInfoGraph.object_values(self.sg.objects(blindnode))
-            for values in blindnode_values:
-                self.reciproce_nodechecking(values, categoricals)
-        else:
-            categoricals.append(blindnode)
-        return categoricals
+    def collection_literals(self, node):
+        """ the literals reachable from a node through blank nodes, i.e. the items of an rdf list as used by sh:in,
+            in list order. Walked without recursion, blank nodes seen before are skipped so cycles end,
+            the result per node is kept as lists are often shared between shapes.
+        """
+        if node in self._literals:
+            return self._literals[node]
+        literals = []
+        seen = set()
+        todo = [node]
+        while todo:
+            current = todo.pop()
+            if isinstance(current, Literal):
+                literals.append(current)
+                continue
+            if not isinstance(current, BNode) or current in seen:
+                continue
+            seen.add(current)
+            predicates = self.predicates_of(current)
+            #the stack is popped from the end: the rest of the list goes in first, the rdf:first item last
+            todo.extend(predicates.get(RDF_rest, ()))
+            if len(predicates) > (RDF_first in predicates) + (RDF_rest in predicates):
+                todo.extend(reversed([obj for predicate, objs in predicates.items() if predicate not in (RDF_first, RDF_rest) for obj in objs]))
+            todo.extend(reversed(predicates.get(RDF_first, ())))
+        self._literals[node] = literals
+        return literals
     
-    def get_categories(self,categories, tochecknodes):
-        toreturncategories = []
-        for i in tochecknodes:
-            categories.append(self.reciproce_nodechecking(i, categories)) 
-        for x in categories:
-            if isinstance(x, (rdflib.term.Literal)):
-                toreturncategories.append(x)
-        return toreturncategories
-
     def target_for_shape(self,nodeshape):
-        target = ShapesInfoGraph.object_values(self.sg.objects(nodeshape,SH_targetClass))
+        target = ShapesInfoGraph.object_values(self.objects_of(nodeshape,SH_targetClass))
         return target
     
     def properties_for_shape(self,nodeshape):
-        prop_nodes = self.sg.objects(nodeshape,SH_property)
         props_dict = {}
-        for prop_node in prop_nodes:
+        for prop_node in self.objects_of(nodeshape,SH_property):
+            prop = self.predicates_of(prop_node)
+            path = ShapesInfoGraph.object_values(prop.get(SH_path, ()))
+            datatype = ShapesInfoGraph.object_values(prop.get(SH_datatype, ()))
+            mincount = ShapesInfoGraph.object_values(prop.get(SH_mincount, ()))
+            maxcount = ShapesInfoGraph.object_values(prop.get(SH_maxcount, ()))
+            node     = ShapesInfoGraph.object_values(prop.get(SH_node, ()))
             categoricals = []
-            path = ShapesInfoGraph.object_values(self.sg.objects(prop_node,SH_path))
-            datatype = ShapesInfoGraph.object_values(self.sg.objects(prop_node,SH_datatype))
-            mincount = ShapesInfoGraph.object_values(self.sg.objects(prop_node,SH_mincount))
-            maxcount = ShapesInfoGraph.object_values(self.sg.objects(prop_node,SH_maxcount))
-            node     = ShapesInfoGraph.object_values(self.sg.objects(prop_node,SH_node))
-            values   = ShapesInfoGraph.object_values(self.sg.objects(prop_node,SH_in))    
-            if values is not None: 
-                new_vals = ShapesInfoGraph.object_values(self.sg.objects(values)) 
-                categoricals =  self.get_categories(categories=categoricals, tochecknodes=new_vals) 
+            for values in prop.get(SH_in, ()):
+                categoricals.extend(self.collection_literals(values))
             props_dict[path] = {"type":datatype,"min":mincount,"max":maxcount,"values":categoricals,"node":node}
 
         return props_dict
@@ -113,11 +160,6 @@ class ShapesInfoGraph():
         tureturn = []
         for nodeshape in self.node_shapes:
             target = self.target_for_shape(nodeshape) 
-            print("target for :",nodeshape," == ", target , file=sys.stderr)
             props  = self.properties_for_shape(nodeshape)
             tureturn.append({"node":nodeshape,"target":target,"properties":props})
         return tureturn
-
-
-
-    
\ No newline at end of file
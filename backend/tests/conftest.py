@@ -0,0 +1,36 @@
+import os, sys, shutil, stat
+import pytest
+from util4tests import log, workspace_folder
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.model.location import Locations
+
+def on_rm_error(func, path, exc_info):
+    #from: https://stackoverflow.com/questions/4829043/how-to-remove-read-only-attrib-directory-with-python-in-windows
+    os.chmod(path, stat.S_IWRITE)
+    os.unlink(path)
+
+def clean_root(root_folder):
+    """replace the test workspace with a fresh copy of tests/setup_workspace"""
+    log.debug("calling in setup")
+    if os.path.exists(root_folder):
+        shutil.rmtree(root_folder, onerror=on_rm_error)
+    shutil.copytree(os.path.join(currentdir, "setup_workspace"), root_folder)
+    log.debug("setup completed")
+
+@pytest.fixture(autouse=True)
+def locations_root():
+    """ every test sees the Locations singleton on the test workspace, the singleton keeps
+        the root it was first made with so it is set again whichever test made it
+    """
+    Locations(root=workspace_folder).root = workspace_folder
+    return workspace_folder
+
+@pytest.fixture
+def root_folder(locations_root):
+    """the test workspace, freshly copied from tests/setup_workspace"""
+    clean_root(locations_root)
+    return locations_root
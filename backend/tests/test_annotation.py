@@ -0,0 +1,63 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import os, sys, json
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.model.location import Locations
+from app.model.space import Space
+from app.routers.APIV1.annotation import router
+
+SPACE_ID = "0123456789"
+SHAPES = """@prefix schema: <http://schema.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+schema:FileShape a sh:NodeShape ; sh:targetClass schema:MediaObject ;
+    sh:property [ sh:path schema:name ; sh:name "name" ] .
+"""
+
+def read_metadata(storage_path):
+    with open(os.path.join(storage_path, "ro-crate-metadata.json")) as json_file:
+        return {entity["@id"]: entity for entity in json.load(json_file)["@graph"]}
+
+@pytest.fixture
+def client(root_folder, tmp_path):
+    storage_path = str(tmp_path / "crate")
+    os.makedirs(os.path.join(storage_path, "sub", "deep"))
+    with open(os.path.join(storage_path, "ro-crate-metadata.json"), 'w') as json_file:
+        json.dump({"@graph": [{"@id": "ro-crate-metadata.json", "@type": "CreativeWork", "about": {"@id": "./"}},
+                              {"@id": "./", "@type": "Dataset", "hasPart": [{"@id": "sub/"}]},
+                              {"@id": "sub/", "@type": "Dataset", "hasPart": [{"@id": "sub/deep/x.txt"}]},
+                              {"@id": "sub/deep/x.txt", "@type": "File"}]}, json_file)
+    with open(os.path.join(Locations().get_workspace_location_by_uuid(SPACE_ID), "all_constraints.ttl"), 'w') as f:
+        f.write(SHAPES)
+    Space.registry().patch(SPACE_ID, {'storage_path':storage_path})
+    app = FastAPI()
+    app.include_router(router, prefix="/apiv1/spaces/{space_id}")
+    return TestClient(app), storage_path
+
+### tests ###
+def test_annotate_nested_file(client):
+    """ test to see if a file in a subfolder can be annotated, read and have an annotation removed by its path id
+    """
+    client, storage_path = client
+    url = f"/apiv1/spaces/{SPACE_ID}/annotation/file/sub/deep/x.txt"
+    response = client.post(url, json={"Annotations": [{"URI_predicate_name": "name", "value": "x"},
+                                                      {"URI_predicate_name": "license", "value": "MIT"}]})
+    assert response.status_code == 200
+    assert read_metadata(storage_path)["sub/deep/x.txt"]["name"] == "x"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert client.get(f"/apiv1/spaces/{SPACE_ID}/annotation/file/sub%2Fdeep%2Fx.txt").status_code == 200
+    response = client.delete(url + "/license")
+    assert response.status_code == 200
+    entity = read_metadata(storage_path)["sub/deep/x.txt"]
+    assert "license" not in entity and entity["name"] == "x"
+    assert client.delete(url + "/license").status_code == 404
+    assert client.get(f"/apiv1/spaces/{SPACE_ID}/annotation/file/sub/deep/missing.txt").status_code == 404
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,45 @@
+import os, sys
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.model.constraints import ConstraintModel, ShapeSpec, PropertySpec
+from app.model.crategraph import CrateGraph
+from app.services.completeness import crate_completeness
+
+def make_model():
+    properties = (PropertySpec("http://schema.org/name", None, "1", None, (), None),
+                  PropertySpec("http://schema.org/license", None, None, None, (), None))
+    return ConstraintModel([ShapeSpec("http://schema.org/FileShape", "http://schema.org/File", properties)])
+
+### tests ###
+def test_crate_completeness():
+    """ test to see if every resource is scored like the single resource summary does
+    """
+    graph = CrateGraph({"@graph": [{"@id": "./", "@type": "Dataset"},
+                                   {"@id": "a.txt", "@type": "File", "name": "a", "license": "MIT"},
+                                   {"@id": "b.txt", "@type": "File", "name": "b"},
+                                   {"@id": "c.txt", "@type": "File"},
+                                   {"@id": "folder/", "@type": "Dataset"}]})
+    result = crate_completeness(graph, make_model())
+    assert result["resources"]["a.txt"] == {"type": "File", "green": 100.0, "orange": 0.0, "red": 0.0}
+    assert result["resources"]["b.txt"] == {"type": "File", "green": 50.0, "orange": 50.0, "red": 0.0}
+    assert result["resources"]["c.txt"] == {"type": "File", "green": 0.0, "orange": 50.0, "red": 50.0}
+    assert "folder/" not in result["resources"]
+    assert result["summary"]["resources"] == 3
+    assert result["summary"]["green"] == pytest.approx(50.0)
+    assert result["types"]["File"]["properties"]["name"] == {"min": 1, "filled": pytest.approx(2/3)}
+    assert "resources" not in crate_completeness(graph, make_model(), include_resources=False)
+
+def test_crate_completeness_empty():
+    """ test to see if a crate without constrained resources gets an empty summary
+    """
+    graph = CrateGraph({"@graph": [{"@id": "./", "@type": "Dataset"}]})
+    result = crate_completeness(graph, make_model())
+    assert result == {"summary": {"resources": 0, "green": 0, "orange": 0, "red": 0}, "types": {}, "resources": {}}
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,73 @@
+import os, sys, time
+import pytest
+from rdflib import Graph
+from rdflib.compare import isomorphic
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.services.constraintbundle import build_constraint_bundle, bundle_nt_path, load_bundle_graph
+from app.model.constraints import ConstraintModel
+
+FILE_SHAPE = """@prefix schema: <http://schema.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+# shared by both seeds
+schema:FileShape
+    a sh:NodeShape ;
+    sh:targetClass schema:File ;
+    sh:property [
+        sh:path schema:license ;
+        sh:in ( "MIT" "Apache-2.0" ) ;
+    ] .
+"""
+
+DATASET_SHAPE = """@prefix schema: <http://schema.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+schema:DatasetShape
+    a sh:NodeShape ;
+    sh:targetClass schema:Dataset ;
+    sh:property [ sh:path schema:name ; sh:minCount 1 ] .
+"""
+
+@pytest.fixture
+def seed_files(tmp_path):
+    paths = []
+    for name, content in (("first.ttl", FILE_SHAPE), ("second.ttl", FILE_SHAPE + DATASET_SHAPE.split("\n", 2)[2])):
+        path = str(tmp_path / name)
+        with open(path, "w") as ttl:
+            ttl.write(content)
+        paths.append(path)
+    return paths
+
+### tests ###
+def test_build_bundle(seed_files, tmp_path):
+    """ test to see if a shape found in two seeds is bundled once, also when the bundle is rebuilt
+    """
+    bundle = str(tmp_path / "all_constraints.ttl")
+    stats = build_constraint_bundle(seed_files, bundle)
+    assert stats['duplicate_shapes'] == 1
+    graph = Graph().parse(bundle, format='turtle')
+    assert len(list(graph.triples((None, None, None)))) == stats['triples']
+    model = ConstraintModel.compile(bundle)
+    assert sorted(model.targets()) == ["Dataset", "File"]
+    assert len(model.properties_for("File")) == 1
+    assert build_constraint_bundle(seed_files, bundle)['triples'] == stats['triples']
+    assert isomorphic(Graph().parse(bundle_nt_path(bundle), format='nt'), graph)
+
+def test_load_bundle_graph(seed_files, tmp_path):
+    """ test to see if the n-triples form is only used while it is in sync with the turtle
+    """
+    bundle = str(tmp_path / "all_constraints.ttl")
+    build_constraint_bundle(seed_files[:1], bundle)
+    assert len(load_bundle_graph(bundle)) == len(Graph().parse(bundle, format='turtle'))
+    #an edit of the turtle makes it newer than the n-triples
+    time.sleep(0.01)
+    with open(bundle, "a") as ttl:
+        ttl.write(DATASET_SHAPE)
+    assert len(load_bundle_graph(bundle)) == len(Graph().parse(bundle, format='turtle'))
+    assert len(load_bundle_graph(bundle)) > len(Graph().parse(bundle_nt_path(bundle), format='nt'))
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,124 @@
+import os, sys, json, threading
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+import app.model.constraints as constraints
+from app.model.constraints import ConstraintModels, ConstraintModel, SIDECAR_SUFFIX, compile_constraints
+from app.shacl_helper import ShapesInfoGraph, load_graph
+
+SHAPES = """@prefix schema: <http://schema.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+schema:FileShape
+    a sh:NodeShape ;
+    sh:targetClass schema:File ;
+    sh:property [
+        sh:path schema:name ;
+        sh:datatype xsd:string ;
+        sh:minCount 1 ;
+    ] ;
+    sh:property [
+        sh:path schema:license ;
+        sh:in ( "MIT" "Apache-2.0" ) ;
+    ] .
+"""
+
+### tests ###
+@pytest.fixture
+def shapes_file(tmp_path):
+    path = os.path.join(str(tmp_path), "all_constraints.ttl")
+    with open(path, 'w') as ttl:
+        ttl.write(SHAPES)
+    return path
+
+def test_compile_constraints(shapes_file):
+    """ test to see if the compiled model holds the constraints per target class
+    """
+    model = ConstraintModel.compile(shapes_file)
+    assert model.targets() == ["File"]
+    props = {prop.label: prop for prop in model.properties_for("File")}
+    assert props["name"].requirement() == {'min':1, 'value':[], 'typeprop':'http://www.w3.org/2001/XMLSchema#string'}
+    assert props["license"].required == 0
+    assert props["license"].typeprop == 'String'
+    assert sorted(props["license"].values) == ["Apache-2.0", "MIT"]
+    assert model.properties_for("Dataset") == ()
+
+def test_constraint_models_sidecar(shapes_file):
+    """ test to see if the compiled model is reused from the sidecar and redone when the ttl changes
+    """
+    model = ConstraintModels().get(shapes_file)
+    assert ConstraintModels().get(shapes_file) is model
+    assert os.path.exists(shapes_file + SIDECAR_SUFFIX)
+    ConstraintModels().invalidate(shapes_file)
+    assert ConstraintModels().get(shapes_file).as_shacl_dict() == model.as_shacl_dict()
+    with open(shapes_file, 'w') as ttl:
+        ttl.write(SHAPES.replace("schema:File ;", "schema:Dataset ;"))
+    assert ConstraintModels().get(shapes_file).targets() == ["Dataset"]
+
+def test_constraint_models_compile_per_path(tmp_path, monkeypatch):
+    """ test to see if a file being compiled does not hold up cached files and is compiled once for all its waiters
+    """
+    warm, slow = (os.path.join(str(tmp_path), name) for name in ("warm.ttl", "slow.ttl"))
+    for path in (warm, slow):
+        with open(path, 'w') as ttl:
+            ttl.write(SHAPES)
+    warm_model = ConstraintModels().get(warm)
+    started, release = threading.Event(), threading.Event()
+    compiled = []
+    class BlockingExecution():
+        def cpu(self, func, path_shacl):
+            compiled.append(path_shacl)
+            started.set()
+            assert release.wait(10)
+            return compile_constraints(path_shacl)
+    monkeypatch.setattr(constraints, "Execution", BlockingExecution)
+    results = []
+    waiters = [threading.Thread(target=lambda: results.append(ConstraintModels().get(slow))) for _ in range(2)]
+    for waiter in waiters:
+        waiter.start()
+    assert started.wait(10)
+    #answered while slow.ttl is still being compiled
+    assert ConstraintModels().get(warm) is warm_model
+    release.set()
+    for waiter in waiters:
+        waiter.join(10)
+    assert compiled == [slow]
+    assert len(results) == 2 and results[0] is results[1]
+
+@pytest.mark.parametrize("mmap_mb", ["0", "0.000001"])
+def test_shapes_graph_by_path(tmp_path, monkeypatch, mmap_mb):
+    """ test to see if comments and multi-line literals survive the parsing, with and without a memory map
+    """
+    monkeypatch.setenv("DMBON_FAST_API_SHAPES_MMAP_MB", mmap_mb)
+    path = os.path.join(str(tmp_path), "shapes.ttl")
+    with open(path, 'w') as ttl:
+        ttl.write("# license values\n" + SHAPES.replace('"MIT"', '"""MIT\nlicense"""'))
+    shapes = ShapesInfoGraph(path).full_shacl_graph_dict()
+    values = [str(value) for prop in shapes[0]["properties"].values() for value in prop["values"]]
+    assert sorted(values) == ["Apache-2.0", "MIT\nlicense"]
+    nt_path = os.path.join(str(tmp_path), "shapes.nt")
+    load_graph(path).serialize(nt_path, format='nt')
+    assert len(load_graph(nt_path)) == len(load_graph(path))
+
+def test_large_value_list(tmp_path):
+    """ test to see if a long sh:in list compiles in list order and a list looping onto itself ends
+    """
+    values = " ".join(f'"value{i}"' for i in range(5000))
+    path = os.path.join(str(tmp_path), "all_constraints.ttl")
+    with open(path, 'w') as ttl:
+        ttl.write(SHAPES.replace('( "MIT" "Apache-2.0" )', f'( {values} )') + """
+_:loop <http://www.w3.org/1999/02/22-rdf-syntax-ns#first> "again" ;
+    <http://www.w3.org/1999/02/22-rdf-syntax-ns#rest> _:loop .
+schema:LoopShape a sh:NodeShape ; sh:targetClass schema:Loop ; sh:property [ sh:path schema:name ; sh:in _:loop ] .
+""")
+    model = ConstraintModel.compile(path)
+    props = {prop.label: prop for prop in model.properties_for("File")}
+    assert list(props["license"].values) == [f"value{i}" for i in range(5000)]
+    assert model.properties_for("Loop")[0].values == ("again",)
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,115 @@
+import os, sys, json, threading
+import pytest
+from util4tests import log, run_single_test, workspace_folder
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.model.cratecache import MetadataCache
+from app.model.crategraph import CrateGraph
+
+### tests ###
+@pytest.fixture
+def metadata_file(tmp_path):
+    path = os.path.join(str(tmp_path), "ro-crate-metadata.json")
+    with open(path, 'w') as metaf:
+        json.dump({"@graph": [{"@id": "./", "@type": "Dataset"}]}, metaf)
+    return path
+
+def test_cache_reuses_parsed_metadata(metadata_file):
+    """ test to see if an unchanged metadata file is only parsed once
+    """
+    cache = MetadataCache(max_bytes=1024*1024)
+    first = cache.read(metadata_file)
+    assert cache.read(metadata_file) is first
+    assert cache.metrics()["hits"] == 1
+    assert cache.metrics()["misses"] == 1
+
+def test_cache_follows_file_changes(metadata_file):
+    """ test to see if a change on disk by someone else is picked up and writes update the cache
+    """
+    cache = MetadataCache(max_bytes=1024*1024)
+    cache.read(metadata_file)
+    with open(metadata_file, 'w') as metaf:
+        json.dump({"@graph": [{"@id": "./", "@type": "Dataset"}, {"@id": "a.txt", "@type": "File"}]}, metaf)
+    assert len(cache.read(metadata_file)["@graph"]) == 2
+    cache.write(metadata_file, {"@graph": []})
+    assert cache.read(metadata_file) == {"@graph": []}
+    with open(metadata_file) as metaf:
+        assert json.load(metaf) == {"@graph": []}
+
+def test_cache_evicts_over_cap(tmp_path):
+    """ test to see if the least recently used entries are evicted once the cap is reached
+    """
+    paths = []
+    for i in range(3):
+        path = os.path.join(str(tmp_path), f"crate{i}.json")
+        with open(path, 'w') as metaf:
+            json.dump({"@graph": [], "pad": "x" * 100}, metaf)
+        paths.append(path)
+    cache = MetadataCache(max_bytes=250)
+    for path in paths:
+        cache.read(path)
+    metrics = cache.metrics()
+    assert metrics["entries"] == 2
+    assert metrics["evictions"] == 1
+    assert metrics["bytes"] <= 250
+
+def test_cache_keeps_derived_objects(metadata_file):
+    """ test to see if objects derived from the metadata survive writes of the same data and not outside changes
+    """
+    cache = MetadataCache(max_bytes=1024*1024)
+    graph = cache.derived(metadata_file, "graph", CrateGraph)
+    assert cache.derived(metadata_file, "graph", CrateGraph) is graph
+    cache.write(metadata_file, graph.data)
+    assert cache.derived(metadata_file, "graph", CrateGraph) is graph
+    with open(metadata_file, 'w') as metaf:
+        json.dump({"@graph": []}, metaf)
+    assert cache.derived(metadata_file, "graph", CrateGraph) is not graph
+
+def test_cache_edits_copies(metadata_file):
+    """ test to see if edits change a copy that replaces the shared metadata and edits under the lock all land
+    """
+    cache = MetadataCache(max_bytes=1024*1024)
+    shared = cache.read(metadata_file)
+    def edit(entity_id):
+        with cache.lock(metadata_file):
+            data = cache.read_copy(metadata_file)
+            data["@graph"].append({"@id": entity_id, "@type": "File"})
+            cache.write(metadata_file, data)
+    threads = [threading.Thread(target=lambda i=i: [edit(f"{i}-{j}.txt") for j in range(10)]) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert shared == {"@graph": [{"@id": "./", "@type": "Dataset"}]}
+    with open(metadata_file) as metaf:
+        assert len(json.load(metaf)["@graph"]) == 41
+    assert len(cache.read(metadata_file)["@graph"]) == 41
+
+def test_crate_graph_indexes():
+    """ test to see if the crate graph indexes follow changes made through it
+    """
+    data = {"@graph": [{"@id": "ro-crate-metadata.json", "@type": "CreativeWork"},
+                       {"@id": "./", "@type": "Dataset"},
+                       {"@id": "a.txt", "@type": "File"},
+                       {"@id": "folder/", "@type": ["Dataset", "Collection"]}]}
+    graph = CrateGraph(data)
+    assert graph.ids() == ["ro-crate-metadata.json", "./", "a.txt", "folder/"]
+    assert [entity["@id"] for entity in graph.data_entities()] == ["a.txt", "folder/"]
+    assert graph.ids_by_type("Dataset") == ["./", "folder/"]
+    graph.set(graph.get("a.txt"), "license", "MIT")
+    assert data["@graph"][2]["license"] == "MIT"
+    graph.set(graph.get("a.txt"), "@type", "Dataset")
+    assert graph.ids_by_type("File") == []
+    assert graph.ids_by_type("Dataset") == ["./", "folder/", "a.txt"]
+    graph.add({"@id": "b.txt", "@type": "File"})
+    assert graph.ids_by_type("File") == ["b.txt"]
+    graph.remove("folder/")
+    assert "folder/" not in graph
+    assert graph.ids_by_type("Collection") == []
+    assert [entity["@id"] for entity in data["@graph"]] == ["ro-crate-metadata.json", "./", "a.txt", "b.txt"]
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,93 @@
+import os, sys, json
+import pytest
+import git
+from rdflib import URIRef, BNode, Literal
+from rdflib.namespace import XSD
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.services.craterdf import CrateRdfCache, metadata_to_graph, local_context, rocrate_context, triples_to_json, triples_from_json
+from app.services.validation import crate_base
+
+SCHEMA = "http://schema.org/"
+
+def write_metadata(crate, name):
+    with open(os.path.join(crate, "ro-crate-metadata.json"), 'w') as f:
+        json.dump({"@context": "https://w3id.org/ro/crate/1.1/context", "@graph": [
+            {"@id": "ro-crate-metadata.json", "@type": "CreativeWork", "about": {"@id": "./"}},
+            {"@id": "./", "@type": "Dataset", "name": name, "hasPart": [{"@id": "data.csv"}]},
+            {"@id": "data.csv", "@type": "File", "encodingFormat": "text/csv"}]}, f)
+
+@pytest.fixture
+def crate_folder(tmp_path):
+    crate = os.path.join(str(tmp_path), "crate")
+    os.makedirs(crate)
+    write_metadata(crate, "first")
+    repo = git.Repo.init(crate)
+    repo.index.add(["ro-crate-metadata.json"])
+    repo.index.commit("crate")
+    return crate
+
+### tests ###
+def test_local_context(crate_folder):
+    """ test to see if the ro-crate context urls are resolved without fetching them
+    """
+    assert local_context("https://w3id.org/ro/crate/1.1/context") is rocrate_context()
+    assert local_context(["http://w3id.org/ro/crate/1.1/context/", {"x": "https://example.org/x"}])[1] == {"x": "https://example.org/x"}
+    base = crate_base(crate_folder)
+    with open(os.path.join(crate_folder, "ro-crate-metadata.json")) as f:
+        graph = metadata_to_graph(json.load(f), base)
+    assert (URIRef(base + "data.csv"), URIRef(SCHEMA + "encodingFormat"), Literal("text/csv")) in graph
+
+def test_graph_cached_per_revision(crate_folder, tmp_path):
+    """ test to see if a crate is converted once per revision and loaded from disk by another cache
+    """
+    cache_folder = os.path.join(str(tmp_path), "rdf-cache")
+    cache = CrateRdfCache(cache_folder)
+    base = crate_base(crate_folder)
+    graph = cache.graph(crate_folder, base)
+    name = (URIRef(base), URIRef(SCHEMA + "name"), Literal("first"))
+    assert name in graph
+    #callers get their own graph
+    graph.remove(name)
+    assert name in cache.graph(crate_folder, base)
+    assert cache.metrics()['conversions'] == 1 and cache.metrics()['hits'] == 1
+    other = CrateRdfCache(cache_folder)
+    assert len(other.graph(crate_folder, base)) == len(cache.graph(crate_folder, base))
+    assert other.metrics()['loads'] == 1 and other.metrics()['conversions'] == 0
+    write_metadata(crate_folder, "second")
+    assert (URIRef(base), URIRef(SCHEMA + "name"), Literal("second")) in other.graph(crate_folder, base)
+    assert other.metrics()['conversions'] == 1
+    #the file of the old revision made way for the new one
+    assert len(os.listdir(cache_folder)) == 1
+    other.drop(crate_folder)
+    assert os.listdir(cache_folder) == []
+
+def test_triples_json():
+    """ test to see if the cache file json keeps iris, blank nodes and typed and language literals
+    """
+    node = BNode()
+    triples = [(URIRef("https://example.org/a"), URIRef(SCHEMA + "name"), Literal("naam", lang="nl")),
+               (URIRef("https://example.org/a"), URIRef(SCHEMA + "author"), node),
+               (node, URIRef(SCHEMA + "age"), Literal("42", datatype=XSD.integer)),
+               (node, URIRef(SCHEMA + "name"), Literal("plain"))]
+    assert triples_from_json(triples_to_json(triples)) == triples
+
+def test_unreadable_cache_file(crate_folder, tmp_path):
+    """ test to see if a cache file that is not triples json gets converted again
+    """
+    cache = CrateRdfCache(str(tmp_path / "rdf-cache"))
+    base = crate_base(crate_folder)
+    expected = len(cache.graph(crate_folder, base))
+    cache_file = os.path.join(cache.cache_folder, os.listdir(cache.cache_folder)[0])
+    with open(cache_file, 'wb') as f:
+        f.write(b"\x80\x04not json")
+    other = CrateRdfCache(cache.cache_folder)
+    assert len(other.graph(crate_folder, base)) == expected
+    assert other.metrics()['conversions'] == 1
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,53 @@
+import os, sys, math, asyncio
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.services.execution import Executor
+
+@pytest.fixture
+def executor():
+    executor = Executor(io_workers=2, cpu_workers=1)
+    yield executor
+    executor.shutdown()
+
+def fail():
+    raise ValueError("failing call")
+
+### tests ###
+def test_io_calls(executor):
+    """ test to see if io calls return their result and are counted per function
+    """
+    assert executor.io(sorted, [3, 1, 2]) == [1, 2, 3]
+    assert asyncio.run(executor.aio(sorted, [2, 1], reverse=True)) == [2, 1]
+    with pytest.raises(ValueError):
+        executor.io(fail)
+    io = executor.metrics()['io']
+    assert (io['queued'], io['running'], io['completed'], io['failed']) == (0, 0, 2, 1)
+    assert io['calls']['sorted']['count'] == 2
+    assert io['calls']['fail']['count'] == 1
+
+def test_cpu_calls(executor):
+    """ test to see if cpu calls run in a worker process and keep their latency
+    """
+    assert executor.cpu(math.factorial, 20) == math.factorial(20)
+    assert executor.cpu(os.getpid) != os.getpid()
+    cpu = executor.metrics()['cpu']
+    assert cpu['completed'] == 2
+    assert cpu['calls']['factorial']['run_max_s'] >= 0
+
+def test_cpu_calls_without_processes():
+    """ test to see if cpu work runs on the io pool when no cpu workers are configured
+    """
+    executor = Executor(io_workers=1, cpu_workers=0)
+    try:
+        assert executor.cpu(os.getpid) == os.getpid()
+        assert executor.metrics()['io']['completed'] == 1
+    finally:
+        executor.shutdown()
+
+if __name__ == "__main__":
+    run_single_test(__file__)
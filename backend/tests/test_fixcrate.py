@@ -0,0 +1,125 @@
+import os, sys, json, shutil
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.services.fixcrate import complete_metadata_crate, walk_storage
+
+def write_json(path, data):
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file)
+
+def read_json(path):
+    with open(path) as json_file:
+        return json.load(json_file)
+
+@pytest.fixture
+def crate_folder(tmp_path):
+    crate = str(tmp_path)
+    os.makedirs(os.path.join(crate, "sub", "deep"))
+    os.makedirs(os.path.join(crate, ".git", "objects"))
+    for relative_path in ("data.csv", os.path.join("sub", "deep", "x.txt"), os.path.join(".git", "HEAD")):
+        with open(os.path.join(crate, relative_path), 'w') as f:
+            f.write("content")
+    write_json(os.path.join(crate, "ro-crate-metadata.json"), {"@graph": [
+        {"@id": "ro-crate-metadata.json", "@type": "CreativeWork", "about": {"@id": "./"}},
+        {"@id": "./", "@type": "Dataset", "name": "my crate", "hasPart": [{"@id": "https://example.org/a"}, {"@id": "gone.txt"}]},
+        {"@id": "x.txt", "@type": "File", "license": "MIT"},
+        {"@id": "data.csv", "@type": "File", "name": "data"},
+        {"@id": "gone.txt", "@type": "File"},
+        {"@id": "https://example.org/a", "@type": "File"},
+        {"@id": "#me", "@type": "Person", "name": "me"}]})
+    return crate
+
+### tests ###
+def test_walk_storage(crate_folder):
+    """ test to see if the walk gives relative ids, parents first and without .git
+    """
+    assert list(walk_storage(crate_folder)) == [("data.csv", False), ("ro-crate-metadata.json", False), ("sub/", True),
+                                                ("sub/deep/", True), ("sub/deep/x.txt", False)]
+
+def test_fixcrate(crate_folder):
+    """ test to see if fixcrate adds missing files, drops removed ones and keeps the old metadata
+    """
+    data, changes = complete_metadata_crate(crate_folder)
+    entities = {entity["@id"]: entity for entity in data["@graph"]}
+    assert sorted(changes["added"]) == ["sub/", "sub/deep/", "sub/deep/x.txt"]
+    assert sorted(changes["removed"]) == ["gone.txt", "x.txt"]
+    assert entities["data.csv"]["name"] == "data"
+    assert entities["sub/deep/x.txt"]["license"] == "MIT"
+    assert entities["sub/deep/"]["hasPart"] == [{"@id": "sub/deep/x.txt"}]
+    assert entities["./"]["name"] == "my crate"
+    assert {"@id": "https://example.org/a"} in entities["./"]["hasPart"]
+    assert entities["#me"]["name"] == "me"
+    assert not any(entity_id.startswith(".git") for entity_id in entities)
+    assert read_json(os.path.join(crate_folder, "ro-crate-metadata.json")) == data
+    #a second run has nothing left to do
+    assert complete_metadata_crate(crate_folder)[1] == {"added": [], "removed": [], "changed": [], "full_rebuild": True}
+
+def test_fixcrate_dry_run(crate_folder):
+    """ test to see if a dry run reports the changes without writing them
+    """
+    before = read_json(os.path.join(crate_folder, "ro-crate-metadata.json"))
+    data, changes = complete_metadata_crate(crate_folder, dry_run=True)
+    assert "sub/deep/x.txt" in changes["added"]
+    assert read_json(os.path.join(crate_folder, "ro-crate-metadata.json")) == before
+
+def test_fixcrate_incremental(crate_folder, tmp_path_factory):
+    """ test to see if a run with a manifest only handles what changed since the last run
+    """
+    manifest_path = os.path.join(str(tmp_path_factory.mktemp("workspace")), "fixcrate-manifest.json")
+    data, changes = complete_metadata_crate(crate_folder, manifest_path=manifest_path)
+    assert changes["full_rebuild"]
+    assert os.path.isfile(manifest_path)
+    #only the metadata file itself changed since then
+    data, changes = complete_metadata_crate(crate_folder, manifest_path=manifest_path)
+    assert changes == {"added": [], "removed": [], "changed": [], "full_rebuild": False}
+    os.makedirs(os.path.join(crate_folder, "sub", "new"))
+    with open(os.path.join(crate_folder, "sub", "new", "y.txt"), 'w') as f:
+        f.write("content")
+    os.remove(os.path.join(crate_folder, "sub", "deep", "x.txt"))
+    data, changes = complete_metadata_crate(crate_folder, manifest_path=manifest_path)
+    assert changes == {"added": ["sub/new/", "sub/new/y.txt"], "removed": ["sub/deep/x.txt"], "changed": [], "full_rebuild": False}
+    entities = {entity["@id"]: entity for entity in data["@graph"]}
+    assert "sub/deep/x.txt" not in entities
+    assert entities["sub/deep/"]["hasPart"] == []
+    assert {"@id": "sub/new/"} in entities["sub/"]["hasPart"]
+    assert entities["sub/new/"]["hasPart"] == [{"@id": "sub/new/y.txt"}]
+    assert read_json(os.path.join(crate_folder, "ro-crate-metadata.json")) == data
+    #a file edited in place leaves the mtime of its folder alone
+    folder_mtime = os.stat(os.path.join(crate_folder, "sub", "new")).st_mtime_ns
+    with open(os.path.join(crate_folder, "sub", "new", "y.txt"), 'a') as f:
+        f.write(" and more")
+    assert os.stat(os.path.join(crate_folder, "sub", "new")).st_mtime_ns == folder_mtime
+    data, changes = complete_metadata_crate(crate_folder, manifest_path=manifest_path)
+    assert changes == {"added": [], "removed": [], "changed": ["sub/new/y.txt"], "full_rebuild": False}
+    assert complete_metadata_crate(crate_folder, manifest_path=manifest_path)[1]["changed"] == []
+    #removing a folder drops everything below it
+    shutil.rmtree(os.path.join(crate_folder, "sub"))
+    data, changes = complete_metadata_crate(crate_folder, manifest_path=manifest_path)
+    assert sorted(changes["removed"]) == ["sub/", "sub/deep/", "sub/new/", "sub/new/y.txt"]
+    assert not any(entity["@id"].startswith("sub/") for entity in data["@graph"])
+    assert {"@id": "sub/"} not in data["@graph"][1]["hasPart"]
+    #the incremental result is what a full rebuild gives
+    assert complete_metadata_crate(crate_folder, dry_run=True, manifest_path=manifest_path, full=True)[1]["added"] == []
+
+def test_fixcrate_incremental_dry_run(crate_folder, tmp_path_factory):
+    """ test to see if an incremental dry run leaves the metadata and manifest alone
+    """
+    manifest_path = os.path.join(str(tmp_path_factory.mktemp("workspace")), "fixcrate-manifest.json")
+    complete_metadata_crate(crate_folder, manifest_path=manifest_path)
+    before = read_json(os.path.join(crate_folder, "ro-crate-metadata.json"))
+    manifest = read_json(manifest_path)
+    with open(os.path.join(crate_folder, "extra.txt"), 'w') as f:
+        f.write("content")
+    data, changes = complete_metadata_crate(crate_folder, dry_run=True, manifest_path=manifest_path)
+    assert changes["added"] == ["extra.txt"]
+    assert read_json(os.path.join(crate_folder, "ro-crate-metadata.json")) == before
+    assert read_json(manifest_path) == manifest
+    assert complete_metadata_crate(crate_folder, manifest_path=manifest_path)[1]["added"] == ["extra.txt"]
+
+if __name__ == "__main__":
+    run_single_test(__file__)
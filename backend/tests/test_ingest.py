@@ -0,0 +1,91 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import os, sys, json
+import git
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.services.ingest import ingest_content
+from app.model.location import Locations
+from app.model.space import Space
+from app.routers.APIV1.annotation import router as annotation_router
+
+def read_json(path):
+    with open(path) as json_file:
+        return json.load(json_file)
+
+@pytest.fixture
+def space(tmp_path):
+    space_root = str(tmp_path / "space")
+    os.makedirs(space_root)
+    with open(os.path.join(space_root, "ro-crate-metadata.json"), 'w') as json_file:
+        json.dump({"@graph": [{"@id": "ro-crate-metadata.json", "@type": "CreativeWork", "about": {"@id": "./"}},
+                              {"@id": "./", "@type": "Dataset", "hasPart": []}]}, json_file)
+    repo = git.Repo.init(space_root)
+    with open(os.path.join(space_root, "untouched.txt"), 'w') as f:
+        f.write("content")
+    source = str(tmp_path / "source")
+    os.makedirs(os.path.join(source, "dir", "inner"))
+    os.makedirs(os.path.join(source, "dir", ".git"))
+    for relative_path in ("f.txt", "dir/a.txt", "dir/inner/b.txt", "dir/.git/HEAD"):
+        with open(os.path.join(source, *relative_path.split('/')), 'w') as f:
+            f.write("content")
+    return space_root, repo, source
+
+### tests ###
+def test_ingest_content(space):
+    """ test to see if files, directories and urls end up in the space and crate, staging only what was added
+    """
+    space_root, repo, source = space
+    reports = ingest_content(space_root, [os.path.join(source, "f.txt"), os.path.join(source, "dir"), "https://example.org/a.html"],
+                             repo=repo, max_workers=2)
+    assert [(report["status"], report["path"], report["files"]) for report in reports] == \
+        [("added", "f.txt", 1), ("added", "dir/", 2), ("added", "https://example.org/a.html", 0)]
+    assert os.path.isfile(os.path.join(space_root, "dir", "inner", "b.txt"))
+    assert not os.path.exists(os.path.join(space_root, "dir", ".git"))
+    data = read_json(os.path.join(space_root, "ro-crate-metadata.json"))
+    entities = {entity["@id"]: entity for entity in data["@graph"]}
+    assert list(entities) == ["ro-crate-metadata.json", "./", "f.txt", "dir/", "dir/a.txt", "dir/inner/", "dir/inner/b.txt", "https://example.org/a.html"]
+    assert entities["./"]["hasPart"] == [{"@id": "f.txt"}, {"@id": "dir/"}, {"@id": "https://example.org/a.html"}]
+    assert entities["dir/inner/"]["hasPart"] == [{"@id": "dir/inner/b.txt"}]
+    staged = sorted(path for (path, stage) in repo.index.entries)
+    assert staged == ["dir/a.txt", "dir/inner/b.txt", "f.txt", "ro-crate-metadata.json"]
+
+def test_ingest_content_failures(space):
+    """ test to see if a failing item is reported without stopping the others
+    """
+    space_root, repo, source = space
+    target = os.path.join(space_root, "deep", "er")
+    reports = ingest_content(space_root, [os.path.join(source, "missing.txt"), os.path.join(source, "f.txt")], target_folder=target)
+    assert reports[0]["status"] == "failed"
+    assert reports[1] == {"content": os.path.join(source, "f.txt"), "status": "added", "path": "deep/er/f.txt", "files": 1}
+    ids = [entity["@id"] for entity in read_json(os.path.join(space_root, "ro-crate-metadata.json"))["@graph"]]
+    assert ids[2:] == ["deep/", "deep/er/", "deep/er/f.txt"]
+    assert ingest_content(space_root, [os.path.join(source, "f.txt")], target_folder=os.path.dirname(space_root))[0]["status"] == "failed"
+
+def test_ingested_content_annotation(space, root_folder):
+    """ test to see if content added under a folder of the space can be annotated by the id the ingest gave it
+    """
+    space_root, repo, source = space
+    reports = ingest_content(space_root, [os.path.join(source, "dir")], target_folder=os.path.join(space_root, "data", "raw"), repo=repo)
+    assert reports[0]["path"] == "data/raw/dir/"
+    Space.registry().patch("0123456789", {'storage_path':space_root})
+    with open(os.path.join(Locations().get_workspace_location_by_uuid("0123456789"), "all_constraints.ttl"), 'w') as f:
+        f.write("@prefix sh: <http://www.w3.org/ns/shacl#> .\n")
+    app = FastAPI()
+    app.include_router(annotation_router, prefix="/apiv1/spaces/{space_id}")
+    client = TestClient(app)
+    url = "/apiv1/spaces/0123456789/annotation/file/" + reports[0]["path"] + "inner/b.txt"
+    response = client.post(url, json={"Annotations": [{"URI_predicate_name": "name", "value": "b"}]})
+    assert response.status_code == 200
+    assert client.get(url).status_code == 200
+    assert client.delete(url + "/name").status_code == 200
+    entities = {entity["@id"]: entity for entity in read_json(os.path.join(space_root, "ro-crate-metadata.json"))["@graph"]}
+    assert "data/raw/dir/inner/b.txt" in entities and "name" not in entities["data/raw/dir/inner/b.txt"]
+
+if __name__ == "__main__":
+    run_single_test(__file__)
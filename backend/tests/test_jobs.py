@@ -0,0 +1,81 @@
+import os, sys, time, threading
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.model.registry import JsonRegistry
+from app.services.jobs import JobQueue, report_progress, SUCCEEDED, FAILED, RUNNING
+
+def wait_for(queue, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        record = queue.get(job_id)
+        if record['state'] in (SUCCEEDED, FAILED):
+            return record
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(JsonRegistry(str(tmp_path / "jobs.json")), max_workers=2)
+    yield queue
+    queue.shutdown()
+
+### tests ###
+def test_job_result(queue):
+    """ test to see if a job runs in the background and keeps its result and progress
+    """
+    def work(a, b=0):
+        report_progress(1, 1, "adding")
+        return {'sum': a + b}
+    job_id = queue.submit("test.add", work, 1, b=2, params={'a': 1})
+    record = wait_for(queue, job_id)
+    assert record['result'] == {'sum': 3}
+    assert record['progress'] == {'done': 1, 'total': 1, 'message': "adding"}
+    assert record['params'] == {'a': 1}
+    assert record['started'] is not None and record['finished'] is not None
+    #the record lives in the registry, not only in memory
+    assert queue.registry[job_id]['state'] == SUCCEEDED
+
+def test_job_failure(queue):
+    """ test to see if an error of a job is kept with its status code and detail
+    """
+    class StatusError(Exception):
+        status_code = 400
+        detail = "bad input"
+    def work():
+        raise StatusError("bad input")
+    record = wait_for(queue, queue.submit("test.fail", work))
+    assert record['state'] == FAILED
+    assert record['error']['status_code'] == 400
+    assert record['error']['detail'] == "bad input"
+    with pytest.raises(KeyError):
+        queue.get("unknown")
+
+def test_job_pool_bounded(queue):
+    """ test to see if no more jobs run at the same time than there are workers
+    """
+    release = threading.Event()
+    job_ids = [queue.submit("test.block", release.wait) for i in range(3)]
+    time.sleep(0.2)
+    states = [queue.get(job_id)['state'] for job_id in job_ids]
+    assert states.count(RUNNING) == 2
+    release.set()
+    assert all(wait_for(queue, job_id)['state'] == SUCCEEDED for job_id in job_ids)
+
+def test_interrupted_jobs(tmp_path):
+    """ test to see if jobs left running by a process that is gone are marked as failed
+    """
+    registry = JsonRegistry(str(tmp_path / "jobs.json"))
+    registry.replace({'old': {'kind': "test", 'state': RUNNING, 'pid': os.getpid(), 'finished': None}})
+    queue = JobQueue(registry, max_workers=1)
+    try:
+        assert queue.get('old')['state'] == FAILED
+    finally:
+        queue.shutdown()
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,62 @@
+import os, sys
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.services.listing import walk_files, DirectoryCache
+
+@pytest.fixture
+def space_folder(tmp_path):
+    space = str(tmp_path)
+    for folder in (("sub", "deep"), ("sub", "other"), (".git", "objects"), (".github",)):
+        os.makedirs(os.path.join(space, *folder))
+    for relative_path in ("b.txt", "a.txt", "sub/s.txt", "sub/deep/x.txt", "sub/deep/y.txt", "sub/other/z.txt", ".git/HEAD", ".git/objects/ab", ".github/w.yml"):
+        with open(os.path.join(space, *relative_path.split('/')), 'w') as f:
+            f.write("content")
+    return space
+
+def relative_paths(walk):
+    return [relative_path for relative_path, folder, name in walk]
+
+### tests ###
+def test_walk_files(space_folder):
+    """ test to see if the walk lists files before subfolders, in sorted order and without .git
+    """
+    assert relative_paths(walk_files(space_folder)) == ["a.txt", "b.txt", ".github/w.yml", "sub/s.txt", "sub/deep/x.txt", "sub/deep/y.txt", "sub/other/z.txt"]
+    relative_path, folder, name = next(walk_files(space_folder, after="sub/s.txt"))
+    assert (folder, name) == (os.path.join(space_folder, "sub", "deep"), "x.txt")
+
+def test_walk_files_depth(space_folder):
+    """ test to see if the depth limits how many levels of subfolders are listed
+    """
+    assert relative_paths(walk_files(space_folder, max_depth=0)) == ["a.txt", "b.txt"]
+    assert relative_paths(walk_files(space_folder, max_depth=1)) == ["a.txt", "b.txt", ".github/w.yml", "sub/s.txt"]
+
+def test_walk_files_cursor(space_folder):
+    """ test to see if continuing after every cursor gives the rest of the full walk
+    """
+    full = relative_paths(walk_files(space_folder))
+    for i, cursor in enumerate(full):
+        assert relative_paths(walk_files(space_folder, after=cursor)) == full[i+1:]
+    #a cursor that no longer exists continues at the next path in walk order
+    assert relative_paths(walk_files(space_folder, after="sub/deep/gone.txt")) == ["sub/deep/x.txt", "sub/deep/y.txt", "sub/other/z.txt"]
+    assert relative_paths(walk_files(space_folder, after="sub/gone/x.txt")) == ["sub/other/z.txt"]
+
+def test_directory_cache(space_folder):
+    """ test to see if folder listings are reused until something is added to the folder
+    """
+    cache = DirectoryCache()
+    first = relative_paths(walk_files(space_folder, cache=cache))
+    assert cache.metrics()["misses"] == 5
+    assert relative_paths(walk_files(space_folder, cache=cache)) == first
+    assert cache.metrics()["hits"] == 5
+    with open(os.path.join(space_folder, "sub", "deep", "new.txt"), 'w') as f:
+        f.write("content")
+    assert "sub/deep/new.txt" in relative_paths(walk_files(space_folder, cache=cache))
+    assert cache.metrics()["misses"] == 6
+
+if __name__ == "__main__":
+    run_single_test(__file__)
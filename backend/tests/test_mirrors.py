@@ -0,0 +1,62 @@
+import os, sys
+import git, pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.model.location import Locations, normalise_repo_url
+from app.model.rocrategit import GitRepoCache
+
+@pytest.fixture
+def remote(tmp_path, root_folder):
+    #a local repo standing in for the github repo
+    remote_path = str(tmp_path / "remote")
+    repo = git.Repo.init(remote_path)
+    with open(os.path.join(remote_path, "ro-crate-metadata.json"), "w") as f:
+        f.write('{"@graph": []}')
+    repo.index.add(["ro-crate-metadata.json"])
+    repo.index.commit("first")
+    return repo
+
+### tests ###
+def test_normalise_repo_url():
+    """ test to see if the https and ssh urls of a repo give the same key
+    """
+    key = "github.com/owner/name"
+    assert normalise_repo_url("https://github.com/Owner/Name.git") == key
+    assert normalise_repo_url("git@github.com:owner/name.git") == key
+    assert normalise_repo_url("ssh://git@github.com/owner/name/") == key
+
+def test_clone_uses_mirror(remote, tmp_path):
+    """ test to see if clones borrow the objects of the mirror and a second clone only fetches
+    """
+    repo_url = "https://github.com/owner/name"
+    first = str(tmp_path / "first")
+    GitRepoCache.clone_content(first, repo_url, fetch_url=remote.working_dir)
+    mirror_path = Locations().get_mirror_location_by_url(repo_url)
+    assert git.Repo(mirror_path).bare
+    with open(os.path.join(first, ".git", "objects", "info", "alternates")) as f:
+        assert os.path.samefile(f.read().strip(), os.path.join(mirror_path, "objects"))
+    assert git.Repo(first).remote('origin').url == remote.working_dir
+    #new commits reach the next clone through the existing mirror
+    with open(os.path.join(remote.working_dir, "README.md"), "w") as f:
+        f.write("readme")
+    remote.index.add(["README.md"])
+    remote.index.commit("second")
+    second = str(tmp_path / "second")
+    GitRepoCache.clone_content(second, "git@github.com:owner/name.git", fetch_url=remote.working_dir)
+    assert Locations().get_mirror_location_by_url("git@github.com:owner/name.git") == mirror_path
+    assert os.path.exists(os.path.join(second, "README.md"))
+
+def test_read_file(remote):
+    """ test to see if a file is read from the mirror without a checkout
+    """
+    repo_url = "https://github.com/owner/name"
+    assert GitRepoCache.read_file(repo_url, "ro-crate-metadata.json", fetch_url=remote.working_dir) == '{"@graph": []}'
+    with pytest.raises(git.exc.GitCommandError):
+        GitRepoCache.read_file(repo_url, "missing.json", fetch_url=remote.working_dir)
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -13,29 +13,6 @@ from app.model.space import Space
 from app.model.location import Locations
 
 ### tests ###
-def on_rm_error(func, path, exc_info):
-    #from: https://stackoverflow.com/questions/4829043/how-to-remove-read-only-attrib-directory-with-python-in-windows
-    os.chmod(path, stat.S_IWRITE)
-    os.unlink(path)
-
-def clean_root(root_folder):
-    log.debug("calling in setup")
-    try:
-        shutil.rmtree(root_folder, onerror=on_rm_error)
-        #os.makedirs(root_folder, exist_ok=True)
-        shutil.copytree(os.path.join(os.getcwd(),"tests","setup_workspace"),root_folder)
-        log.debug("setup completed")
-    except Exception as e:
-        log.error(f"error during test setup:{e}")
-        log.exception(e)
-        
-@pytest.fixture  
-def root_folder():
-    _root_folder = workspace_folder
-    clean_root(_root_folder)
-    Locations(root=_root_folder)  
-    return _root_folder
-
 def test_check_profile(root_folder):
     tottest = Profile.load(uuid = '0123456') #TODO: better indications of where to have this 
     log.debug(f"totest seedcrates: {tottest.seed_dependencies}")
@@ -0,0 +1,133 @@
+import os, sys, json, threading
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.model.registry import Registries, SqliteRegistry
+from app.model.pathindex import StoragePathIndex
+from app.model.space import Space
+from app.model.location import Locations
+
+### tests ###
+def test_registry_lookup(root_folder):
+    """ test to see if the registry answers lookups from the spaces.json
+    """
+    assert Space.exists('0123456789')
+    assert not Space.exists('does_not_exist')
+    info = Space.read_info('0123456789')
+    assert info["ro_profile"] == "0123456"
+    with pytest.raises(KeyError):
+        Space.read_info('does_not_exist')
+
+def test_registry_reload_on_change(root_folder):
+    """ test to see if the registry picks up changes made to the file by someone else
+    """
+    registry = Registries().spaces()
+    assert len(registry) == 1
+    with open(Locations().join_abs_path("spaces.json"),'r') as metaf:
+        data = json.load(metaf)
+    data["abcdef"] = dict(data['0123456789'], uuid="abcdef")
+    with open(Locations().join_abs_path("spaces.json"),'w') as metaf:
+        json.dump(data, metaf)
+    assert Space.exists("abcdef")
+    assert len(registry) == 2
+
+def test_registry_copies_entries(root_folder):
+    """ test to see if modifying returned entries does not change the registry
+    """
+    info = Space.read_info('0123456789')
+    info["storage_path"] = "elsewhere"
+    assert Space.read_info('0123456789')["storage_path"] != "elsewhere"
+
+def test_registry_concurrent_writes(root_folder):
+    """ test to see if concurrent writers do not lose each others updates
+    """
+    registry = Registries().spaces()
+    template = registry['0123456789']
+    def add_space(i):
+        registry.set(f"space_{i}", dict(template, uuid=f"space_{i}"))
+    threads = [threading.Thread(target=add_space, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(Locations().join_abs_path("spaces.json"),'r') as metaf:
+        data = json.load(metaf)
+    assert len(data) == 21
+    registry.delete("space_0")
+    assert not Space.exists("space_0")
+    with pytest.raises(KeyError):
+        registry.delete("space_0")
+
+def test_registry_scan(root_folder):
+    """ test to see if the registry can be paged through with a cursor and filters
+    """
+    registry = Registries().spaces()
+    template = registry['0123456789']
+    for i in range(5):
+        registry.set(f"s{i}", dict(template, uuid=f"s{i}", storage_path=f"/data/p{i % 2}/s{i}"))
+    assert [uuid for uuid, entry in registry.scan(after="s1")] == ["s2", "s3", "s4"]
+    assert [uuid for uuid, entry in registry.scan(prefix={"storage_path": "/data/p1/"})] == ["s1", "s3"]
+    assert [uuid for uuid, entry in registry.scan(where={"ro_profile": "other"})] == []
+
+def test_storage_path_index():
+    """ test to see if the path index finds equal, parent and nested storage paths
+    """
+    index = StoragePathIndex([("a", "/data/spaces/a"), ("b", "/data/spaces/b/")])
+    assert index.conflict("/data/spaces/a") == "a"
+    assert index.conflict("/data/spaces/a/../a/") == "a"
+    assert index.conflict("/data/spaces/a/sub/folder") == "a"
+    assert index.conflict("/data/spaces") in ("a", "b")
+    assert index.conflict("/data/spaces/ab") is None
+    assert index.conflict("/data/other") is None
+    index.remove("a")
+    assert index.conflict("/data/spaces/a/sub") is None
+    index.add("b", "/elsewhere/b")
+    assert index.conflict("/data/spaces") is None
+
+def test_registry_path_conflict(root_folder):
+    """ test to see if both registry backends detect overlapping storage paths
+    """
+    json_registry = Registries().spaces()
+    sqlite_registry = SqliteRegistry(Locations().join_abs_path("registry.sqlite"), "spaces")
+    template = json_registry['0123456789']
+    for registry in (json_registry, sqlite_registry):
+        registry.set("nested", dict(template, uuid="nested", storage_path="/data/spaces/nested"))
+        assert registry.path_conflict("/data/spaces/nested") == "nested"
+        assert registry.path_conflict("/data/spaces") == "nested"
+        assert registry.path_conflict("/data/spaces/nested/inner") == "nested"
+        assert registry.path_conflict("/data/spaces/nest") is None
+        registry.delete("nested")
+        assert registry.path_conflict("/data/spaces/nested") is None
+
+def test_sqlite_registry_migration(root_folder):
+    """ test to see if the sqlite registry is filled from the json file and answers lookups
+    """
+    db_path = Locations().join_abs_path("registry.sqlite")
+    registry = SqliteRegistry(db_path, "spaces", json_path=Locations().join_abs_path("spaces.json"))
+    assert "0123456789" in registry
+    assert registry["0123456789"]["ro_profile"] == "0123456"
+    assert [uuid for uuid, entry in registry.find("ro_profile", "0123456")] == ["0123456789"]
+    registry.patch("0123456789", {"remote_url": "git@example.org:space.git"})
+    assert [uuid for uuid, entry in registry.scan(prefix={"storage_path": "C:"})] == ["0123456789"]
+    registry.delete("0123456789")
+    #reopening does not migrate the json file a second time
+    registry = SqliteRegistry(db_path, "spaces", json_path=Locations().join_abs_path("spaces.json"))
+    assert len(registry) == 0
+
+def test_sqlite_registry_backend(root_folder):
+    """ test to see if the env var switches the Space model over to the sqlite registry
+    """
+    os.environ["DMBON_FAST_API_REGISTRY_BACKEND"] = "sqlite"
+    try:
+        assert isinstance(Space.registry(), SqliteRegistry)
+        loadedspace = Space.load(uuid='0123456789')
+        assert loadedspace.storage_path == Space.read_info('0123456789')["storage_path"]
+    finally:
+        del os.environ["DMBON_FAST_API_REGISTRY_BACKEND"]
+
+if __name__ == "__main__":
+    run_single_test(__file__)
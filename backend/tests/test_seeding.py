@@ -0,0 +1,58 @@
+import os, sys
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.services.seeding import clone_file, materialise_seeds
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+@pytest.fixture
+def seeds(tmp_path):
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    write(os.path.join(first, "ro-crate-metadata.json"), "first")
+    write(os.path.join(first, "data", "nested", "table.csv"), "a,b")
+    write(os.path.join(first, "shapes.ttl"), "first shapes\n")
+    write(os.path.join(first, ".git", "HEAD"), "ref")
+    write(os.path.join(first, ".gitignore"), "*.tmp")
+    write(os.path.join(second, "ro-crate-metadata.json"), "second")
+    write(os.path.join(second, "constraints", "more.ttl"), "second shapes\n")
+    return [first, second]
+
+### tests ###
+def test_clone_file(tmp_path):
+    """ test to see if a file is copied whole, whatever way the filesystem supports
+    """
+    source = str(tmp_path / "source.bin")
+    with open(source, "wb") as f:
+        f.write(os.urandom(1 << 20))
+    destination = str(tmp_path / "destination.bin")
+    assert clone_file(source, destination) in ('reflink', 'copy_file_range', 'copy')
+    with open(source, "rb") as f, open(destination, "rb") as g:
+        assert f.read() == g.read()
+
+def test_materialise_seeds(seeds, tmp_path):
+    """ test to see if the seeds are copied with their folders, without git files and the later seed winning
+    """
+    space = str(tmp_path / "space")
+    os.makedirs(space)
+    constraints = materialise_seeds(seeds, space, is_constraint=lambda path: path.endswith(".ttl"), max_workers=2)
+    assert read(os.path.join(space, "ro-crate-metadata.json")) == "second"
+    assert read(os.path.join(space, "data", "nested", "table.csv")) == "a,b"
+    assert not os.path.exists(os.path.join(space, ".git"))
+    assert not os.path.exists(os.path.join(space, ".gitignore"))
+    assert not os.path.exists(os.path.join(space, "shapes.ttl"))
+    assert constraints == [os.path.join(seeds[0], "shapes.ttl"), os.path.join(seeds[1], "constraints", "more.ttl")]
+
+if __name__ == "__main__":
+    run_single_test(__file__)
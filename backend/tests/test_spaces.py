@@ -13,28 +13,6 @@ from app.model.space import Space
 from app.model.location import Locations
 
 ### tests ###
-def on_rm_error(func, path, exc_info):
-    #from: https://stackoverflow.com/questions/4829043/how-to-remove-read-only-attrib-directory-with-python-in-windows
-    os.chmod(path, stat.S_IWRITE)
-    os.unlink(path)
-    
-def clean_root(root_folder):
-    log.debug("calling in setup")
-    try:
-        shutil.rmtree(root_folder, onerror=on_rm_error)
-        shutil.copytree(os.path.join(os.getcwd(),"tests","setup_workspace"),root_folder)
-        log.debug("setup completed")
-    except Exception as e:
-        log.error(f"error during test setup:{e}")
-        log.exception(e)
-        
-@pytest.fixture  
-def root_folder():
-    _root_folder = workspace_folder
-    os.environ['DMBON_FAST_API_ROOT_WORKSPACE'] = str(_root_folder)
-    clean_root(_root_folder)
-    Locations(root=_root_folder)  
-    return _root_folder
     
 #test to see if a profile can be corectly made   
 def test_make_space_success(root_folder):
@@ -82,6 +60,20 @@ def test_load_space_success(root_folder):
     assert loadedspace is not None
     #check if info about the space is correct
     
+def test_load_space_lazy(root_folder, monkeypatch):
+    """ test to see if loading a space leaves its profile alone until it is used
+    """
+    loaded_profiles = []
+    load = Profile.load
+    monkeypatch.setattr(Profile, "load", staticmethod(lambda uuid: loaded_profiles.append(uuid) or load(uuid)))
+    loadedspace = Space.load(uuid='0123456789')
+    assert not hasattr(loadedspace, '__dict__')
+    assert loadedspace.as_dict()['ro_profile'] == "0123456"
+    assert loaded_profiles == []
+    assert loadedspace.ro_profile.uuid == "0123456"
+    assert loadedspace.ro_profile is loadedspace.ro_profile
+    assert loaded_profiles == ["0123456"]
+    
 def test_make_space_fail(root_folder):
     """ test to see if a space can be correctly failed 
     """
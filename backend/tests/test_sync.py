@@ -0,0 +1,78 @@
+import os, sys, time
+import git, pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.model.registry import JsonRegistry
+from app.model.rocrategit import GitRepoCache
+from app.model.profile import Profile
+from app.services.jobs import JobQueue, SUCCEEDED
+from app.services.sync import RepoSync
+
+REPO_URL = "https://github.com/owner/seed"
+
+def commit_file(repo, name):
+    with open(os.path.join(repo.working_dir, name), "w") as f:
+        f.write(name)
+    repo.index.add([name])
+    return repo.index.commit(name).hexsha
+
+@pytest.fixture
+def remote(tmp_path, root_folder):
+    #a local repo standing in for the github repo
+    repo = git.Repo.init(str(tmp_path / "remote"))
+    commit_file(repo, "ro-crate-metadata.json")
+    return repo
+
+@pytest.fixture
+def syncer(tmp_path, remote, monkeypatch):
+    clone_content = GitRepoCache.clone_content
+    monkeypatch.setattr(GitRepoCache, "clone_content", staticmethod(lambda location, repo_url: clone_content(location, repo_url, fetch_url=remote.working_dir)))
+    jobs = JobQueue(JsonRegistry(str(tmp_path / "jobs.json")), max_workers=1)
+    yield RepoSync(JsonRegistry(str(tmp_path / "sync.json")), jobs=jobs, ttl=60)
+    jobs.shutdown()
+
+### tests ###
+def test_sync_ttl(syncer, remote, tmp_path):
+    """ test to see if a repo is only fetched again after the ttl or when forced
+    """
+    location = str(tmp_path / "seed")
+    record = syncer.sync(REPO_URL, location)
+    assert not record['skipped'] and record['commit'] == remote.head.commit.hexsha
+    new_commit = commit_file(remote, "README.md")
+    assert syncer.sync(REPO_URL, location)['skipped']
+    assert not os.path.exists(os.path.join(location, "README.md"))
+    record = syncer.sync(REPO_URL, location, force=True)
+    assert record['changed'] and record['commit'] == new_commit
+    #the records are kept by normalised url
+    assert syncer.last("git@github.com:owner/seed.git")['commit'] == new_commit
+    syncer.ttl = 0
+    assert not syncer.sync(REPO_URL, location)['skipped']
+
+def test_refresh_stale(syncer, tmp_path):
+    """ test to see if only stale repos get a background refresh
+    """
+    fresh, stale = str(tmp_path / "fresh"), str(tmp_path / "stale")
+    syncer.sync(REPO_URL, fresh)
+    job_ids = syncer.refresh_stale([(REPO_URL, fresh), ("https://github.com/owner/other", stale)])
+    assert len(job_ids) == 1
+    deadline = time.monotonic() + 10
+    while syncer.jobs().get(job_ids[0])['state'] != SUCCEEDED and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert os.path.exists(os.path.join(stale, "ro-crate-metadata.json"))
+
+def test_load_profile_without_git(root_folder, monkeypatch):
+    """ test to see if loading a known profile does not clone or pull its seed crates
+    """
+    def no_git(*args, **kwargs):
+        raise AssertionError("git was called while loading a profile")
+    monkeypatch.setattr(GitRepoCache, "clone_content", staticmethod(no_git))
+    monkeypatch.setattr(GitRepoCache, "update_content", staticmethod(no_git))
+    profile = Profile.load("0123456")
+    assert list(profile.seed_dependencies) == ["https://github.com/cedricdcc/my_bon_test_crate_2.git"]
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,112 @@
+import os, sys, copy
+import pytest
+from util4tests import log, run_single_test
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+
+from app.services.validation import ValidationCache, crate_base
+
+SHAPES = """@prefix schema: <http://schema.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+schema:FileShape a sh:NodeShape ;
+    sh:targetClass schema:MediaObject ;
+    sh:property [ sh:path schema:name ; sh:datatype xsd:string ; sh:minCount 1 ] ;
+    sh:property [ sh:path schema:author ; sh:class schema:Person ] .
+"""
+
+#inline context, the test does not fetch the ro-crate context
+CONTEXT = {"@vocab": "http://schema.org/", "File": "http://schema.org/MediaObject",
+           "author": {"@id": "http://schema.org/author", "@type": "@id"}}
+
+def make_metadata(files=10):
+    graph = [{"@id": "./", "@type": "Dataset", "hasPart": [{"@id": f"f{i}.txt"} for i in range(files)]},
+             {"@id": "#me", "@type": "Person", "name": "me"}]
+    graph += [{"@id": f"f{i}.txt", "@type": "File", "name": f"file {i}", "author": {"@id": "#me"}} for i in range(files)]
+    return {"@context": CONTEXT, "@graph": graph}
+
+def entity(metadata, entity_id):
+    return next(item for item in metadata["@graph"] if item["@id"] == entity_id)
+
+@pytest.fixture
+def shapes_path(tmp_path):
+    path = os.path.join(str(tmp_path), "all_constraints.ttl")
+    with open(path, 'w') as f:
+        f.write(SHAPES)
+    return path
+
+### tests ###
+def test_validate_full_then_cached(shapes_path, tmp_path):
+    """ test to see if a first validation runs on the whole crate and an unchanged crate reuses its results
+    """
+    validations = ValidationCache()
+    base = crate_base(str(tmp_path))
+    metadata = make_metadata()
+    del entity(metadata, "f3.txt")["name"]
+    result = validations.validate("space", metadata, shapes_path, base)
+    assert (result['mode'], result['conforms']) == ("full", False)
+    assert [(found['focus_node'], found['path']) for found in result['results']] == [("f3.txt", "http://schema.org/name")]
+    result = validations.validate("space", copy.deepcopy(metadata), shapes_path, base)
+    assert (result['mode'], result['revalidated'], len(result['results'])) == ("cached", 0, 1)
+    assert validations.metrics()['shapes_graphs'] == 1
+
+def test_validate_incremental(shapes_path, tmp_path):
+    """ test to see if only the changed entities and the ones pointing to them are revalidated
+    """
+    validations = ValidationCache()
+    base = crate_base(str(tmp_path))
+    metadata = make_metadata()
+    del entity(metadata, "f3.txt")["name"]
+    validations.validate("space", metadata, shapes_path, base)
+    fixed = copy.deepcopy(metadata)
+    entity(fixed, "f3.txt")["name"] = "file 3"
+    result = validations.validate("space", fixed, shapes_path, base)
+    assert (result['mode'], result['conforms'], result['results']) == ("incremental", True, [])
+    #f3.txt and the dataset pointing to it
+    assert result['revalidated'] == 2
+    broken = copy.deepcopy(fixed)
+    entity(broken, "f5.txt")["author"] = {"@id": "f1.txt"}
+    result = validations.validate("space", broken, shapes_path, base)
+    assert result['mode'] == "incremental"
+    assert [(found['focus_node'], found['path']) for found in result['results']] == [("f5.txt", "http://schema.org/author")]
+    assert result['results'] == validations.validate("other", broken, shapes_path, base)['results']
+
+def test_validate_after_shapes_change(shapes_path, tmp_path):
+    """ test to see if changed constraints or a forced run validate the whole crate again
+    """
+    validations = ValidationCache()
+    base = crate_base(str(tmp_path))
+    metadata = make_metadata()
+    assert validations.validate("space", metadata, shapes_path, base)['conforms']
+    assert validations.validate("space", metadata, shapes_path, base, full=True)['mode'] == "full"
+    with open(shapes_path, 'a') as f:
+        f.write("schema:PersonShape a sh:NodeShape ; sh:targetClass schema:Person ;\n"
+                "    sh:property [ sh:path schema:email ; sh:minCount 1 ] .\n")
+    result = validations.validate("space", metadata, shapes_path, base)
+    assert (result['mode'], result['conforms']) == ("full", False)
+    assert [found['focus_node'] for found in result['results']] == ["#me"]
+    validations.drop("space")
+    assert validations.metrics()['crates'] == 0
+
+def test_validate_warnings(shapes_path, tmp_path):
+    """ test to see if results of warning severity make a crate not conform, as they do for pyshacl
+    """
+    with open(shapes_path, 'a') as f:
+        f.write("schema:LicenseShape a sh:NodeShape ; sh:targetClass schema:MediaObject ;\n"
+                "    sh:property [ sh:path schema:license ; sh:minCount 1 ; sh:severity sh:Warning ] .\n")
+    validations = ValidationCache()
+    base = crate_base(str(tmp_path))
+    metadata = make_metadata(files=2)
+    result = validations.validate("space", metadata, shapes_path, base)
+    assert result['conforms'] is False
+    assert [(found['focus_node'], found['severity']) for found in result['results']] == \
+        [("f0.txt", "http://www.w3.org/ns/shacl#Warning"), ("f1.txt", "http://www.w3.org/ns/shacl#Warning")]
+    for i in range(2):
+        entity(metadata, f"f{i}.txt")["license"] = "MIT"
+    result = validations.validate("space", metadata, shapes_path, base)
+    assert (result['mode'], result['conforms'], result['results']) == ("incremental", True, [])
+
+if __name__ == "__main__":
+    run_single_test(__file__)